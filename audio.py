@@ -0,0 +1,295 @@
+import os
+import time
+import struct
+
+
+def read_wav_header(f):
+    """Reads a RIFF/WAVE header up to the sample data, returns (rate, bits, channels, data bytes)"""
+    riff = f.read(12)
+    if len(riff) < 12 or riff[0:4] != b'RIFF' or riff[8:12] != b'WAVE':
+        raise ValueError('not a WAV file')
+
+    fmt = None
+    while True:
+        header = f.read(8)
+        if len(header) < 8:
+            raise ValueError('WAV file without data')
+        (chunk_id, chunk_bytes) = (header[0:4], struct.unpack('<I', header[4:8])[0])
+        if chunk_id == b'fmt ':
+            fmt = struct.unpack('<HHIIHH', f.read(16))
+            f.read(chunk_bytes - 16 + (chunk_bytes & 1))
+        elif chunk_id == b'data':
+            break
+        else:
+            f.read(chunk_bytes + (chunk_bytes & 1))
+
+    if fmt is None:
+        raise ValueError('WAV file without format')
+    (format, channels, rate, _, _, bits) = fmt
+    if format != 1 or bits not in (8, 16):
+        raise ValueError('only 8 and 16 bit PCM is supported')
+    return (rate, bits, channels, chunk_bytes)
+
+
+def scale_u8(buf, n, volume):
+    """Scales n unsigned 8 bit samples in place, volume out of 256"""
+    for i in range(n):
+        buf[i] = 128 + ((buf[i] - 128) * volume >> 8)
+
+
+def scale_s16(buf, n, volume):
+    """Scales n bytes of signed little endian 16 bit samples in place, volume out of 256"""
+    for i in range(0, n, 2):
+        sample = buf[i] | buf[i + 1] << 8
+        if sample & 0x8000:
+            sample -= 0x10000
+        sample = sample * volume >> 8
+        buf[i] = sample & 0xFF
+        buf[i + 1] = (sample >> 8) & 0xFF
+
+
+def can_stream(path):
+    """Whether a SamplePlayer can stream path into an I2SSink here
+
+    The ESP8266 has no machine.I2S, and its PWM tops out at 1 kHz, too slow
+    for PWMSink, so there the pulse of base.Audio is all there is.
+    """
+    import machine
+
+    if not hasattr(machine, 'I2S'):
+        return False
+    try:
+        os.stat(path)
+    except OSError:
+        return False
+    return True
+
+
+class PWMSink:
+    """Plays samples as PWM duty cycles from a timer callback
+
+    Holds one buffer that is playing and one that is queued. Only suits
+    low sample rates: every sample is a Python callback, so clips above
+    max_rate are decimated, and the PWM carrier has to run well above the
+    sample rate, which rules out the ESP8266 and its 1 kHz PWM.
+    """
+
+    def __init__(self, pwm, timer, max_rate=8000, max_duty=1023):
+        self.pwm = pwm
+        self.timer = timer
+        self.max_rate = max_rate
+        self.duty_shift = 0
+        while (256 << (self.duty_shift + 1)) <= max_duty + 1:
+            self.duty_shift += 1
+        self.playing = None
+        self.playing_bytes = 0
+        self.position = 0
+        self.pending = None
+        self.pending_bytes = 0
+        self.step = 1
+        self.sample_offset = 0
+        self.sample_xor = 0
+
+    def start(self, rate, bits, channels):
+        frame_bytes = bits // 8 * channels
+        skip = (rate + self.max_rate - 1) // self.max_rate
+        self.step = frame_bytes * skip
+        # the most significant byte of the first channel, made unsigned
+        self.sample_offset = bits // 8 - 1
+        self.sample_xor = 0x80 if bits == 16 else 0
+        self.timer.init(freq=rate // skip, mode=self.timer.PERIODIC, callback=self.tick)
+
+    def ready(self):
+        return self.pending is None
+
+    def isIdle(self):
+        return self.playing is None
+
+    def write(self, buf, n):
+        if self.playing is None:
+            self.position = 0
+            self.playing_bytes = n
+            self.playing = buf
+        else:
+            self.pending_bytes = n
+            self.pending = buf
+
+    def tick(self, timer):
+        if self.playing is None:
+            return
+
+        self.pwm.duty((self.playing[self.position + self.sample_offset] ^ self.sample_xor) << self.duty_shift)
+        self.position += self.step
+        if self.position >= self.playing_bytes:
+            self.position = 0
+            self.playing_bytes = self.pending_bytes
+            self.playing = self.pending
+            self.pending = None
+
+    def stop(self):
+        self.timer.deinit()
+        self.playing = None
+        self.pending = None
+        self.pwm.duty(0)
+
+
+class I2SSink:
+    """Writes samples to machine.I2S in non-blocking mode, one buffer in flight at a time"""
+
+    def __init__(self, id, sck, ws, sd, ibuf=4096):
+        self.id = id
+        self.pins = (sck, ws, sd)
+        self.ibuf = ibuf
+        self.i2s = None
+        self.in_flight = False
+
+    def start(self, rate, bits, channels):
+        from machine import I2S
+
+        if bits != 16:
+            raise ValueError('I2S needs 16 bit samples')
+        (sck, ws, sd) = self.pins
+        self.i2s = I2S(self.id, sck=sck, ws=ws, sd=sd, mode=I2S.TX, bits=bits,
+                       format=I2S.STEREO if channels == 2 else I2S.MONO, rate=rate, ibuf=self.ibuf)
+        self.i2s.irq(self.onWritten) # makes write() return at once
+        self.in_flight = False
+
+    def onWritten(self, i2s):
+        self.in_flight = False
+
+    def ready(self):
+        return not self.in_flight
+
+    def isIdle(self):
+        return not self.in_flight
+
+    def write(self, buf, n):
+        self.in_flight = True
+        self.i2s.write(buf if n == len(buf) else buf[:n])
+
+    def stop(self):
+        if self.i2s is not None:
+            self.i2s.deinit()
+            self.i2s = None
+        self.in_flight = False
+
+
+class SamplePlayer:
+    """Streams a WAV file from flash or SD into a sink through two small buffers
+
+    A drop-in for base.Audio: play() starts the clip, looping it until
+    stop() or duration_ms, and update() refills whichever buffer the sink
+    has released. The volume ramps up from zero over ramp_ms, for alarms
+    that wake gently.
+    """
+
+    BUFFER_BYTES = 512
+    FULL_VOLUME = 256
+
+    def __init__(self, sink, path, loop=True, ramp_ms=0, volume=FULL_VOLUME, duration_ms=None, buffer_bytes=BUFFER_BYTES):
+        self.sink = sink
+        self.path = path
+        self.loop = loop
+        self.ramp_ms = ramp_ms
+        self.volume = volume
+        self.duration_ms = duration_ms
+        self.buffers = (bytearray(buffer_bytes), bytearray(buffer_bytes))
+        self.views = (memoryview(self.buffers[0]), memoryview(self.buffers[1]))
+        self.next_buffer = 0
+        self.file = None
+        self.data_start = 0
+        self.data_bytes = 0
+        self.remaining = 0
+        self.rate = 0
+        self.bits = 8
+        self.frame_bytes = 1
+        self.started = 0
+        self.draining = False
+
+    def play(self):
+        self.stop()
+
+        self.file = open(self.path, 'rb')
+        try:
+            (self.rate, self.bits, channels, self.data_bytes) = read_wav_header(self.file)
+        except ValueError:
+            self.file.close()
+            self.file = None
+            raise
+        self.data_start = self.file.tell()
+        self.remaining = self.data_bytes
+        self.frame_bytes = self.bits // 8 * channels
+        self.next_buffer = 0
+        self.draining = False
+        self.started = time.ticks_ms()
+
+        self.sink.start(self.rate, self.bits, channels)
+        self.update()
+
+    def stop(self):
+        if self.file is None:
+            return
+
+        self.sink.stop()
+        self.file.close()
+        self.file = None
+
+    def isPlaying(self):
+        return self.file is not None
+
+    def currentVolume(self):
+        if not self.ramp_ms:
+            return self.volume
+        elapsed = time.ticks_diff(time.ticks_ms(), self.started)
+        if elapsed >= self.ramp_ms:
+            return self.volume
+        return self.volume * elapsed // self.ramp_ms
+
+    def fill(self, i):
+        """Reads the next samples into buffer i, returns how many bytes it got"""
+        view = self.views[i]
+        if self.remaining <= 0 and self.loop:
+            self.file.seek(self.data_start)
+            self.remaining = self.data_bytes
+
+        n = min(len(view), self.remaining)
+        n -= n % self.frame_bytes
+        if n <= 0:
+            return 0
+
+        n = self.file.readinto(view if n == len(view) else view[:n]) or 0
+        self.remaining -= n
+
+        volume = self.currentVolume()
+        if volume != SamplePlayer.FULL_VOLUME:
+            if self.bits == 8:
+                scale_u8(self.buffers[i], n, volume)
+            else:
+                scale_s16(self.buffers[i], n, volume)
+        return n
+
+    def update(self):
+        if self.file is None:
+            return
+
+        if self.duration_ms is not None and time.ticks_diff(time.ticks_ms(), self.started) >= self.duration_ms:
+            self.stop()
+            return
+
+        while not self.draining and self.sink.ready():
+            n = self.fill(self.next_buffer)
+            if n == 0:
+                self.draining = True # the end of the clip, let the sink play out
+                break
+            self.sink.write(self.views[self.next_buffer], n)
+            self.next_buffer ^= 1
+
+        if self.draining and self.sink.isIdle():
+            self.stop()
+
+    def nextUpdateMs(self):
+        """Milliseconds until a buffer may need refilling, None while stopped"""
+        if self.file is None:
+            return None
+        # half a buffer, so the other one never runs dry
+        return max(1, len(self.buffers[0]) * 1000 // (self.rate * self.frame_bytes) // 2)
@@ -1,53 +1,154 @@
 import network
 import time
-import ntptime
+from ntp import NTPClient, setRTC
+import tz
+import heapq
+import array
 
 class Buttons:
-    """Polls buttons and triggers handlers"""
+    """Watches buttons and triggers handlers
+
+    Either polls the pins, or with irq=True captures edges through Pin.irq
+    into a preallocated ring buffer and classifies them only while events
+    are pending or a button is held. Edge handlers are called from the IRQ
+    handler after every captured edge, so they must not allocate; they let
+    the loop sleep until the next press. Actions are 'click', 'doubleclick'
+    (in addition to the second click), 'longpress' and 'repeat' while a
+    long press is held.
+    """
 
     DEBOUNCE_INTERVAL_MS = 10
     LONG_PRESS_THRESH_MS = 1000
+    DOUBLE_CLICK_INTERVAL_MS = 300
+    REPEAT_INTERVAL_MS = 250
+    POLL_INTERVAL_MS = DEBOUNCE_INTERVAL_MS // 2
+    EVENT_BUFFER_SIZE = 16
 
     BS_UP = 0
     BS_DOWN = 1
     BS_LONG_DOWN = 2
 
-    def __init__(self, pins):
+    def __init__(self, pins, irq=False):
         self.handlers = []
-        self.state = [(pin, Buttons.BS_UP, 0) for pin in pins] # pin, last state, timestamp
+        self.edge_handlers = []
+        self.pins = pins
+        self.irq = irq
+
+        # per pin: last state, timestamp of the last transition, last long press or repeat, last click
+        self.states = bytearray(len(pins))
+        self.timestamps = array.array('i', [0] * len(pins))
+        self.repeat_timestamps = array.array('i', [0] * len(pins))
+        self.click_timestamps = array.array('i', [0] * len(pins))
+        self.clicked = bytearray(len(pins)) # waiting for a second click
+        self.unsettled = bytearray(len(pins)) # an edge was swallowed as bounce, resample the pin
+        self.unsettled_pins = 0
+        self.held = 0
+        self.action_ticks = 0 # when the edge behind the current action happened
+
+        if irq:
+            # ring buffer of (pin index, level, timestamp), written from the IRQ handlers
+            self.event_pins = bytearray(Buttons.EVENT_BUFFER_SIZE)
+            self.event_levels = bytearray(Buttons.EVENT_BUFFER_SIZE)
+            self.event_ticks = array.array('i', [0] * Buttons.EVENT_BUFFER_SIZE)
+            self.event_head = 0
+            self.event_tail = 0
+            self.dropped_events = 0
+            try:
+                for i in range(len(pins)):
+                    pins[i].irq(trigger=pins[i].IRQ_FALLING | pins[i].IRQ_RISING, handler=self.irqHandler(i))
+            except (ValueError, OSError) as e: # ports differ in what they raise for a pin without interrupts
+                print('Button interrupts unavailable, polling instead:', e)
+                self.irq = False
+
+    def irqHandler(self, index):
+        def handler(pin):
+            self.pushEvent(index, pin.value(), time.ticks_ms())
+            for edge_handler in self.edge_handlers:
+                edge_handler()
+        return handler
+
+    def pushEvent(self, index, level, timestamp):
+        head = self.event_head
+        next_head = (head + 1) % Buttons.EVENT_BUFFER_SIZE
+        if next_head == self.event_tail:
+            self.dropped_events += 1
+            return
+        
+        self.event_pins[head] = index
+        self.event_levels[head] = level
+        self.event_ticks[head] = timestamp
+        self.event_head = next_head
 
     def update(self):
-        for i in range(len(self.state)):
-            (pin, last_state, last_timestamp) = self.state[i]
-            self.state[i] = self.updatePin(pin, last_state, last_timestamp)
-    
-    def updatePin(self, pin, last_state, last_timestamp):
-        current_value = pin.value()
+        if self.irq:
+            if self.event_head == self.event_tail and not self.held and not self.unsettled_pins:
+                return
+
+            while self.event_tail != self.event_head:
+                tail = self.event_tail
+                self.updatePin(self.event_pins[tail], not self.event_levels[tail], self.event_ticks[tail])
+                self.event_tail = (tail + 1) % Buttons.EVENT_BUFFER_SIZE
+        
         current_timestamp = time.ticks_ms()
-        timestamps_diff = time.ticks_diff(current_timestamp, last_timestamp)
+        for i in range(len(self.pins)):
+            if not self.irq or self.unsettled[i]:
+                self.updatePin(i, not self.pins[i].value(), current_timestamp)
+            self.updateHeldPin(i, current_timestamp)
+    
+    def isIdle(self):
+        """True when no button is held and no edge waits to be classified"""
+        if self.held or self.unsettled_pins:
+            return False
+        return not self.irq or self.event_head == self.event_tail
+
+    def updatePin(self, i, pressed, current_timestamp):
+        last_state = self.states[i]
+        timestamps_diff = time.ticks_diff(current_timestamp, self.timestamps[i])
+
+        if pressed == (last_state != Buttons.BS_UP): # no change
+            self.setUnsettled(i, 0)
+            return
 
         if timestamps_diff < Buttons.DEBOUNCE_INTERVAL_MS: # bounce
-            return (pin, last_state, last_timestamp)
-        
-        if last_state == Buttons.BS_DOWN and not current_value: # keep down
-            if timestamps_diff >= Buttons.LONG_PRESS_THRESH_MS:
-                self.onButtonAction(pin, 'longpress')
-                return (pin, Buttons.BS_LONG_DOWN, last_timestamp)
-            return (pin, Buttons.BS_DOWN, last_timestamp)
+            self.setUnsettled(i, 1)
+            return
         
-        if last_state == Buttons.BS_LONG_DOWN and not current_value: # long down
-            return (pin, Buttons.BS_LONG_DOWN, last_timestamp)
+        self.setUnsettled(i, 0)
+        self.timestamps[i] = current_timestamp
+
+        if pressed: # push
+            self.states[i] = Buttons.BS_DOWN
+            self.held += 1
+            return
         
-        if last_state in [Buttons.BS_DOWN, Buttons.BS_LONG_DOWN] and current_value: # release
-            if last_state == Buttons.BS_DOWN:
-                self.onButtonAction(pin, 'click')
-            return (pin, Buttons.BS_UP, current_timestamp)
+        # release
+        self.states[i] = Buttons.BS_UP
+        self.held -= 1
+        if last_state == Buttons.BS_DOWN:
+            self.onButtonAction(self.pins[i], 'click', current_timestamp)
+            if self.clicked[i] and time.ticks_diff(current_timestamp, self.click_timestamps[i]) <= Buttons.DOUBLE_CLICK_INTERVAL_MS:
+                self.clicked[i] = 0
+                self.onButtonAction(self.pins[i], 'doubleclick', current_timestamp)
+            else:
+                self.clicked[i] = 1
+                self.click_timestamps[i] = current_timestamp
 
-        if last_state == Buttons.BS_UP and not current_value: # push
-            return (pin, Buttons.BS_DOWN, current_timestamp)
+    def setUnsettled(self, i, unsettled):
+        if self.unsettled[i] != unsettled:
+            self.unsettled[i] = unsettled
+            self.unsettled_pins += 1 if unsettled else -1
 
-        if last_state == Buttons.BS_UP and current_value: # keep up
-            return (pin, Buttons.BS_UP, last_timestamp)
+    def updateHeldPin(self, i, current_timestamp):
+        if self.states[i] == Buttons.BS_DOWN: # keep down
+            if time.ticks_diff(current_timestamp, self.timestamps[i]) >= Buttons.LONG_PRESS_THRESH_MS:
+                self.states[i] = Buttons.BS_LONG_DOWN
+                self.repeat_timestamps[i] = current_timestamp
+                self.clicked[i] = 0
+                self.onButtonAction(self.pins[i], 'longpress', current_timestamp)
+        elif self.states[i] == Buttons.BS_LONG_DOWN: # long down
+            if time.ticks_diff(current_timestamp, self.repeat_timestamps[i]) >= Buttons.REPEAT_INTERVAL_MS:
+                self.repeat_timestamps[i] = current_timestamp
+                self.onButtonAction(self.pins[i], 'repeat', current_timestamp)
     
     # def subscribeHandler(self, pin, action_id, handler_func):
     #     handler = lambda btnid, actid : handler_func() if (btnid == button_id and actid == action_id) else None
@@ -56,50 +157,252 @@ class Buttons:
 
     def subscribeHandler(self, handler):
         self.handlers.append(handler)
+
+    def subscribeEdgeHandler(self, handler):
+        self.edge_handlers.append(handler)
     
     def removeHandler(self, handler):
         if handler in self.handlers:
             self.handlers.remove(handler)
     
-    def onButtonAction(self, pin, action_id):
+    def onButtonAction(self, pin, action_id, ticks):
+        self.action_ticks = ticks
         for handler in self.handlers:
             handler(pin, action_id)
 
 
 class ICTime:
-    """Internet controlled time"""
+    """Internet controlled time
+
+    The wall clock is read once per sync and anchored to ticks_ms, so reading
+    the time is integer arithmetic that never touches the network stack.
+    Syncs run asynchronously; the offset found at each one feeds a drift
+    estimate that corrects the tick rate and stretches the sync interval
+    while the crystal stays stable.
+    """
+
+    REANCHOR_INTERVAL_MS = 60*60*1000 # ticks_diff is only valid for half the ticks period
+    STABLE_OFFSET_MS = 250
+    STEP_OFFSET_MS = 10000
+    MIN_DRIFT_WINDOW_MS = 10*60*1000
+    MAX_DRIFT_PPM = 2000
+    POLL_INTERVAL_MS = 50
+    CONNECTION_CHECK_INTERVAL_MS = 15000
 
-    last_update_time = -999999
+    # shared by all instances, so any ICTime() reads the synced clock
+    anchor_time = None # UTC seconds ...
+    anchor_ms = 0 # ... plus milliseconds at anchor_ticks
+    anchor_ticks = 0
+    drift_ppm = 0
+    zone = tz.TimeZone.fixed('UTC+2', 2*60*60)
+    cached_timestamp = None
+    cached_localtime = None
 
-    def __init__(self, update_interval_s=60*60, retry_interval_s=15):
+    def __init__(self, update_interval_s=60*60, retry_interval_s=15, max_update_interval_s=24*60*60, ntp=None, zone=None):
+        if zone is not None:
+            self.setZone(zone)
         self.update_interval_s = update_interval_s
         self.retry_interval_s = retry_interval_s
+        self.max_update_interval_s = max_update_interval_s
+        self.sync_interval_s = update_interval_s
+        self.next_sync_time = -999999
+        self.synced_ticks = None
+        self.failures = 0
+        self.ntp = ntp
+        self.wlan = None
+        self.handlers = []
     
-    def localtime(self):
-        # TODO: auto timezone, daylight savings -> use datetime.py from micropython-lib
-        if network.WLAN().isconnected() and (time.time() - ICTime.last_update_time) >= self.update_interval_s:
+    def update(self):
+        if self.ntp is not None and self.ntp.isPending():
             try:
-                ntptime.settime()
+                result = self.ntp.poll()
             except OSError as e:
-                print('Error synchronizing NTP:', e, 'Retry in %d s' % self.retry_interval_s)
-                ICTime.last_update_time += self.retry_interval_s
+                self.onSyncFailed(e)
             else:
-                ICTime.last_update_time = time.time()
+                if result is not None:
+                    self.onSynced(*result)
+            return
+
+        if self.syncDue() and self.isConnected():
+            if self.ntp is None:
+                self.ntp = NTPClient()
+            try:
+                self.ntp.request()
+            except OSError as e:
+                self.onSyncFailed(e)
+
+    def syncDue(self):
+        return self.utc() >= self.next_sync_time
+
+    def isConnected(self):
+        if self.wlan is None:
+            self.wlan = network.WLAN(network.STA_IF)
+        return self.wlan.isconnected()
+
+    def nextUpdateMs(self):
+        """Milliseconds until update() has work to do"""
+        if self.ntp is not None and self.ntp.isPending():
+            return ICTime.POLL_INTERVAL_MS
+        if self.syncDue() and not self.isConnected():
+            return ICTime.CONNECTION_CHECK_INTERVAL_MS # nothing to do until the WLAN is up
+        return max(0, (self.next_sync_time - self.utc()) * 1000)
+
+    def onSynced(self, utc_time, ms, ticks):
+        elapsed_ms = self.elapsedMs(ticks)
+        offset_ms = (utc_time - ICTime.anchor_time) * 1000 + ms - elapsed_ms
+
+        if abs(offset_ms) >= ICTime.STEP_OFFSET_MS or self.synced_ticks is None:
+            # first sync or the clock was off entirely: step it and start over
+            self.sync_interval_s = self.update_interval_s
+        else:
+            window_ms = time.ticks_diff(ticks, self.synced_ticks)
+            if window_ms >= ICTime.MIN_DRIFT_WINDOW_MS:
+                drift_ppm = ICTime.drift_ppm + offset_ms * 1000 // (window_ms // 1000) // 2
+                ICTime.drift_ppm = max(-ICTime.MAX_DRIFT_PPM, min(ICTime.MAX_DRIFT_PPM, drift_ppm))
+
+            if abs(offset_ms) <= ICTime.STABLE_OFFSET_MS:
+                self.sync_interval_s = min(2 * self.sync_interval_s, self.max_update_interval_s)
+            else:
+                self.sync_interval_s = max(self.sync_interval_s // 2, self.update_interval_s)
         
-        utc_datetime = time.localtime()
-        local_datetime = time.localtime(time.mktime(utc_datetime) + 2*60*60)
+        ICTime.anchor(utc_time, ms, ticks)
+        setRTC(utc_time)
+
+        self.synced_ticks = ticks
+        self.failures = 0
+        self.next_sync_time = utc_time + self.sync_interval_s
+        print('NTP synchronized, offset %d ms, drift %d ppm, next in %d s' % (offset_ms, ICTime.drift_ppm, self.sync_interval_s))
+        for handler in self.handlers:
+            handler(utc_time)
+
+    def onSyncFailed(self, e):
+        retry_s = min(self.retry_interval_s << min(self.failures, 10), self.update_interval_s)
+        self.failures += 1
+        self.next_sync_time = self.utc() + retry_s
+        print('Error synchronizing NTP:', e, 'Retry in %d s' % retry_s)
+
+    def subscribeHandler(self, handler):
+        """handler(utc_time) is called after every sync"""
+        self.handlers.append(handler)
+
+    def setZone(self, zone):
+        ICTime.zone = zone
+        ICTime.cached_timestamp = None
+
+    def anchor(utc_time, ms=0, ticks=None):
+        ICTime.anchor_time = utc_time
+        ICTime.anchor_ms = ms
+        ICTime.anchor_ticks = time.ticks_ms() if ticks is None else ticks
+
+    def elapsedMs(self, ticks=None):
+        """Drift corrected milliseconds between the anchor second and ticks"""
+        if ICTime.anchor_time is None:
+            ICTime.anchor(time.time())
+        if ticks is None:
+            ticks = time.ticks_ms()
 
-        return local_datetime
+        elapsed_ms = time.ticks_diff(ticks, ICTime.anchor_ticks)
+        elapsed_ms += (elapsed_ms // 1000) * ICTime.drift_ppm // 1000 + ICTime.anchor_ms
+
+        if elapsed_ms >= ICTime.REANCHOR_INTERVAL_MS:
+            # move the anchor forward so it never falls out of the ticks range
+            ICTime.anchor(ICTime.anchor_time + elapsed_ms // 1000, elapsed_ms % 1000, ticks)
+            elapsed_ms %= 1000
+
+        return elapsed_ms
+
+    def utc(self):
+        """UTC seconds since the epoch, extrapolated from the last anchor"""
+        elapsed_ms = self.elapsedMs()
+        return ICTime.anchor_time + elapsed_ms // 1000
+
+    def msUntil(self, timestamp):
+        """Milliseconds until the local timestamp, 0 if it has passed
+
+        Converted with the offset at the timestamp rather than the current
+        one, so a nap across a DST change doesn't end an hour off.
+        """
+        elapsed_ms = self.elapsedMs()
+        utc_time = ICTime.anchor_time + elapsed_ms // 1000
+        return max(0, (ICTime.zone.utc(timestamp) - utc_time) * 1000 - elapsed_ms % 1000)
+
+    def localtime(self):
+        timestamp = self.timestamp()
+        if timestamp != ICTime.cached_timestamp:
+            ICTime.cached_localtime = time.localtime(timestamp)
+            ICTime.cached_timestamp = timestamp
+
+        return ICTime.cached_localtime
+
+    def timestamp(self):
+        """Local time in seconds since the epoch"""
+        utc_time = self.utc()
+        return utc_time + ICTime.zone.offset(utc_time)
+
+
+class Recurrence:
+    """Closed-form schedule of a local time of day
+
+    Repeats on the weekdays in a bitmask (bit 0 = Monday), every N days
+    counted from a start day, or only once. next() is constant time no
+    matter how far the clock jumped since the last occurrence.
+    """
+
+    EVERY_DAY = 0x7F
+    WORKDAYS = 0x1F
+    WEEKEND = 0x60
+
+    def __init__(self, time_of_day_s, weekdays=EVERY_DAY, every_days=1, start_day=0, once=False):
+        if not 0 <= time_of_day_s < 24*60*60:
+            raise ValueError("'time_of_day_s' must be within a day")
+        if not 0 < weekdays <= Recurrence.EVERY_DAY:
+            raise ValueError("'weekdays' must select at least one day")
+        if every_days < 1:
+            raise ValueError("'every_days' must be positive")
+        if every_days > 1 and weekdays != Recurrence.EVERY_DAY:
+            raise ValueError("'every_days' and 'weekdays' cannot be combined")
+
+        self.time_of_day_s = time_of_day_s
+        self.weekdays = weekdays
+        self.every_days = every_days
+        self.start_day = start_day
+        self.once = once
+    
+    def next(self, after):
+        """Local timestamp of the first occurrence strictly after 'after'"""
+        day = after // (24*60*60)
+        if after % (24*60*60) >= self.time_of_day_s:
+            day += 1
+        
+        if self.every_days > 1:
+            day += (self.start_day - day) % self.every_days
+        elif self.weekdays != Recurrence.EVERY_DAY:
+            weekday = tz.weekday(day)
+            while not self.weekdays & (1 << weekday):
+                day += 1
+                weekday = (weekday + 1) % 7
+        
+        return day * 24*60*60 + self.time_of_day_s
+
+    def __repr__(self):
+        return "Recurrence({}, weekdays={:#x}, every={}, once={})".format(self.time_of_day_s, self.weekdays, self.every_days, self.once)
 
 
 class Alarm:
 
-    def __init__(self, ident, datetime, handler, repeating=False):
+    def __init__(self, ident, datetime, handler, repeating=False, recurrence=None):
         self.ident = ident
         self.datetime = Alarm.convertDatetime(datetime)
-        self.updateDatetime()
+        start = time.mktime(self.datetime)
+        if recurrence is None:
+            recurrence = Recurrence(start % (24*60*60), start_day=start // (24*60*60), once=not repeating)
+        self.recurrence = recurrence
+        self.repeating = not recurrence.once
         self.handler = handler
-        self.repeating = repeating
+
+        # first occurrence that is neither before the requested start nor in the past
+        self.timestamp = self.recurrence.next(max(ICTime().timestamp(), start - 1))
+        self.datetime = time.localtime(self.timestamp)
     
     def convertDatetime(datetime):
         if len(datetime) == 8:
@@ -123,54 +426,104 @@ class Alarm:
         )
         return alarm_datetime
 
-    def updateDatetime(self):
-        while self.shouldRing():
-            self.datetime = time.localtime(time.mktime(self.datetime) + 24*60*60)
+    def updateDatetime(self, now=None):
+        if now is None:
+            now = ICTime().timestamp()
+        if self.shouldRing(now):
+            self.timestamp = self.recurrence.next(now)
+            self.datetime = time.localtime(self.timestamp)
+
+    def snooze(self, seconds, now=None):
+        if now is None:
+            now = ICTime().timestamp()
+        self.timestamp = now + seconds
+        self.datetime = time.localtime(self.timestamp)
     
-    def shouldRing(self):
-        # TODO: use datetime.py
-        local_datetime = ICTime().localtime()
-        return time.mktime(local_datetime) >= time.mktime(self.datetime)
+    def shouldRing(self, now=None):
+        if now is None:
+            now = ICTime().timestamp()
+        return now >= self.timestamp
     
     def ring(self):
         self.handler(self)
     
     def __repr__(self):
-        return "Alarm({}, {}, repeat={})".format(self.ident, self.datetime, self.repeating)
+        return "Alarm({}, {}, {})".format(self.ident, self.datetime, self.recurrence)
 
 
 class AlarmManager:
+    """Keeps alarms in a min-heap ordered by their next fire time"""
 
     def __init__(self):
-        self.alarms = []
+        self.queue = [] # heap of [timestamp, sequence, alarm], alarm is None once cancelled
+        self.entries = {} # ident -> queue entry
+        self.sequence = 0
         self.handlers = []
     
     def add(self, alarm):
         self.cancel(alarm.ident)
-        self.alarms.append(alarm)
-        print(self.alarms)
+        self.schedule(alarm)
+        print("Alarm", alarm, "scheduled")
     
     def cancel(self, ident):
-        self.alarms = list(filter(lambda a: a.ident != ident, self.alarms))
+        entry = self.entries.pop(ident, None)
+        if entry is None:
+            return
+        
+        entry[2] = None
+        self.prune()
         print("Alarm", ident, "cancelled")
 
-    def update(self):
-        updated_alarms = []
+    def snooze(self, alarm, seconds, now=None):
+        alarm.snooze(seconds, now)
+        self.add(alarm)
+
+    def get(self, ident):
+        entry = self.entries.get(ident)
+        return entry[2] if entry is not None else None
+
+    def alarms(self):
+        return [entry[2] for entry in self.entries.values()]
+
+    def nextDeadline(self):
+        """Local timestamp of the earliest pending alarm, None if there is none"""
+        return self.queue[0][0] if self.queue else None
+
+    def update(self, now=None):
+        if not self.queue:
+            return
+        
+        if now is None:
+            now = ICTime().timestamp()
+
+        while self.queue and self.queue[0][0] <= now:
+            alarm = heapq.heappop(self.queue)[2]
+            del self.entries[alarm.ident]
 
-        while self.alarms:
-            alarm = self.alarms.pop()
-            
-            if not alarm.shouldRing():
-                updated_alarms.append(alarm)
-                continue
-            
             self.onAlarm(alarm)
 
-            if alarm.repeating:
-                alarm.updateDatetime()
-                updated_alarms.append(alarm)
+            # handlers may have rescheduled the alarm themselves
+            if alarm.repeating and alarm.ident not in self.entries:
+                alarm.updateDatetime(now)
+                self.schedule(alarm)
             
-        self.alarms = updated_alarms
+            self.prune()
+
+    def schedule(self, alarm):
+        entry = [alarm.timestamp, self.sequence, alarm]
+        self.sequence += 1
+        self.entries[alarm.ident] = entry
+        heapq.heappush(self.queue, entry)
+
+    def prune(self):
+        # cancelled entries stay in the heap until they surface at its head
+        while self.queue and self.queue[0][2] is None:
+            heapq.heappop(self.queue)
+
+        # rebuild once cancelled entries dominate, so the heap stays O(n) in live alarms
+        if len(self.queue) > 2 * len(self.entries) + 8:
+            self.queue = [entry for entry in self.queue if entry[2] is not None]
+            heapq.heapify(self.queue)
     
     def subscribeHandler(self, handler):
         self.handlers.append(handler)
@@ -186,14 +539,24 @@ class AlarmManager:
 
 
 class Audio:
+    """Starts and stops an external player module by pulsing its trigger pin
+
+    The pulse is a state machine advanced by update(), so play() and
+    stop() return at once instead of holding the loop for the pulse.
+    """
 
     DURATION_MS = 30000
+    PULSE_MS = 50
+    PULSE_LEVELS = (0, 1, 0) # one level every PULSE_MS
 
     def __init__(self, pin):
         self.pulse_pin = pin
         self.started = -999999
         self.stopped = True
         self.went_out = False
+        self.pending_pulses = 0
+        self.pulse_phase = 0
+        self.pulse_ticks = 0
 
     def play(self):
         self.stop()
@@ -214,10 +577,28 @@ class Audio:
 
     def isPlaying(self):
         return not (self.wentOut() or self.stopped)
+
+    def update(self):
+        while self.pending_pulses:
+            now = time.ticks_ms()
+            if self.pulse_phase and time.ticks_diff(now, self.pulse_ticks) < Audio.PULSE_MS:
+                return
+            
+            self.pulse_pin.value(Audio.PULSE_LEVELS[self.pulse_phase])
+            self.pulse_ticks = now
+            self.pulse_phase += 1
+            if self.pulse_phase == len(Audio.PULSE_LEVELS):
+                self.pulse_phase = 0
+                self.pending_pulses -= 1
+
+    def nextUpdateMs(self):
+        """Milliseconds until update() has work to do, None if only play() or stop() can change that"""
+        if not self.pending_pulses:
+            return None
+        if not self.pulse_phase:
+            return 0
+        return max(0, Audio.PULSE_MS - time.ticks_diff(time.ticks_ms(), self.pulse_ticks))
     
     def _pulse(self):
-        self.pulse_pin.value(0)
-        time.sleep_ms(50)
-        self.pulse_pin.value(1)
-        time.sleep_ms(50)
-        self.pulse_pin.value(0)
+        self.pending_pulses += 1
+        self.update()
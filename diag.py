@@ -0,0 +1,290 @@
+import gc
+import time
+import array
+
+
+class AllocMonitor:
+    """Samples gc.mem_alloc() around every subsystem of a loop iteration
+
+    Automatic collections are disabled while monitoring so the deltas are
+    exact; the heap is collected between frames when it runs low. Work
+    triggered by input or a changed minute may allocate once, so strict
+    mode only fails when a subsystem allocates in several calls in a row,
+    which is what an allocating steady-state path looks like. A busy loop
+    runs frame(); tasks that run on their own schedule measure() their
+    step and the render task brackets its own with startFrame() and
+    endFrame(), so a frame is whatever ran since the previous one.
+    """
+
+    STRICT_STREAK = 3
+    LOW_MEMORY_BYTES = 4096
+
+    def __init__(self, names, strict=False):
+        self.names = names
+        self.strict = strict
+        self.frames = 0
+        self.allocating_frames = 0
+        self.calls = array.array('i', [0] * len(names)) # calls that allocated
+        self.total_bytes = array.array('i', [0] * len(names))
+        self.peak_bytes = array.array('i', [0] * len(names))
+        self.streaks = array.array('i', [0] * len(names))
+        self.mark = 0
+        self.allocated_in_frame = False
+        gc.disable()
+    
+    def frame(self, steps):
+        """Runs one loop iteration, a tuple of callables in the order of names"""
+        self.startFrame()
+        for i in range(len(steps)):
+            self.measure(i, steps[i])
+        self.endFrame()
+
+    def startFrame(self):
+        if gc.mem_free() < AllocMonitor.LOW_MEMORY_BYTES:
+            gc.collect()
+
+    def measure(self, i, step):
+        """Runs step, the subsystem names[i]"""
+        self.mark = gc.mem_alloc()
+        step()
+        allocated = gc.mem_alloc() - self.mark
+
+        if allocated <= 0:
+            self.streaks[i] = 0
+            return
+        
+        self.allocated_in_frame = True
+        self.calls[i] += 1
+        self.total_bytes[i] += allocated
+        self.peak_bytes[i] = max(self.peak_bytes[i], allocated)
+        self.streaks[i] += 1
+
+        if self.strict and self.streaks[i] >= AllocMonitor.STRICT_STREAK:
+            raise AssertionError("'%s' allocated %d bytes in %d calls in a row" % (self.names[i], allocated, self.streaks[i]))
+
+    def endFrame(self):
+        self.frames += 1
+        if self.allocated_in_frame:
+            self.allocating_frames += 1
+            self.allocated_in_frame = False
+
+    def report(self):
+        print('%d of %d frames allocated' % (self.allocating_frames, self.frames))
+        for i in sorted(range(len(self.names)), key=lambda i: -self.total_bytes[i]):
+            print('  %-10s %6d calls %8d bytes total %6d bytes peak' % (self.names[i], self.calls[i], self.total_bytes[i], self.peak_bytes[i]))
+    
+    def stop(self):
+        gc.enable()
+
+
+class BootTimer:
+    """Remembers when each boot phase was done, in ticks_ms since reset"""
+
+    def __init__(self):
+        self.phases = []
+
+    def mark(self, name):
+        """Records the phase unless it already was, returns whether it was new"""
+        for (phase, _) in self.phases:
+            if phase == name:
+                return False
+        self.phases.append((name, time.ticks_ms()))
+        return True
+
+    def at(self, name):
+        for (phase, ticks) in self.phases:
+            if phase == name:
+                return ticks
+        return None
+
+    def report(self):
+        previous = 0
+        for (phase, ticks) in self.phases:
+            print('%-12s %6d ms  +%d ms' % (phase, ticks, time.ticks_diff(ticks, previous)))
+            previous = ticks
+
+
+class Histogram:
+    """Counts values into power-of-two buckets: below 2**low, then one bucket per doubling, the last one open"""
+
+    def __init__(self, name, unit, low, buckets):
+        self.name = name
+        self.unit = unit
+        self.low = low
+        self.counts = array.array('i', [0] * buckets)
+        self.peak = 0
+
+    def add(self, value):
+        bucket = 0
+        scaled = value >> self.low
+        while scaled and bucket < len(self.counts) - 1:
+            scaled >>= 1
+            bucket += 1
+        self.counts[bucket] += 1
+        if value > self.peak:
+            self.peak = value
+
+    def reset(self):
+        for i in range(len(self.counts)):
+            self.counts[i] = 0
+        self.peak = 0
+
+    def lines(self):
+        yield '%s (%s), peak %d' % (self.name, self.unit, self.peak)
+        for i in range(len(self.counts)):
+            if self.counts[i]:
+                upper = '%d' % (1 << (self.low + i)) if i < len(self.counts) - 1 else 'inf'
+                yield '  < %-7s %8d' % (upper, self.counts[i])
+
+
+class Profiler:
+    """Times every subsystem of a loop iteration, the loop period and the button to pixel latency
+
+    Everything is counted in preallocated arrays, so profiling adds two
+    ticks_us() calls per subsystem and doesn't allocate. The latency runs
+    from the button edge behind an action to the end of the first frame
+    that wrote to the panel after it. Like AllocMonitor, a busy loop runs
+    frame() and tasks measure() their step, with the render task's steps
+    between startFrame() and endFrame(); the loop period is then the one
+    of the render task. Dump it with report() from the REPL or send() it
+    as UDP datagrams, e.g. to `nc -ul 9999`.
+    """
+
+    def __init__(self, names, buttons=None, panel=None):
+        self.names = names
+        self.calls = array.array('i', [0] * len(names))
+        self.busy_ms = array.array('i', [0] * len(names))
+        self.busy_us = array.array('i', [0] * len(names)) # below a millisecond, carried into busy_ms
+        self.peak_us = array.array('i', [0] * len(names))
+        self.frames = 0
+        self.loop_period = Histogram('loop period', 'us', 7, 14)
+        self.latency = Histogram('button to pixel', 'ms', 0, 12)
+        self.frame_started = None
+        self.panel = panel
+        self.input_pending = False
+        self.input_ticks = 0
+        self.input_draws = 0
+        if buttons is not None:
+            buttons.subscribeHandler(lambda pin, action: self.onInput(buttons.action_ticks))
+
+    def onInput(self, ticks):
+        if not self.input_pending:
+            self.input_pending = True
+            self.input_ticks = ticks
+            self.input_draws = self.panel.draws if self.panel is not None else 0
+
+    def frame(self, steps):
+        """Runs one loop iteration, a tuple of callables in the order of names"""
+        self.startFrame()
+        for i in range(len(steps)):
+            self.measure(i, steps[i])
+        self.endFrame()
+
+    def startFrame(self):
+        started = time.ticks_us()
+        if self.frame_started is not None:
+            self.loop_period.add(time.ticks_diff(started, self.frame_started))
+        self.frame_started = started
+
+    def measure(self, i, step):
+        """Runs step, the subsystem names[i]"""
+        mark = time.ticks_us()
+        step()
+        elapsed = time.ticks_diff(time.ticks_us(), mark)
+
+        self.calls[i] += 1
+        self.busy_us[i] += elapsed
+        if self.busy_us[i] >= 1000:
+            self.busy_ms[i] += self.busy_us[i] // 1000
+            self.busy_us[i] %= 1000
+        if elapsed > self.peak_us[i]:
+            self.peak_us[i] = elapsed
+
+    def endFrame(self):
+        if self.input_pending and self.panel is not None and self.panel.draws != self.input_draws:
+            self.latency.add(time.ticks_diff(time.ticks_ms(), self.input_ticks))
+            self.input_pending = False
+        self.frames += 1
+
+    def reset(self):
+        for i in range(len(self.names)):
+            self.calls[i] = 0
+            self.busy_ms[i] = 0
+            self.busy_us[i] = 0
+            self.peak_us[i] = 0
+        self.frames = 0
+        self.loop_period.reset()
+        self.latency.reset()
+        self.frame_started = None
+
+    def lines(self):
+        yield '%d frames' % self.frames
+        for i in range(len(self.names)):
+            yield '  %-10s %8d calls %8d ms total %6d us peak' % (self.names[i], self.calls[i], self.busy_ms[i], self.peak_us[i])
+        for histogram in (self.loop_period, self.latency):
+            for line in histogram.lines():
+                yield line
+
+    def report(self):
+        for line in self.lines():
+            print(line)
+
+    def send(self, host, port=9999):
+        """Sends the report as UDP datagrams, one line each"""
+        import socket
+
+        address = socket.getaddrinfo(host, port)[0][-1]
+        s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            for line in self.lines():
+                s.sendto(line.encode() + b'\n', address)
+        finally:
+            s.close()
+
+
+def kernel_cases(kernels):
+    """(kernel, label, arguments, index of the output buffer among them) for bench_kernels()"""
+    cases = []
+    for count in (16, 160):
+        cases.append(('fill16', '%d px' % count, (bytearray(2 * count), 0xF81F, count), 0))
+    bits = bytes((0xA5, 0x3C, 0xFF, 0x01))
+    for (width, size) in ((6, 1), (6, 3), (32, 1), (32, 2)):
+        row = array.array('i', [0] * kernels.ROW_PARAMETERS)
+        row[kernels.ROW_WIDTH] = width
+        row[kernels.ROW_SIZE] = size
+        row[kernels.ROW_COLOR] = 0xFFFF
+        row[kernels.ROW_BACKGROUND] = 0x0010
+        cases.append(('expand_row', '%d px x%d' % (width, size), (bits, bytearray(2 * width * size), row), 1))
+    return cases
+
+def bench_kernels(repeat=200):
+    """Runs every kernel and its pure-Python reference on the same inputs, fails unless both write the
+    same bytes, and prints the best of three times for repeat calls; returns (kernel, label, reference us, kernel us)"""
+    import kernels
+
+    if not kernels.VIPER:
+        print('no viper emitter, the kernels are the references')
+    print('%-10s %-10s %11s %11s' % ('kernel', 'case', 'reference', 'selected'))
+    results = []
+    for (name, label, arguments, output) in kernel_cases(kernels):
+        (kernel, reference) = kernels.KERNELS[name]
+        timings = []
+        buffers = []
+        for function in (reference, kernel):
+            arguments = arguments[:output] + (bytearray(len(arguments[output])),) + arguments[output + 1:]
+            function(*arguments) # warm up caches before timing
+            best = None
+            for _ in range(3):
+                started = time.ticks_us()
+                for _ in range(repeat):
+                    function(*arguments)
+                elapsed = time.ticks_diff(time.ticks_us(), started)
+                best = elapsed if best is None else min(best, elapsed)
+            timings.append(best)
+            buffers.append(arguments[output])
+
+        if buffers[0] != buffers[1]:
+            raise AssertionError('%s (%s) differs from its reference' % (name, label))
+        print('%-10s %-10s %8d us %8d us  x%.1f' % (name, label, timings[0], timings[1], timings[0] / max(1, timings[1])))
+        results.append((name, label, timings[0], timings[1]))
+    return results
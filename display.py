@@ -0,0 +1,259 @@
+import array
+import binascii
+
+import kernels
+
+
+class GlyphCache:
+    """Bounded LRU of pre-scaled RGB565 glyph bitmaps"""
+
+    def __init__(self, max_bytes=8*1024):
+        self.max_bytes = max_bytes
+        self.used_bytes = 0
+        self.glyphs = {} # (font, char, size, color, background color) -> bytearray
+        self.order = [] # least recently used first
+        self.hits = 0
+        self.misses = 0
+    
+    def get(self, font, char, size, color, background_color):
+        key = (font, char, size, color, background_color)
+        glyph = self.glyphs.get(key)
+
+        if glyph is not None:
+            self.hits += 1
+            if self.order[-1] != key:
+                self.order.remove(key)
+                self.order.append(key)
+            return glyph
+        
+        self.misses += 1
+        glyph = font.rasterize(char, size, color, background_color)
+
+        while self.order and self.used_bytes + len(glyph) > self.max_bytes:
+            self.used_bytes -= len(self.glyphs.pop(self.order.pop(0)))
+        
+        # glyphs larger than the whole cache are drawn but not kept
+        if len(glyph) <= self.max_bytes:
+            self.glyphs[key] = glyph
+            self.order.append(key)
+            self.used_bytes += len(glyph)
+        
+        return glyph
+    
+    def clear(self):
+        self.glyphs = {}
+        self.order = []
+        self.used_bytes = 0
+
+
+class Panel:
+    """Bulk drawing on top of the TFT driver: every primitive is one address window write"""
+
+    LINE_BUFFER_PIXELS = 160
+
+    def __init__(self, tft, width, height, glyph_cache=None):
+        self.tft = tft
+        self.width = width
+        self.height = height
+        self.glyph_cache = glyph_cache if glyph_cache is not None else GlyphCache()
+        self.line_buffer = bytearray(2 * Panel.LINE_BUFFER_PIXELS)
+        self.line_color = None
+        self.draws = 0 # address windows written, lets the profiler see when pixels changed
+    
+    def rgbcolor(self, r, g, b):
+        return self.tft.rgbcolor(r, g, b)
+
+    def blit(self, x, y, width, height, pixels):
+        self.draws += 1
+        self.tft._set_window(x, y, x + width - 1, y + height - 1)
+        self.tft._write(data=pixels)
+
+    def blitRows(self, x, y, width, height, pixels, offset, stride):
+        """Writes a rectangle cut out of a larger buffer into one window, a row at a time"""
+        self.draws += 1
+        self.tft._set_window(x, y, x + width - 1, y + height - 1)
+        for row in range(height):
+            start = offset + row * stride
+            self.tft._write(data=pixels[start:start + 2 * width])
+
+    def fillrect(self, x, y, width, height, color):
+        if width <= 0 or height <= 0:
+            return
+        
+        line = self.lineBuffer(color)
+        remaining = 2 * width * height
+
+        # stream the whole rectangle into one window, a line buffer at a time
+        self.draws += 1
+        self.tft._set_window(x, y, x + width - 1, y + height - 1)
+        while remaining > 0:
+            chunk = min(remaining, len(self.line_buffer))
+            self.tft._write(data=line[:chunk])
+            remaining -= chunk
+
+    def lineBuffer(self, color):
+        if color != self.line_color:
+            kernels.fill16(self.line_buffer, color, Panel.LINE_BUFFER_PIXELS)
+            self.line_color = color
+        return memoryview(self.line_buffer)
+
+    def hline(self, x, y, width, color):
+        self.fillrect(x, y, width, 1, color)
+
+    def clear(self, color):
+        self.draws += 1
+        self.tft.clear(color)
+
+    def text(self, x, y, text, font, color, background_color, size=1):
+        """Draws text with opaque glyph cells, one blit per glyph; font is a fonts.FlashFont"""
+        height = font.height * size
+        for char in text:
+            glyph = self.glyph_cache.get(font, char, size, color, background_color)
+            width = font.advance(char) * size
+            self.blit(x, y, width, height, glyph)
+            x += width
+
+    def flush(self):
+        pass
+
+
+class Canvas(Panel):
+    """Off-screen RGB565 copy of a band of the screen
+
+    Drawing inside the band only touches RAM and marks tiles dirty; drawing
+    outside it goes straight to the panel. flush() checksums the dirty
+    tiles and writes only those whose content differs from what was last
+    flushed, merging neighbouring tiles of a tile row into one window.
+    A view switch therefore costs only the tiles that actually changed.
+    """
+
+    TILE_WIDTH = 16
+    TILE_HEIGHT = 8
+
+    def __init__(self, panel, x, y, width, height):
+        if width % Canvas.TILE_WIDTH or height % Canvas.TILE_HEIGHT:
+            raise ValueError("canvas size must be a multiple of %dx%d" % (Canvas.TILE_WIDTH, Canvas.TILE_HEIGHT))
+        
+        super().__init__(panel.tft, panel.width, panel.height, panel.glyph_cache)
+        self.panel = panel
+        self.x = x
+        self.y = y
+        self.canvas_width = width
+        self.canvas_height = height
+        self.stride = 2 * width
+        self.pixels = bytearray(self.stride * height)
+        self.view = memoryview(self.pixels)
+
+        self.tiles_x = width // Canvas.TILE_WIDTH
+        self.tiles_y = height // Canvas.TILE_HEIGHT
+        self.dirty = bytearray(self.tiles_x * self.tiles_y)
+        self.any_dirty = False
+        self.flushed = bytearray(self.tiles_x * self.tiles_y) # checksum valid, the panel shows that tile
+        self.checksums = array.array('I', [0] * (self.tiles_x * self.tiles_y))
+    
+    def clip(self, x, y, width, height):
+        """The part of the rectangle inside the canvas in canvas coordinates, None if there is none"""
+        x0 = max(x - self.x, 0)
+        y0 = max(y - self.y, 0)
+        x1 = min(x + width - self.x, self.canvas_width)
+        y1 = min(y + height - self.y, self.canvas_height)
+        if x0 >= x1 or y0 >= y1:
+            return None
+        return (x0, y0, x1, y1)
+    
+    def clear(self, color):
+        self.fillrect(0, 0, self.width, self.height, color)
+
+    def contains(self, x, y, width, height):
+        return x >= self.x and y >= self.y and x + width <= self.x + self.canvas_width and y + height <= self.y + self.canvas_height
+
+    def blit(self, x, y, width, height, pixels):
+        if not self.contains(x, y, width, height):
+            # straddles the edge: draw it directly; the inside part gets flushed again later
+            self.panel.blit(x, y, width, height, pixels)
+        
+        clipped = self.clip(x, y, width, height)
+        if clipped is None:
+            return
+        
+        (x0, y0, x1, y1) = clipped
+        source = memoryview(pixels)
+        source_offset = 2 * ((x0 + self.x - x) + (y0 + self.y - y) * width)
+        row_bytes = 2 * (x1 - x0)
+        for row in range(y1 - y0):
+            target = (y0 + row) * self.stride + 2 * x0
+            self.view[target:target + row_bytes] = source[source_offset:source_offset + row_bytes]
+            source_offset += 2 * width
+        self.markDirty(x0, y0, x1, y1)
+
+    def fillrect(self, x, y, width, height, color):
+        clipped = self.clip(x, y, width, height)
+        if clipped is None:
+            self.panel.fillrect(x, y, width, height, color)
+            return
+        
+        (x0, y0, x1, y1) = clipped
+        if not self.contains(x, y, width, height):
+            # the parts above, below, left and right of the canvas go straight to the panel
+            self.panel.fillrect(x, y, width, self.y + y0 - y, color)
+            self.panel.fillrect(x, self.y + y1, width, y + height - self.y - y1, color)
+            self.panel.fillrect(x, self.y + y0, self.x + x0 - x, y1 - y0, color)
+            self.panel.fillrect(self.x + x1, self.y + y0, x + width - self.x - x1, y1 - y0, color)
+        
+        # fill the first row, then copy it down
+        line = self.lineBuffer(color)
+        row_bytes = 2 * (x1 - x0)
+        first = y0 * self.stride + 2 * x0
+        done = 0
+        while done < row_bytes:
+            chunk = min(row_bytes - done, len(self.line_buffer))
+            self.view[first + done:first + done + chunk] = line[:chunk]
+            done += chunk
+        for row in range(y0 + 1, y1):
+            target = row * self.stride + 2 * x0
+            self.view[target:target + row_bytes] = self.view[first:first + row_bytes]
+        self.markDirty(x0, y0, x1, y1)
+
+    def markDirty(self, x0, y0, x1, y1):
+        for tile_y in range(y0 // Canvas.TILE_HEIGHT, (y1 - 1) // Canvas.TILE_HEIGHT + 1):
+            row = tile_y * self.tiles_x
+            for tile_x in range(x0 // Canvas.TILE_WIDTH, (x1 - 1) // Canvas.TILE_WIDTH + 1):
+                self.dirty[row + tile_x] = 1
+        self.any_dirty = True
+
+    def checksum(self, tile_x, tile_y):
+        crc = 0
+        offset = tile_y * Canvas.TILE_HEIGHT * self.stride + tile_x * Canvas.TILE_WIDTH * 2
+        for _ in range(Canvas.TILE_HEIGHT):
+            crc = binascii.crc32(self.view[offset:offset + 2 * Canvas.TILE_WIDTH], crc)
+            offset += self.stride
+        return crc
+
+    def flush(self):
+        if not self.any_dirty:
+            return
+        self.any_dirty = False
+
+        for tile_y in range(self.tiles_y):
+            run_start = -1
+            for tile_x in range(self.tiles_x + 1):
+                changed = False
+                i = tile_y * self.tiles_x + tile_x
+                if tile_x < self.tiles_x and self.dirty[i]:
+                    self.dirty[i] = 0
+                    crc = self.checksum(tile_x, tile_y)
+                    if not self.flushed[i] or crc != self.checksums[i]:
+                        self.checksums[i] = crc
+                        self.flushed[i] = 1
+                        changed = True
+                
+                if changed and run_start < 0:
+                    run_start = tile_x
+                elif not changed and run_start >= 0:
+                    self.flushRun(tile_y, run_start, tile_x)
+                    run_start = -1
+    
+    def flushRun(self, tile_y, tile_x0, tile_x1):
+        x = tile_x0 * Canvas.TILE_WIDTH
+        y = tile_y * Canvas.TILE_HEIGHT
+        self.panel.blitRows(self.x + x, self.y + y, (tile_x1 - tile_x0) * Canvas.TILE_WIDTH, Canvas.TILE_HEIGHT, self.view, y * self.stride + 2 * x, self.stride)
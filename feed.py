@@ -0,0 +1,244 @@
+import socket
+import select
+import errno
+import time
+import network
+
+from jsonscan import JSONScanner
+
+
+def parse_url(url):
+    """(host, port, path) of a plain http:// URL"""
+    if not url.startswith('http://'):
+        raise ValueError('only http:// URLs are supported')
+    (address, _, path) = url[len('http://'):].partition('/')
+    (host, _, port) = address.partition(':')
+    return (host, int(port) if port else 80, '/' + path)
+
+
+class Feed:
+    """A few fields of a JSON document on a web server, cached for ttl_s
+
+    Fetching runs over a non-blocking socket, at most MAX_READS_PER_UPDATE
+    small reads per update(), and the body goes through a JSONScanner, so
+    neither the response nor a parsed document is ever held in memory.
+    Once the TTL ran out the document is fetched again, conditionally on
+    its ETag or Last-Modified, while the old values are still served;
+    they're only dropped once they're older than max_age_s. version
+    changes whenever values does.
+    """
+
+    READ_BYTES = 128
+    LINE_BYTES = 96 # longer status and header lines are cut
+    MAX_READS_PER_UPDATE = 2
+    TIMEOUT_MS = 10000
+    POLL_INTERVAL_MS = 50
+    CONNECTION_CHECK_INTERVAL_MS = 15000
+
+    S_IDLE = 0
+    S_CONNECTING = 1
+    S_HEADERS = 2
+    S_BODY = 3
+
+    def __init__(self, url, fields, ttl_s=30*60, retry_s=5*60, max_age_s=3*60*60):
+        (self.host, self.port, self.path) = parse_url(url)
+        self.fields = fields
+        self.ttl_ms = ttl_s * 1000
+        self.retry_ms = retry_s * 1000
+        self.max_age_ms = max_age_s * 1000
+        self.scanner = JSONScanner(fields)
+        self.line = bytearray(Feed.LINE_BYTES)
+        self.line_length = 0
+
+        self.values = None # tuple of strings, one per field, None for missing ones
+        self.version = 0
+        self.fetched_ticks = 0 # when values were last confirmed
+        self.next_fetch_ticks = time.ticks_ms()
+        self.etag = None
+        self.last_modified = None
+        self.fetches = 0
+        self.not_modified = 0
+        self.failures = 0
+
+        self.address = None
+        self.sock = None
+        self.poller = None
+        self.state = Feed.S_IDLE
+        self.request = None
+        self.sent = 0
+        self.started_ticks = 0
+        self.status = 0
+        self.wlan = None
+
+    def isConnected(self):
+        if self.wlan is None:
+            self.wlan = network.WLAN(network.STA_IF)
+        return self.wlan.isconnected()
+
+    def isFetching(self):
+        return self.state != Feed.S_IDLE
+
+    def nextUpdateMs(self):
+        """Milliseconds until update() has work to do"""
+        if self.state != Feed.S_IDLE:
+            return Feed.POLL_INTERVAL_MS
+        due_ms = max(0, time.ticks_diff(self.next_fetch_ticks, time.ticks_ms()))
+        if self.values is not None:
+            # wake up in time to drop values that got too old
+            due_ms = min(due_ms, max(0, self.max_age_ms - time.ticks_diff(time.ticks_ms(), self.fetched_ticks)))
+        if not due_ms and not self.isConnected():
+            return Feed.CONNECTION_CHECK_INTERVAL_MS
+        return due_ms
+
+    def update(self):
+        if self.values is not None and time.ticks_diff(time.ticks_ms(), self.fetched_ticks) >= self.max_age_ms:
+            self.setValues(None)
+            # a 304 would confirm values that are gone, the next fetch has to be a full one
+            self.etag = None
+            self.last_modified = None
+
+        try:
+            if self.state == Feed.S_IDLE:
+                if time.ticks_diff(time.ticks_ms(), self.next_fetch_ticks) >= 0 and self.isConnected():
+                    self.start()
+            elif self.state == Feed.S_CONNECTING:
+                self.send()
+            else:
+                self.receive()
+
+            if self.state != Feed.S_IDLE and time.ticks_diff(time.ticks_ms(), self.started_ticks) >= Feed.TIMEOUT_MS:
+                raise OSError(errno.ETIMEDOUT)
+        except (OSError, ValueError, IndexError) as e:
+            # ValueError and IndexError: a malformed response
+            self.fail(e)
+
+    def start(self):
+        if self.address is None:
+            # name resolution blocks, so it is cached until connecting to the address fails
+            self.address = socket.getaddrinfo(self.host, self.port)[0][-1]
+
+        host = self.host if self.port == 80 else '%s:%d' % (self.host, self.port)
+        request = 'GET %s HTTP/1.0\r\nHost: %s\r\nAccept: application/json\r\n' % (self.path, host)
+        if self.etag is not None:
+            request += 'If-None-Match: %s\r\n' % self.etag
+        elif self.last_modified is not None:
+            request += 'If-Modified-Since: %s\r\n' % self.last_modified
+        self.request = (request + '\r\n').encode()
+        self.sent = 0
+
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setblocking(False)
+        self.poller = select.poll()
+        self.poller.register(self.sock, select.POLLOUT)
+        self.state = Feed.S_CONNECTING
+        self.started_ticks = time.ticks_ms()
+        self.fetches += 1
+        try:
+            self.sock.connect(self.address)
+        except OSError as e:
+            if e.args[0] != errno.EINPROGRESS:
+                raise
+
+    def send(self):
+        # HTTP/1.0 keeps the body plain, without chunked encoding
+        for (_, events) in self.poller.poll(0):
+            if events & (select.POLLERR | select.POLLHUP):
+                raise OSError(errno.ECONNREFUSED)
+            if events & select.POLLOUT:
+                self.sent += self.sock.send(self.request[self.sent:])
+        if self.sent == len(self.request):
+            self.request = None
+            self.poller = None
+            self.status = 0
+            self.line_length = 0
+            self.scanner.reset()
+            self.state = Feed.S_HEADERS
+
+    def receive(self):
+        for _ in range(Feed.MAX_READS_PER_UPDATE):
+            try:
+                data = self.sock.recv(Feed.READ_BYTES)
+            except OSError as e:
+                if e.args[0] != errno.EAGAIN:
+                    raise
+                return
+            if not data:
+                self.finish()
+                return
+
+            start = 0
+            if self.state == Feed.S_HEADERS:
+                start = self.readHeaders(data)
+            if self.state == Feed.S_BODY and self.status == 200:
+                self.scanner.feed(data, start)
+
+    def readHeaders(self, data):
+        """Consumes header lines, returns where the body starts in data"""
+        for i in range(len(data)):
+            c = data[i]
+            if c != 0x0A:
+                if c != 0x0D and self.line_length < len(self.line):
+                    self.line[self.line_length] = c
+                    self.line_length += 1
+                continue
+
+            if not self.line_length: # the blank line after the headers
+                self.state = Feed.S_BODY
+                return i + 1
+            self.onHeader(bytes(self.line[:self.line_length]).decode())
+            self.line_length = 0
+        return len(data)
+
+    def onHeader(self, line):
+        if not self.status:
+            # HTTP/1.1 200 OK
+            parts = line.split(' ', 2)
+            if len(parts) < 2 or not parts[0].startswith('HTTP/'):
+                raise ValueError('not an HTTP status line: %r' % line)
+            self.status = int(parts[1])
+            return
+
+        (name, _, value) = line.partition(':')
+        name = name.strip().lower()
+        if name == 'etag':
+            self.etag = value.strip()
+        elif name == 'last-modified':
+            self.last_modified = value.strip()
+
+    def finish(self):
+        status = self.status
+        self.close()
+
+        if status == 304:
+            self.not_modified += 1
+        elif status == 200:
+            self.setValues(tuple(self.scanner.value(i) for i in range(len(self.fields))))
+        else:
+            raise OSError('HTTP status %d' % status)
+
+        self.failures = 0
+        self.fetched_ticks = time.ticks_ms()
+        self.next_fetch_ticks = time.ticks_add(self.fetched_ticks, self.ttl_ms)
+
+    def setValues(self, values):
+        if values != self.values:
+            self.values = values
+            self.version += 1
+
+    def fail(self, e):
+        # a failed connect may be down to a stale address, anything later reached the server
+        if self.state == Feed.S_CONNECTING:
+            self.address = None
+        self.close()
+        self.failures += 1
+        retry_ms = min(self.retry_ms << min(self.failures - 1, 4), self.ttl_ms)
+        self.next_fetch_ticks = time.ticks_add(time.ticks_ms(), retry_ms)
+        print('Error fetching %s%s:' % (self.host, self.path), e, 'Retry in %d s' % (retry_ms // 1000))
+
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+        self.poller = None
+        self.request = None
+        self.state = Feed.S_IDLE
@@ -0,0 +1,108 @@
+import array
+import struct
+
+import kernels
+
+
+class FlashFont:
+    """Bitmap font in the binary format sim/mkfont.py writes, read straight from flash
+
+    Only the header and the glyph index are kept in RAM; a glyph's bitmap
+    is read when it's rasterized, which the display's GlyphCache does once
+    per glyph in use. The source is a path, which keeps the file open, or
+    a buffer such as a bytes object frozen into the firmware, which is
+    sliced without copying.
+
+    The file starts with HEADER_FORMAT: magic, version, height in pixels,
+    code of the first glyph and number of glyphs. INDEX_FORMAT follows for
+    every glyph: offset of its bitmap in the file, 0 if the glyph is
+    missing, and its advance width. Bitmaps are one row after the other,
+    each row (width + 7) // 8 bytes with the leftmost pixel in the MSB.
+    """
+
+    MAGIC = b'BF'
+    VERSION = 1
+    HEADER_FORMAT = '<2sBBBB'
+    INDEX_FORMAT = '<HB'
+    HEADER_BYTES = struct.calcsize(HEADER_FORMAT)
+    INDEX_BYTES = struct.calcsize(INDEX_FORMAT)
+
+    def __init__(self, source):
+        self.file = None
+        self.data = None
+        if isinstance(source, str):
+            self.file = open(source, 'rb')
+        else:
+            self.data = memoryview(source)
+
+        (magic, version, self.height, self.first, self.count) = struct.unpack(FlashFont.HEADER_FORMAT, self.read(0, FlashFont.HEADER_BYTES))
+        if magic != FlashFont.MAGIC or version != FlashFont.VERSION:
+            raise ValueError('not a version %d font' % FlashFont.VERSION)
+        index = self.read(FlashFont.HEADER_BYTES, self.count * FlashFont.INDEX_BYTES)
+        self.offsets = array.array('H', [0] * self.count)
+        self.advances = bytearray(self.count)
+        self.row_parameters = array.array('i', [0] * kernels.ROW_PARAMETERS)
+        for i in range(self.count):
+            (self.offsets[i], self.advances[i]) = struct.unpack_from(FlashFont.INDEX_FORMAT, index, i * FlashFont.INDEX_BYTES)
+        # missing glyphs are drawn as the first one, usually the space
+        for i in range(self.count):
+            if not self.offsets[i]:
+                (self.offsets[i], self.advances[i]) = (self.offsets[0], self.advances[0])
+
+    def read(self, offset, length):
+        if self.data is not None:
+            return self.data[offset:offset + length]
+        self.file.seek(offset)
+        return self.file.read(length)
+
+    def glyphIndex(self, char):
+        i = ord(char) - self.first
+        return i if 0 <= i < self.count else 0
+
+    def advance(self, char):
+        return self.advances[self.glyphIndex(char)]
+
+    def textWidth(self, text):
+        width = 0
+        for char in text:
+            width += self.advances[self.glyphIndex(char)]
+        return width
+
+    def rasterize(self, char, size, color, background_color):
+        """Glyph cell scaled by size as big-endian RGB565"""
+        i = self.glyphIndex(char)
+        (offset, width) = (self.offsets[i], self.advances[i])
+        row_bytes = (width + 7) // 8
+        bitmap = self.read(offset, row_bytes * self.height)
+
+        stride = width * size * 2
+        glyph = bytearray(stride * self.height * size)
+        pixels = memoryview(glyph)
+        parameters = self.row_parameters
+        parameters[kernels.ROW_WIDTH] = width
+        parameters[kernels.ROW_SIZE] = size
+        parameters[kernels.ROW_COLOR] = color
+        parameters[kernels.ROW_BACKGROUND] = background_color
+
+        for row in range(self.height):
+            row_start = row * size * stride
+            parameters[kernels.ROW_OFFSET] = row * row_bytes
+            parameters[kernels.ROW_START] = row_start
+            kernels.expand_row(bitmap, glyph, parameters)
+
+            # scale vertically by copying the finished row
+            for k in range(1, size):
+                pixels[row_start + k * stride:row_start + (k + 1) * stride] = pixels[row_start:row_start + stride]
+
+        return glyph
+
+
+# fonts by path, each file is opened once
+loaded = {}
+
+def load(path):
+    font = loaded.get(path)
+    if font is None:
+        font = FlashFont(path)
+        loaded[path] = font
+    return font
@@ -0,0 +1,243 @@
+import array
+
+
+class JSONScanner:
+    """Pulls the values at a few paths out of a JSON document fed in pieces
+
+    Paths are dotted, with array indexes as numbers, e.g.
+    'current_weather.temperature' or 'articles.0.title'. Only values at
+    those paths are kept, each in a fixed-size buffer: strings without
+    their quotes, other scalars as written, both cut at value_bytes.
+    Nothing else of the document is stored, so memory doesn't grow with
+    its size.
+    """
+
+    MAX_DEPTH = 12
+    PATH_BYTES = 64
+    KEY_BYTES = 32
+    VALUE_BYTES = 24
+    TOO_LONG = 255 # path length of keys under a path that didn't fit
+
+    S_VALUE = 0
+    S_AFTER_VALUE = 1
+    S_KEY = 2
+    S_COLON = 3
+    S_STRING = 4
+    S_ESCAPE = 5
+    S_UNICODE = 6
+    S_LITERAL = 7
+
+    WHITESPACE = b' \t\r\n'
+    ESCAPES = {ord('n'): ord('\n'), ord('t'): ord('\t'), ord('r'): ord('\r'), ord('b'): 8, ord('f'): 12}
+
+    def __init__(self, paths, value_bytes=VALUE_BYTES):
+        self.paths = [path.encode() for path in paths]
+        for path in self.paths:
+            if len(path) >= JSONScanner.PATH_BYTES:
+                raise ValueError('path too long: %s' % path)
+        self.values = [bytearray(value_bytes) for _ in paths]
+        self.lengths = array.array('B', [0] * len(paths))
+        self.found = bytearray(len(paths))
+
+        self.path = bytearray(JSONScanner.PATH_BYTES)
+        self.key = bytearray(JSONScanner.KEY_BYTES)
+        self.containers = bytearray(JSONScanner.MAX_DEPTH) # '{' or '[' per level
+        self.bases = bytearray(JSONScanner.MAX_DEPTH) # path length of every open container
+        self.indexes = array.array('H', [0] * JSONScanner.MAX_DEPTH)
+        self.reset()
+
+    def reset(self):
+        for i in range(len(self.paths)):
+            self.lengths[i] = 0
+            self.found[i] = 0
+        self.path_length = 0
+        self.key_length = 0
+        self.depth = 0
+        self.state = JSONScanner.S_VALUE
+        self.in_key = False
+        self.capture = -1
+        self.unicode_left = 0
+
+    def value(self, i):
+        """The value at paths[i] as a string, None if the document didn't have it"""
+        if not self.found[i]:
+            return None
+        value = self.values[i]
+        length = self.lengths[i]
+
+        # don't leave half a UTF-8 sequence where the value was cut
+        lead = length - 1
+        while lead > 0 and value[lead] & 0xC0 == 0x80:
+            lead -= 1
+        if length and value[lead] >= 0xC0:
+            needed = 4 if value[lead] >= 0xF0 else 3 if value[lead] >= 0xE0 else 2
+            if lead + needed > length:
+                length = lead
+        return bytes(value[:length]).decode()
+
+    def feed(self, data, start=0, end=None):
+        if end is None:
+            end = len(data)
+        for i in range(start, end):
+            self.scan(data[i])
+
+    def scan(self, c):
+        state = self.state
+
+        if state == JSONScanner.S_STRING:
+            if c == 0x5C: # backslash
+                self.state = JSONScanner.S_ESCAPE
+            elif c == 0x22: # closing quote
+                if self.in_key:
+                    self.enterKey()
+                    self.state = JSONScanner.S_COLON
+                else:
+                    self.endValue()
+            else:
+                self.store(c)
+            return
+
+        if state == JSONScanner.S_ESCAPE:
+            if c == 0x75: # \uXXXX, kept as a placeholder
+                self.store(0x3F)
+                self.unicode_left = 4
+                self.state = JSONScanner.S_UNICODE
+            else:
+                self.store(JSONScanner.ESCAPES.get(c, c))
+                self.state = JSONScanner.S_STRING
+            return
+
+        if state == JSONScanner.S_UNICODE:
+            self.unicode_left -= 1
+            if not self.unicode_left:
+                self.state = JSONScanner.S_STRING
+            return
+
+        if state == JSONScanner.S_LITERAL:
+            if c not in JSONScanner.WHITESPACE and c != 0x2C and c != 0x7D and c != 0x5D:
+                self.store(c)
+                return
+            self.endValue()
+            state = JSONScanner.S_AFTER_VALUE # the delimiter is handled below
+
+        if c in JSONScanner.WHITESPACE:
+            return
+
+        if state == JSONScanner.S_VALUE:
+            if c == 0x5D and self.depth and self.containers[self.depth - 1] == 0x5B: # empty array
+                self.leave()
+                return
+            self.startValue(c)
+        elif state == JSONScanner.S_AFTER_VALUE:
+            if not self.depth:
+                raise ValueError('unexpected %r after JSON' % chr(c))
+            if c == 0x2C: # comma
+                if self.containers[self.depth - 1] == 0x7B:
+                    self.state = JSONScanner.S_KEY
+                else:
+                    self.indexes[self.depth - 1] += 1
+                    self.state = JSONScanner.S_VALUE
+            elif c == 0x7D or c == 0x5D:
+                self.leave()
+            else:
+                raise ValueError('unexpected %r in JSON' % chr(c))
+        elif state == JSONScanner.S_KEY:
+            if c == 0x22:
+                self.in_key = True
+                self.key_length = 0
+                self.state = JSONScanner.S_STRING
+            elif c == 0x7D: # empty object
+                self.leave()
+            else:
+                raise ValueError('unexpected %r in JSON' % chr(c))
+        elif state == JSONScanner.S_COLON:
+            if c != 0x3A:
+                raise ValueError('unexpected %r in JSON' % chr(c))
+            self.state = JSONScanner.S_VALUE
+
+    def store(self, c):
+        if self.in_key:
+            if self.key_length < len(self.key):
+                self.key[self.key_length] = c
+            self.key_length += 1
+        elif self.capture >= 0:
+            value = self.values[self.capture]
+            length = self.lengths[self.capture]
+            if length < len(value):
+                value[length] = c
+                self.lengths[self.capture] = length + 1
+
+    def appendToPath(self, base, part, length):
+        """Sets the path to the one at base, a dot and part"""
+        separator = 1 if base else 0
+        if base == JSONScanner.TOO_LONG or length > len(part) or base + separator + length > len(self.path):
+            self.path_length = JSONScanner.TOO_LONG
+            return
+        if separator:
+            self.path[base] = 0x2E
+        for i in range(length):
+            self.path[base + separator + i] = part[i]
+        self.path_length = base + separator + length
+
+    def enterKey(self):
+        self.in_key = False
+        self.appendToPath(self.bases[self.depth - 1], self.key, self.key_length)
+
+    def enterIndex(self):
+        # the index as decimal digits, written into the key buffer
+        index = self.indexes[self.depth - 1]
+        length = 1
+        while index >= 10 ** length:
+            length += 1
+        for i in range(length - 1, -1, -1):
+            self.key[i] = 0x30 + index % 10
+            index //= 10
+        self.appendToPath(self.bases[self.depth - 1], self.key, length)
+
+    def startValue(self, c):
+        if self.depth and self.containers[self.depth - 1] == 0x5B:
+            self.enterIndex()
+
+        if c == 0x7B or c == 0x5B:
+            if self.depth == JSONScanner.MAX_DEPTH:
+                raise ValueError('JSON nested too deep')
+            self.containers[self.depth] = c
+            self.bases[self.depth] = self.path_length
+            self.indexes[self.depth] = 0
+            self.depth += 1
+            self.state = JSONScanner.S_KEY if c == 0x7B else JSONScanner.S_VALUE
+            return
+
+        self.capture = self.match()
+        if self.capture >= 0:
+            self.lengths[self.capture] = 0
+        if c == 0x22:
+            self.state = JSONScanner.S_STRING
+        else:
+            self.state = JSONScanner.S_LITERAL
+            self.store(c)
+
+    def endValue(self):
+        if self.capture >= 0:
+            self.found[self.capture] = 1
+            self.capture = -1
+        self.state = JSONScanner.S_AFTER_VALUE
+
+    def leave(self):
+        self.depth -= 1
+        self.path_length = self.bases[self.depth]
+        self.state = JSONScanner.S_AFTER_VALUE
+
+    def match(self):
+        """Index of the path being scanned in paths, -1 if it isn't one of them"""
+        length = self.path_length
+        for i in range(len(self.paths)):
+            path = self.paths[i]
+            if len(path) != length:
+                continue
+            j = 0
+            while j < length and path[j] == self.path[j]:
+                j += 1
+            if j == length:
+                return i
+        return -1
@@ -0,0 +1,57 @@
+"""Pixel loops compiled to machine code where the port allows it
+
+Every kernel has a pure-Python reference here; the viper versions live in
+kernels_viper.py, which only compiles on ports with the viper emitter and
+only loads as an .mpy built for the right architecture. Whichever of the
+two this module exports is decided once, at import; under CPython it's
+the references. diag.bench_kernels() checks both for identical output
+and reports the speedup.
+"""
+
+
+def fill16_reference(buf, color, count):
+    """Writes count big-endian RGB565 pixels of color from the start of buf"""
+    hi, lo = color >> 8, color & 0xFF
+    for i in range(0, 2 * count, 2):
+        buf[i] = hi
+        buf[i + 1] = lo
+
+
+# the parameters of expand_row in an array('i'), viper functions take no more than four arguments
+ROW_OFFSET = 0
+ROW_WIDTH = 1
+ROW_START = 2
+ROW_SIZE = 3
+ROW_COLOR = 4
+ROW_BACKGROUND = 5
+ROW_PARAMETERS = 6
+
+def expand_row_reference(bits, pixels, row):
+    """Expands row[ROW_WIDTH] pixels of a 1 bit row at bits[row[ROW_OFFSET]], MSB first,
+    into RGB565 at pixels[row[ROW_START]], each row[ROW_SIZE] times"""
+    (offset, width, start, size, color, background_color) = row
+    fg_hi, fg_lo = color >> 8, color & 0xFF
+    bg_hi, bg_lo = background_color >> 8, background_color & 0xFF
+    i = start
+    for x in range(width):
+        (hi, lo) = (fg_hi, fg_lo) if bits[offset + (x >> 3)] & (0x80 >> (x & 7)) else (bg_hi, bg_lo)
+        for _ in range(size):
+            pixels[i] = hi
+            pixels[i + 1] = lo
+            i += 2
+
+
+try:
+    # without the emitter the source fails to compile, an .mpy for another architecture fails to load
+    from kernels_viper import fill16, expand_row
+    VIPER = True
+except (ImportError, SyntaxError, ValueError):
+    fill16 = fill16_reference
+    expand_row = expand_row_reference
+    VIPER = False
+
+# name -> (selected, reference), for the benchmark
+KERNELS = {
+    'fill16': (fill16, fill16_reference),
+    'expand_row': (expand_row, expand_row_reference),
+}
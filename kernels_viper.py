@@ -0,0 +1,47 @@
+"""The kernels of kernels.py as viper functions
+
+Only imported through kernels.py, which falls back to the references
+when this module doesn't compile or load on the port. Cross-compile it
+with -march=xtensa; the row indices are kernels.ROW_*.
+"""
+
+import micropython
+
+
+@micropython.viper
+def fill16(buf: ptr8, color: int, count: int):
+    hi = (color >> 8) & 0xFF
+    lo = color & 0xFF
+    end = 2 * count
+    i = 0
+    while i < end:
+        buf[i] = hi
+        buf[i + 1] = lo
+        i += 2
+
+
+@micropython.viper
+def expand_row(bits: ptr8, pixels: ptr8, row: ptr32):
+    offset = row[0]
+    width = row[1]
+    size = row[3]
+    fg_hi = (row[4] >> 8) & 0xFF
+    fg_lo = row[4] & 0xFF
+    bg_hi = (row[5] >> 8) & 0xFF
+    bg_lo = row[5] & 0xFF
+    i = row[2]
+    x = 0
+    while x < width:
+        if bits[offset + (x >> 3)] & (0x80 >> (x & 7)):
+            hi = fg_hi
+            lo = fg_lo
+        else:
+            hi = bg_hi
+            lo = bg_lo
+        k = 0
+        while k < size:
+            pixels[i] = hi
+            pixels[i + 1] = lo
+            i += 2
+            k += 1
+        x += 1
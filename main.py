@@ -1,9 +1,12 @@
-from views import InactivityDisplayDimmer, App
-import machine
-import network
+import time
 import periph
+import base
+import tz
+import diag
+import uasyncio as asyncio
 
 app_config = {
+    'timezone': 'Europe/Berlin',
     'alarm1': {
         'alarm-hour': 7,
         'alarm-minute': 30,
@@ -11,40 +14,351 @@ app_config = {
     }
 }
 
+# (top, height) of the screen band composited off-screen, (0, 128) for all of it; None draws directly
+COMPOSITING_BAND = None
+
+ALARM_CHECK_INTERVAL_MS = 1000
+TIME_SYNC_CHECK_INTERVAL_MS = 15000
+CONFIG_CHECK_INTERVAL_MS = 1000
+POWER_CHECK_INTERVAL_MS = 100
+
+# collect the heap while the display is dark (memory.GCScheduler) instead of whenever it fills up
+GC_SCHEDULE = True
+
+# nap while the display is dark; gaps this long end in deep sleep, None never does; deep sleep needs GPIO16
+# wired to RST, so it's refused while the button is on GPIO16
+POWER_SAVE = True
+DEEPSLEEP_AFTER_MS = None
+
 style = {
     'background-color': (0, 0, 0), #(81, 45, 168),
     'color': (255, 255, 255), #(255, 64, 129),
 }
 
-def get_connection():
-    import wifimgr
-    import sys
-    import gc
+# a line of current weather under the clock, fetched over plain HTTP every FEED_TTL_S; None leaves it out, e.g.
+# ('http://api.open-meteo.com/v1/forecast?latitude=52.52&longitude=13.41&current_weather=true',
+#  ('current_weather.temperature', 'current_weather.windspeed'), '%s C  wind %s km/h')
+WEATHER_FEED = None
+FEED_TTL_S = 30*60
+
+# port of the HTTP server for reading and editing the config and alarms (server.ConfigServer), None runs none;
+# it has no authentication and listens on every interface, so only turn it on in a network you trust, e.g. 80
+CONFIG_SERVER_PORT = None
+
+# where main(profile=True) sends its report every PROFILE_REPORT_INTERVAL_MS, e.g. ('192.168.1.10', 9999); None only keeps it for the REPL
+PROFILE_REPORT_TO = None
+PROFILE_REPORT_INTERVAL_MS = 10000
+
+# milliseconds since reset at which each boot phase was done
+boot_timer = diag.BootTimer()
+
+# the feed.Feed behind the weather line, None without one
+weather = None
+
+# the server.ConfigServer, None without one
+config_server = None
+
+# the memory.GCScheduler, call gc_scheduler.report() for its pauses
+gc_scheduler = None
+
+# main(profile=True) keeps its diag.Profiler here, interrupt the loop and call profiler.report()
+profiler = None
+
+# what main(profile=True) or main(debug=True) measures every step with, None runs them as they are
+monitor = None
+
+# the subsystems a monitor tells apart, by index
+SUBSYSTEMS = ('buttons', 'wifi', 'time', 'alarms', 'render', 'audio', 'config', 'feed', 'server', 'gc', 'power')
+(BUTTONS, WIFI, TIME, ALARMS, RENDER, AUDIO, CONFIG, FEED, SERVER, GC, POWER) = range(len(SUBSYSTEMS))
+
+def step(index, update):
+    """Runs a subsystem's update, under the monitor if there is one"""
+    if monitor is None:
+        update()
+    else:
+        monitor.measure(index, update)
+
+# the tasks bind their updates once, a bound method made per call would allocate
 
-    wlan = None
-    while not wlan:
-        wlan = wifimgr.get_connection()
-    
-    del wifimgr
-    del sys.modules['wifimgr']
-    gc.collect()
-    
-    return wlan
+async def watch_buttons(buttons):
+    # with interrupts, only poll while a button is held or bouncing and otherwise wait for the next edge
+    edge = None
+    if buttons.irq and hasattr(asyncio, 'ThreadSafeFlag'):
+        edge = asyncio.ThreadSafeFlag()
+        buttons.subscribeEdgeHandler(edge.set)
+    update = buttons.update
+    while True:
+        step(BUTTONS, update)
+        if edge is not None and buttons.isIdle():
+            await edge.wait()
+        else:
+            await asyncio.sleep_ms(base.Buttons.POLL_INTERVAL_MS)
+
+async def watch_alarms(alarm_manager, ic_time):
+    def update():
+        alarm_manager.update(ic_time.timestamp())
+    while True:
+        step(ALARMS, update)
+
+        # wake up for the head alarm, but recheck regularly in case alarms are added or the clock is synced
+        timeout_ms = ALARM_CHECK_INTERVAL_MS
+        deadline = alarm_manager.nextDeadline()
+        if deadline is not None:
+            timeout_ms = min(timeout_ms, ic_time.msUntil(deadline))
+        await asyncio.sleep_ms(timeout_ms)
 
-def main():
+async def connect_wifi(wifi):
+    update = wifi.update
+    while True:
+        step(WIFI, update)
+        await asyncio.sleep_ms(wifi.nextUpdateMs())
+
+async def sync_time(ic_time):
+    update = ic_time.update
+    while True:
+        step(TIME, update)
+        # the WLAN may come up before the next sync is due, so recheck regularly
+        await asyncio.sleep_ms(min(ic_time.nextUpdateMs(), TIME_SYNC_CHECK_INTERVAL_MS))
 
-    wlan = get_connection()
+async def fetch_feed(feed):
+    update = feed.update
+    while True:
+        step(FEED, update)
+        await asyncio.sleep_ms(feed.nextUpdateMs())
 
+async def serve_config(server):
+    update = server.update
+    while True:
+        step(SERVER, update)
+        await asyncio.sleep_ms(server.nextUpdateMs())
+
+async def render(dimmer, wakeup):
+    # frames of the monitor are render passes
+    update = dimmer.update
+    while True:
+        wakeup.clear()
+        if monitor is None:
+            update()
+        else:
+            monitor.startFrame()
+            monitor.measure(RENDER, update)
+            monitor.endFrame()
+
+        timeout_ms = dimmer.nextUpdateMs()
+        if timeout_ms is None:
+            await wakeup.wait()
+            continue
+
+        try:
+            await asyncio.wait_for_ms(wakeup.wait(), timeout_ms)
+        except asyncio.TimeoutError:
+            pass
+
+async def play_audio(audio, wakeup):
+    # play() and stop() are called from input and alarm handlers, which also set wakeup
+    update = audio.update
+    while True:
+        wakeup.clear()
+        step(AUDIO, update)
+
+        timeout_ms = audio.nextUpdateMs()
+        if timeout_ms is None:
+            await wakeup.wait()
+            continue
+
+        try:
+            await asyncio.wait_for_ms(wakeup.wait(), timeout_ms)
+        except asyncio.TimeoutError:
+            pass
+
+async def persist_config(store):
+    update = store.update
+    while True:
+        step(CONFIG, update)
+        timeout_ms = store.nextUpdateMs()
+        await asyncio.sleep_ms(CONFIG_CHECK_INTERVAL_MS if timeout_ms is None else min(timeout_ms, CONFIG_CHECK_INTERVAL_MS))
+
+async def collect_garbage(scheduler):
+    update = scheduler.update
+    while True:
+        step(GC, update)
+        await asyncio.sleep_ms(scheduler.nextUpdateMs())
+
+async def save_power(power_manager):
+    # naps block the whole scheduler, which is the point: every other task waits for a deadline
+    update = power_manager.update
+    while True:
+        step(POWER, update)
+        await asyncio.sleep_ms(POWER_CHECK_INTERVAL_MS)
+
+async def report_profile(profiler, to):
+    while True:
+        await asyncio.sleep_ms(PROFILE_REPORT_INTERVAL_MS)
+        profiler.send(*to)
+
+async def run_tasks(dimmer, wakeup, audio_wakeup, power_manager=None):
+    tasks = [
+        asyncio.create_task(watch_buttons(periph.buttons_watcher)),
+        asyncio.create_task(play_audio(periph.audio, audio_wakeup)),
+        asyncio.create_task(watch_alarms(periph.alarm_manager, periph.ic_time)),
+        asyncio.create_task(connect_wifi(periph.wifi)),
+        asyncio.create_task(sync_time(periph.ic_time)),
+        asyncio.create_task(persist_config(periph.config_store)),
+    ]
+    if weather is not None:
+        tasks.append(asyncio.create_task(fetch_feed(weather)))
+    if config_server is not None:
+        tasks.append(asyncio.create_task(serve_config(config_server)))
+    if gc_scheduler is not None:
+        tasks.append(asyncio.create_task(collect_garbage(gc_scheduler)))
+    if power_manager is not None:
+        tasks.append(asyncio.create_task(save_power(power_manager)))
+    if profiler is not None and PROFILE_REPORT_TO is not None:
+        tasks.append(asyncio.create_task(report_profile(profiler, PROFILE_REPORT_TO)))
+
+    if monitor is None:
+        await render(dimmer, wakeup)
+    else:
+        # a failed check in any task ends the run, like it ends the busy loop
+        await asyncio.gather(render(dimmer, wakeup), *tasks)
+
+def boot():
+    """Shows the clock as early as possible, returns the dimmer; WiFi and NTP follow in the background"""
+
+    # the backlight stays off until the first frame is drawn, so there is no point clearing the screen before
     periph.TFT.init()
+    boot_timer.mark('display')
+
+    periph.config_store.load(app_config)
+    periph.ic_time.setZone(tz.zone(app_config['timezone']))
+    # the RTC forgets the time without power, the last synced time is a better start than the epoch
+    if time.time() < periph.config_store.utc_time:
+        base.ICTime.anchor(periph.config_store.utc_time)
+    periph.ic_time.subscribeHandler(periph.config_store.saveTime)
+    boot_timer.mark('clock')
 
-    app = App(style, app_config)
-    dimmer = InactivityDisplayDimmer(app, 0.005, periph.display_led_pwm, inactivity_timeout_ms=6000)
+    # the views open their fonts, only import them once the display is up
+    from views import InactivityDisplayDimmer, App
+
+    canvas = None
+    if COMPOSITING_BAND is not None:
+        from display import Canvas
+        (top, height) = COMPOSITING_BAND
+        canvas = Canvas(periph.display, 0, top, periph.DISPLAY_WIDTH, height)
+
+    panels = ()
+    if WEATHER_FEED is not None:
+        from feed import Feed
+        from views import FeedPanel
+        global weather
+        (url, fields, fmt) = WEATHER_FEED
+        weather = Feed(url, fields, ttl_s=FEED_TTL_S)
+        panels = (FeedPanel(style, weather, fmt, key='weather'),)
+
+    app = App(style, app_config, canvas=canvas, store=periph.config_store, panels=panels)
+    dimmer = InactivityDisplayDimmer(app, 2000, periph.display_led_pwm, inactivity_timeout_ms=6000)
+    boot_timer.mark('app')
+
+    app.update()
     dimmer.displayOn()
+    boot_timer.mark('first-frame')
+
+    # listens on all interfaces, so it is reachable once WiFi is up
+    if CONFIG_SERVER_PORT is not None:
+        from server import ConfigServer
+        global config_server
+        config_server = ConfigServer(app, periph.alarm_manager, port=CONFIG_SERVER_PORT)
+
+    periph.wifi.subscribeHandler(lambda wlan: boot_timer.mark('wifi'))
+    def onSynced(utc_time):
+        if boot_timer.mark('ntp'):
+            boot_timer.report()
+    periph.ic_time.subscribeHandler(onSynced)
+    return dimmer
+
+def main(cooperative=True, debug=False, profile=False):
+    """profile measures every subsystem with diag.Profiler, debug with diag.AllocMonitor, which fails once a
+    subsystem keeps allocating; either way the loop is the one that runs without them, the cooperative tasks
+    or with cooperative=False the busy loop"""
+
+    dimmer = boot()
 
     periph.buttons_watcher.subscribeHandler(lambda pin, action: dimmer.onInput(pin, action))
     periph.alarm_manager.subscribeHandler(lambda alarm: dimmer.displayOn())
 
+    if GC_SCHEDULE:
+        import memory
+        global gc_scheduler
+        gc_scheduler = memory.GCScheduler(dimmer, periph.buttons_watcher, periph.alarm_manager, periph.ic_time, audio=periph.audio)
+
+    power_manager = None
+    if POWER_SAVE:
+        import power
+        deepsleep_after_ms = DEEPSLEEP_AFTER_MS
+        if deepsleep_after_ms is not None and periph.PRIMARY_BUTTON_PIN == periph.DEEPSLEEP_WAKE_PIN:
+            # wired to RST, a press would reset the clock
+            print('No deep sleep, the button is on GPIO%d which wakes from it' % periph.DEEPSLEEP_WAKE_PIN)
+            deepsleep_after_ms = None
+        power_manager = power.PowerManager(dimmer, periph.buttons_watcher, periph.alarm_manager, periph.ic_time,
+                                           audio=periph.audio, store=periph.config_store, feed=weather, server=config_server, wifi=periph.wifi, deepsleep_after_ms=deepsleep_after_ms)
+
+    global monitor, profiler
+    alloc_monitor = None
+    if profile:
+        profiler = monitor = diag.Profiler(SUBSYSTEMS, buttons=periph.buttons_watcher, panel=periph.display)
+    elif debug:
+        alloc_monitor = monitor = diag.AllocMonitor(SUBSYSTEMS, strict=True)
+
+    try:
+        if cooperative:
+            # input and alarms wake the renderer; everything else sleeps until its next deadline
+            wakeup = asyncio.Event()
+            audio_wakeup = asyncio.Event()
+            def wake(*args):
+                wakeup.set()
+                audio_wakeup.set()
+            periph.buttons_watcher.subscribeHandler(wake)
+            periph.alarm_manager.subscribeHandler(wake)
+            asyncio.run(run_tasks(dimmer, wakeup, audio_wakeup, power_manager))
+        else:
+            busy_loop(dimmer, power_manager)
+    finally:
+        if alloc_monitor is not None:
+            alloc_monitor.report()
+            alloc_monitor.stop()
+
+def busy_loop(dimmer, power_manager):
+    steps = [
+        (BUTTONS, periph.buttons_watcher.update),
+        (WIFI, periph.wifi.update),
+        (TIME, periph.ic_time.update),
+        (ALARMS, lambda: periph.alarm_manager.update(periph.ic_time.timestamp())),
+        (RENDER, dimmer.update),
+        (AUDIO, periph.audio.update),
+        (CONFIG, periph.config_store.update),
+    ]
+    if weather is not None:
+        steps.append((FEED, weather.update))
+    if config_server is not None:
+        steps.append((SERVER, config_server.update))
+    if gc_scheduler is not None:
+        # before the power manager, the window before a nap is the best one
+        steps.append((GC, gc_scheduler.update))
+    if power_manager is not None:
+        steps.append((POWER, power_manager.update))
+
+    if monitor is None:
+        updates = tuple(update for (_, update) in steps)
+        while True:
+            for update in updates:
+                update()
+
+    reported = time.ticks_ms()
     while True:
-        periph.buttons_watcher.update()
-        periph.alarm_manager.update()
-        dimmer.update()
+        monitor.startFrame()
+        for (index, update) in steps:
+            monitor.measure(index, update)
+        monitor.endFrame()
+        if monitor is profiler and PROFILE_REPORT_TO is not None and time.ticks_diff(time.ticks_ms(), reported) >= PROFILE_REPORT_INTERVAL_MS:
+            profiler.send(*PROFILE_REPORT_TO)
+            reported = time.ticks_ms()
@@ -0,0 +1,119 @@
+import gc
+import time
+
+from diag import Histogram
+
+
+class GCScheduler:
+    """Collects the heap in idle windows, so collections don't land in a frame or a press
+
+    An idle window is while the display is dark and not fading, no button
+    is busy, nothing plays and no alarm is due within ALARM_GUARD_MS. A
+    collection runs in one once collect_after_bytes were allocated since
+    the last, or MAX_INTERVAL_MS after the last one. Should the headroom
+    drop below LOW_HEADROOM_BYTES while the display is lit, the heap is
+    collected between loop steps with the buttons idle rather than in the
+    middle of whatever allocates next. gc.threshold() is set to
+    threshold_bytes as a backstop for when no window comes along.
+
+    MicroPython's collector isn't incremental, every collection is a full
+    one. Their durations go into a histogram and collections that weren't
+    scheduled are counted, from mem_alloc() dropping between two updates
+    (on the device, that is; CPython frees by reference counting).
+    """
+
+    ALARM_GUARD_MS = 2000
+    COLLECT_AFTER_BYTES = 8 * 1024
+    THRESHOLD_BYTES = 16 * 1024
+    LOW_HEADROOM_BYTES = 6 * 1024
+    MAX_INTERVAL_MS = 60000 # so garbage doesn't sit in the heap all night
+    CHECK_INTERVAL_MS = 500
+
+    # why a collection ran, indexes into counts
+    IDLE = 0
+    INTERVAL = 1
+    LOW_HEADROOM = 2
+    REASONS = ('idle', 'interval', 'low headroom')
+
+    def __init__(self, dimmer, buttons, alarm_manager, ic_time, audio=None, collect_after_bytes=COLLECT_AFTER_BYTES, threshold_bytes=THRESHOLD_BYTES):
+        self.dimmer = dimmer
+        self.buttons = buttons
+        self.alarm_manager = alarm_manager
+        self.ic_time = ic_time
+        self.audio = audio
+        self.collect_after_bytes = collect_after_bytes
+        gc.threshold(threshold_bytes)
+
+        self.pauses = Histogram('gc pause', 'us', 8, 10)
+        self.counts = [0] * len(GCScheduler.REASONS)
+        self.unscheduled = 0
+        self.freed_bytes = 0
+        self.last_pause_us = 0
+        self.collected_ticks = time.ticks_ms()
+        self.collected_alloc = gc.mem_alloc() # heap use right after the last collection
+        self.last_alloc = self.collected_alloc
+
+    def isIdleWindow(self):
+        if self.dimmer.isDisplayOn() or self.dimmer.isFading():
+            return False
+        if self.audio is not None and self.audio.isPlaying():
+            return False
+        if not self.buttons.isIdle():
+            return False
+        deadline = self.alarm_manager.nextDeadline()
+        return deadline is None or self.ic_time.msUntil(deadline) > GCScheduler.ALARM_GUARD_MS
+
+    def nextUpdateMs(self):
+        return GCScheduler.CHECK_INTERVAL_MS
+
+    def update(self):
+        alloc = gc.mem_alloc()
+        if alloc < self.last_alloc:
+            # nothing but a collection shrinks the heap
+            self.unscheduled += 1
+            self.collected_alloc = alloc
+            self.collected_ticks = time.ticks_ms()
+        self.last_alloc = alloc
+
+        if not self.buttons.isIdle():
+            return
+        if gc.mem_free() < GCScheduler.LOW_HEADROOM_BYTES:
+            self.collect(GCScheduler.LOW_HEADROOM)
+            return
+        if not self.isIdleWindow() or alloc == self.collected_alloc:
+            return
+        if alloc - self.collected_alloc >= self.collect_after_bytes:
+            self.collect(GCScheduler.IDLE)
+        elif time.ticks_diff(time.ticks_ms(), self.collected_ticks) >= GCScheduler.MAX_INTERVAL_MS:
+            self.collect(GCScheduler.INTERVAL)
+
+    def collect(self, reason):
+        before = gc.mem_alloc()
+        started = time.ticks_us()
+        gc.collect()
+        self.last_pause_us = time.ticks_diff(time.ticks_us(), started)
+        self.pauses.add(self.last_pause_us)
+        self.counts[reason] += 1
+
+        self.collected_alloc = gc.mem_alloc()
+        self.last_alloc = self.collected_alloc
+        self.freed_bytes += max(0, before - self.collected_alloc)
+        self.collected_ticks = time.ticks_ms()
+
+    def lines(self):
+        yield 'gc: %s, %d unscheduled, %d bytes freed, %d bytes free' % (
+            ', '.join('%d %s' % (self.counts[i], GCScheduler.REASONS[i]) for i in range(len(self.counts))),
+            self.unscheduled, self.freed_bytes, gc.mem_free())
+        for line in self.pauses.lines():
+            yield line
+
+    def report(self):
+        for line in self.lines():
+            print(line)
+
+    def reset(self):
+        self.pauses.reset()
+        for i in range(len(self.counts)):
+            self.counts[i] = 0
+        self.unscheduled = 0
+        self.freed_bytes = 0
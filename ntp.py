@@ -0,0 +1,106 @@
+import socket
+import struct
+import errno
+import time
+import machine
+
+# seconds between the NTP era (1900) and the device epoch (2000 on MicroPython, 1970 elsewhere)
+NTP_DELTA = 3155673600 if time.localtime(0)[0] == 2000 else 2208988800
+
+
+class NTPClient:
+    """Asynchronous SNTP exchange over a non-blocking UDP socket"""
+
+    NTP_PORT = 123
+    TIMEOUT_MS = 2000
+    MAX_TIMEOUTS = 3 # in a row before the name is resolved again, a pool server may be gone for good
+
+    MODE_CLIENT = 3
+    MODE_SERVER = 4
+
+    def __init__(self, host='pool.ntp.org', port=NTP_PORT, timeout_ms=TIMEOUT_MS):
+        self.host = host
+        self.port = port
+        self.timeout_ms = timeout_ms
+        self.address = None
+        self.timeouts = 0
+        self.sock = None
+        self.sent_ticks = 0
+        self.packet = bytearray(48)
+    
+    def request(self):
+        self.close()
+
+        if self.address is None:
+            # name resolution blocks, so it is cached until the server refuses or stops answering
+            self.address = socket.getaddrinfo(self.host, self.port)[0][-1]
+
+        for i in range(len(self.packet)):
+            self.packet[i] = 0
+        self.packet[0] = (3 << 3) | NTPClient.MODE_CLIENT # version 3, client
+        self.sent_ticks = time.ticks_ms()
+        struct.pack_into('!II', self.packet, 40, 0, self.sent_ticks) # transmit timestamp doubles as cookie
+
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setblocking(False)
+        try:
+            self.sock.sendto(self.packet, self.address)
+        except OSError:
+            # the network, not the server
+            self.close()
+            raise
+    
+    def isPending(self):
+        return self.sock is not None
+
+    def poll(self):
+        """Returns (utc seconds, milliseconds, ticks) once the reply arrived, None while pending"""
+        try:
+            response = self.sock.recv(48)
+        except OSError as e:
+            if e.args[0] != errno.EAGAIN:
+                self.fail()
+                raise
+            if time.ticks_diff(time.ticks_ms(), self.sent_ticks) >= self.timeout_ms:
+                self.close()
+                self.timeouts += 1
+                if self.timeouts >= NTPClient.MAX_TIMEOUTS:
+                    self.fail()
+                raise OSError(errno.ETIMEDOUT)
+            return None
+        
+        received_ticks = time.ticks_ms()
+
+        # ignore stray or stale replies and keep waiting for ours
+        if len(response) < 48 or response[0] & 7 != NTPClient.MODE_SERVER or response[24:32] != self.packet[40:48]:
+            return None
+        
+        self.close()
+        self.timeouts = 0
+
+        if response[1] == 0: # kiss-o'-death
+            self.fail()
+            raise OSError(errno.ECONNREFUSED)
+        
+        (seconds, fraction) = struct.unpack_from('!II', response, 40)
+
+        # the server stamped its reply about half a round trip ago
+        round_trip_ms = time.ticks_diff(received_ticks, self.sent_ticks)
+        ms = ((fraction * 1000) >> 32) + round_trip_ms // 2
+        return (seconds - NTP_DELTA + ms // 1000, ms % 1000, received_ticks)
+
+    def fail(self):
+        """Drops the socket and the address, the server refused or stopped answering"""
+        self.close()
+        self.address = None
+        self.timeouts = 0
+
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+
+def setRTC(utc_time):
+    tm = time.localtime(utc_time)
+    machine.RTC().datetime((tm[0], tm[1], tm[2], tm[6] + 1, tm[3], tm[4], tm[5], 0))
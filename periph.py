@@ -7,13 +7,33 @@ _rst = Pin(2, Pin.OUT)
 _spi = SPI(1, baudrate=16000000, polarity=0, phase=0)
 TFT = TFT_GREEN(128, 160, _spi, _dc, _cs, _rst, rotate=90)
 
+
+from display import Panel, GlyphCache
+
+DISPLAY_WIDTH = 160
+DISPLAY_HEIGHT = 128
+
+display = Panel(TFT, DISPLAY_WIDTH, DISPLAY_HEIGHT, GlyphCache(max_bytes=8*1024))
+
 display_led_pwm = PWM(Pin(5), freq=1000)
 
 
 from base import Buttons
 
-primary_button = Pin(16, Pin.IN | Pin.PULL_UP)
-buttons_watcher = Buttons([primary_button])
+# GPIO16 has no interrupts on the ESP8266, a button there has to be polled
+NO_IRQ_PINS = (16,)
+
+# deep sleep ends by GPIO16 pulling RST low, so it needs the two wired together
+DEEPSLEEP_WAKE_PIN = 16
+
+PRIMARY_BUTTON_PIN = 16
+primary_button = Pin(PRIMARY_BUTTON_PIN, Pin.IN | Pin.PULL_UP)
+buttons_watcher = Buttons([primary_button], irq=PRIMARY_BUTTON_PIN not in NO_IRQ_PINS)
+
+
+from wifi import WiFiConnector
+
+wifi = WiFiConnector()
 
 
 from base import ICTime
@@ -26,8 +46,27 @@ from base import AlarmManager
 alarm_manager = AlarmManager()
 
 
+from store import ConfigStore, FileFlash
+
+# a file on the filesystem, so how evenly the flash wears is up to the filesystem;
+# EspFlash takes raw sectors instead, which the firmware has to leave out of the filesystem
+config_store = ConfigStore(FileFlash('config.bin'), alarm_manager=alarm_manager)
+
+
 from base import Audio
 
 _audio_pin = Pin(12, Pin.OUT)
 _audio_pin.value(0)
 audio = Audio(_audio_pin)
+
+# a clip to stream from flash instead, ramping up over the first 20 s; only ports with I2S can
+# play it, the ESP8266 keeps the pulse
+AUDIO_CLIP = None # e.g. 'alarm.wav'
+
+if AUDIO_CLIP is not None:
+    from audio import SamplePlayer, I2SSink, can_stream
+
+    if can_stream(AUDIO_CLIP):
+        audio = SamplePlayer(I2SSink(0, Pin(13), Pin(14), Pin(15)), AUDIO_CLIP, ramp_ms=20000, duration_ms=Audio.DURATION_MS)
+    else:
+        print('Cannot stream', AUDIO_CLIP, 'here, keeping the pulse')
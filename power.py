@@ -0,0 +1,142 @@
+import machine
+import time
+
+
+class PowerManager:
+    """Sleeps between deadlines while the display is dark
+
+    The next wakeup is the earliest of the pending alarm, the next time
+    sync, the dimmer's own timers, a pending config write, the next feed
+    fetch and the next WiFi check, and there are no naps while a fetch is
+    in flight, the config server is busy with a client or the WiFi setup
+    portal is open, as it has to answer within its timeouts. Naps go
+    through machine.lightsleep, which keeps RAM and the tick counter;
+    button edges are still captured by the IRQ handlers while napping, and
+    a nap never lasts longer than max_nap_ms so a press lights the display
+    promptly even on ports whose lightsleep only ends on its timeout. Gaps
+    of at least deepsleep_after_ms end in machine.deepsleep, which resets
+    the device when the RTC alarm fires; it's off by default, as it needs
+    GPIO16 wired to RST and everything that's not persisted is lost, and
+    main refuses it while the button is on GPIO16.
+    """
+
+    MIN_SLEEP_MS = 20 # shorter gaps aren't worth the wakeup
+    IRQ_NAP_MS = 250
+    POLLED_NAP_MS = 50 # a polled button is only sampled between naps
+
+    def __init__(self, dimmer, buttons, alarm_manager, ic_time, audio=None, store=None, feed=None, server=None, wifi=None, max_nap_ms=None, deepsleep_after_ms=None):
+        self.dimmer = dimmer
+        self.buttons = buttons
+        self.alarm_manager = alarm_manager
+        self.ic_time = ic_time
+        self.audio = audio
+        self.store = store
+        self.feed = feed
+        self.server = server
+        self.wifi = wifi
+        if max_nap_ms is None:
+            max_nap_ms = PowerManager.IRQ_NAP_MS if buttons.irq else PowerManager.POLLED_NAP_MS
+        self.max_nap_ms = max_nap_ms
+        self.deepsleep_after_ms = deepsleep_after_ms
+
+        # time spent awake and asleep since the last report
+        self.awake_ms = 0
+        self.asleep_ms = 0
+        self.naps = 0
+        self.woken_by_input = 0
+        self.awake_since = time.ticks_ms()
+
+    def canSleep(self):
+        if self.dimmer.isDisplayOn() or self.dimmer.isFading():
+            return False
+        if self.audio is not None and self.audio.isPlaying():
+            return False
+        if self.feed is not None and self.feed.isFetching():
+            return False
+        if self.server is not None and self.server.isServing():
+            return False
+        if self.wifi is not None and self.wifi.isPortalOpen():
+            return False
+        return self.buttons.isIdle()
+
+    def nextWakeupMs(self):
+        """Milliseconds until something other than input needs the CPU"""
+        wakeup = self.ic_time.nextUpdateMs()
+
+        deadline = self.alarm_manager.nextDeadline()
+        if deadline is not None:
+            wakeup = min(wakeup, self.ic_time.msUntil(deadline))
+
+        display = self.dimmer.nextUpdateMs()
+        if display is not None:
+            wakeup = min(wakeup, display)
+
+        if self.store is not None:
+            write = self.store.nextUpdateMs()
+            if write is not None:
+                wakeup = min(wakeup, write)
+
+        if self.feed is not None:
+            wakeup = min(wakeup, self.feed.nextUpdateMs())
+
+        if self.server is not None:
+            wakeup = min(wakeup, self.server.nextUpdateMs())
+
+        if self.wifi is not None:
+            wakeup = min(wakeup, self.wifi.nextUpdateMs())
+
+        return wakeup
+
+    def update(self):
+        """Sleeps until the next wakeup if nothing is going on, returns whether it did"""
+        if not self.canSleep():
+            return False
+
+        sleep_ms = self.nextWakeupMs()
+        if sleep_ms < PowerManager.MIN_SLEEP_MS:
+            return False
+
+        if self.deepsleep_after_ms is not None and sleep_ms >= self.deepsleep_after_ms:
+            self.report()
+            if self.store is not None:
+                self.store.flush()
+            machine.deepsleep(sleep_ms)
+
+        self.sleep(sleep_ms)
+        return True
+
+    def sleep(self, sleep_ms):
+        started = time.ticks_ms()
+        self.awake_ms += time.ticks_diff(started, self.awake_since)
+
+        remaining = sleep_ms
+        while remaining >= PowerManager.MIN_SLEEP_MS:
+            machine.lightsleep(min(remaining, self.max_nap_ms))
+            self.naps += 1
+            if not self.buttons.isIdle():
+                self.woken_by_input += 1
+                break
+            if not self.buttons.irq:
+                # sample the pins, a press makes the buttons busy
+                self.buttons.update()
+                if not self.buttons.isIdle():
+                    self.woken_by_input += 1
+                    break
+            remaining = sleep_ms - time.ticks_diff(time.ticks_ms(), started)
+
+        self.awake_since = time.ticks_ms()
+        self.asleep_ms += time.ticks_diff(self.awake_since, started)
+
+    def report(self):
+        self.awake_ms += time.ticks_diff(time.ticks_ms(), self.awake_since)
+        self.awake_since = time.ticks_ms()
+        total_ms = max(1, self.awake_ms + self.asleep_ms)
+        print('Awake %d ms (%d%%), asleep %d ms in %d naps, %d ended by input' % (
+            self.awake_ms, self.awake_ms * 100 // total_ms, self.asleep_ms, self.naps, self.woken_by_input))
+
+    def reset(self):
+        self.awake_ms = 0
+        self.asleep_ms = 0
+        self.naps = 0
+        self.woken_by_input = 0
+        self.awake_since = time.ticks_ms()
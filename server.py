@@ -0,0 +1,402 @@
+import socket
+import errno
+import json
+import time
+
+import base
+import tz
+
+
+WEEKDAY_LETTERS = 'MTWTFSS'
+
+def format_weekdays(weekdays):
+    """'MTWTF--' for a bitmask with bit 0 = Monday"""
+    return ''.join(WEEKDAY_LETTERS[i] if weekdays & (1 << i) else '-' for i in range(7))
+
+def parse_weekdays(text):
+    if len(text) != 7:
+        raise ValueError("weekdays must look like 'MTWTF--'")
+    weekdays = 0
+    for i in range(7):
+        if text[i] != '-':
+            weekdays |= 1 << i
+    return weekdays
+
+def unquote(text):
+    """Decodes a form-encoded value"""
+    text = text.replace('+', ' ')
+    if '%' not in text:
+        return text
+    parts = text.split('%')
+    decoded = bytearray(parts[0].encode())
+    for part in parts[1:]:
+        decoded.append(int(part[:2], 16))
+        decoded.extend(part[2:].encode())
+    return bytes(decoded).decode()
+
+
+class ConfigServer:
+    """Reads and edits the settings and alarms over HTTP, from within the main loop
+
+    One client is served at a time, the next one waits in the listen
+    backlog. update() never blocks: it reads at most MAX_READS_PER_UPDATE
+    small chunks and sends at most SEND_BYTES, and a client that takes
+    longer than CLIENT_TIMEOUT_MS is dropped. Request and header lines are
+    kept in one LINE_BYTES buffer and bodies are processed line by line as
+    they arrive, so a bulk import of alarms is never held in memory.
+
+        GET  /config   the app config as JSON
+        POST /config   form fields: timezone, alarm-hour, alarm-minute, alarm-on, alarm-weekdays
+        GET  /alarms   one 'ident HH:MM MTWTF-- [once]' line per alarm
+        POST /alarms   lines like those add or replace alarms, 'ident off' cancels one
+
+    Alarms posted to /alarms are persisted by the app's store.ConfigStore
+    with the config, which is why their number and ident length are capped.
+    """
+
+    PORT = 80
+    READ_BYTES = 128
+    MAX_READS_PER_UPDATE = 2
+    SEND_BYTES = 256
+    LINE_BYTES = 128
+    MAX_BODY_BYTES = 16 * 1024
+    MAX_ALARMS = 50 # no more than store.ConfigStore.MAX_ALARMS
+    MAX_IDENT_BYTES = 12 # store.ConfigStore.IDENT_BYTES
+    CLIENT_TIMEOUT_MS = 5000
+    POLL_INTERVAL_MS = 100 # while listening
+    BUSY_INTERVAL_MS = 10 # while a client is served
+
+    S_REQUEST = 0
+    S_HEADERS = 1
+    S_BODY = 2
+    S_RESPONSE = 3
+
+    CONFIG_FIELDS = ('timezone', 'alarm-hour', 'alarm-minute', 'alarm-on', 'alarm-weekdays')
+    RESERVED_ALARMS = ('alarm1',) # part of the config, edited through /config
+
+    def __init__(self, app, alarm_manager, port=PORT, host='0.0.0.0'):
+        self.app = app
+        self.alarm_manager = alarm_manager
+        self.line = bytearray(ConfigServer.LINE_BYTES)
+        self.line_length = 0
+        self.line_overflow = False
+
+        self.listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.listener.bind(socket.getaddrinfo(host, port)[0][-1])
+        self.listener.listen(1)
+        self.listener.setblocking(False)
+        # MicroPython sockets have no getsockname(), port 0 is only of use on the host
+        self.port = self.listener.getsockname()[1] if hasattr(self.listener, 'getsockname') else port
+
+        self.client = None
+        self.requests = 0
+        self.errors = 0
+        self.reset()
+
+    def reset(self):
+        self.state = ConfigServer.S_REQUEST
+        self.accepted_ticks = 0
+        self.method = None
+        self.path = None
+        self.body_left = -1 # until a Content-Length header says otherwise
+        self.onBodyLine = None
+        self.changes = {}
+        self.added = 0
+        self.cancelled = 0
+        self.failed = 0
+        self.first_error = None
+        self.response = None
+        self.out = b''
+        self.sent = 0
+
+    def isServing(self):
+        return self.client is not None
+
+    def nextUpdateMs(self):
+        return ConfigServer.BUSY_INTERVAL_MS if self.client is not None else ConfigServer.POLL_INTERVAL_MS
+
+    def update(self):
+        try:
+            if self.client is None:
+                self.accept()
+            elif self.state == ConfigServer.S_RESPONSE:
+                self.send()
+            else:
+                self.receive()
+
+            if self.client is not None and time.ticks_diff(time.ticks_ms(), self.accepted_ticks) >= ConfigServer.CLIENT_TIMEOUT_MS:
+                self.close()
+        except (OSError, ValueError) as e:
+            # ValueError: a request line or header that isn't UTF-8
+            print('Config server:', e)
+            self.close()
+
+    def accept(self):
+        try:
+            (self.client, _) = self.listener.accept()
+        except OSError as e:
+            if e.args[0] != errno.EAGAIN:
+                raise
+            return
+        self.client.setblocking(False)
+        self.reset()
+        self.accepted_ticks = time.ticks_ms()
+        self.line_length = 0
+        self.line_overflow = False
+
+    def receive(self):
+        for _ in range(ConfigServer.MAX_READS_PER_UPDATE):
+            try:
+                data = self.client.recv(ConfigServer.READ_BYTES)
+            except OSError as e:
+                if e.args[0] != errno.EAGAIN:
+                    raise
+                return
+            if not data:
+                self.close() # gone before the request was complete
+                return
+            self.consume(data)
+            if self.state == ConfigServer.S_RESPONSE:
+                return
+
+    def consume(self, data):
+        for i in range(len(data)):
+            c = data[i]
+            if self.state == ConfigServer.S_BODY:
+                self.body_left -= 1
+                # form fields are lines too
+                if c == 0x26 and self.method == 'POST' and self.path == '/config':
+                    c = 0x0A
+            elif self.state == ConfigServer.S_RESPONSE:
+                return # trailing bytes of a request that was answered early
+
+            if c == 0x0A:
+                self.endLine()
+            elif c != 0x0D:
+                if self.line_length < len(self.line):
+                    self.line[self.line_length] = c
+                    self.line_length += 1
+                else:
+                    self.line_overflow = True
+
+            if self.state == ConfigServer.S_BODY and not self.body_left:
+                if self.line_length:
+                    self.endLine()
+                self.respond(*self.result())
+
+    def endLine(self):
+        line = bytes(self.line[:self.line_length])
+        overflow = self.line_overflow
+        self.line_length = 0
+        self.line_overflow = False
+
+        if self.state == ConfigServer.S_REQUEST:
+            if overflow:
+                self.respond(414, 'request line too long\n')
+            elif line:
+                self.onRequestLine(line.decode())
+        elif self.state == ConfigServer.S_HEADERS:
+            if overflow:
+                return # headers that don't fit aren't ones we need
+            if line:
+                self.onHeader(line.decode())
+            else:
+                self.onHeadersDone()
+        elif self.state == ConfigServer.S_BODY:
+            if overflow:
+                self.onError('line too long')
+            elif line:
+                try:
+                    self.onBodyLine(line.decode().strip())
+                except (ValueError, KeyError, IndexError) as e:
+                    self.onError('%s: %s' % (line.decode(), e))
+
+    def onRequestLine(self, line):
+        parts = line.split(' ')
+        if len(parts) != 3:
+            self.respond(400, 'bad request line\n')
+            return
+        (self.method, self.path) = (parts[0], parts[1])
+        self.requests += 1
+        self.state = ConfigServer.S_HEADERS
+
+    def onHeader(self, line):
+        (name, _, value) = line.partition(':')
+        if name.strip().lower() == 'content-length':
+            try:
+                self.body_left = int(value)
+            except ValueError:
+                self.body_left = -1
+
+    def onHeadersDone(self):
+        routes = {
+            ('GET', '/config'): self.getConfig,
+            ('GET', '/alarms'): self.getAlarms,
+            ('POST', '/config'): self.postConfig,
+            ('POST', '/alarms'): self.postAlarm,
+        }
+        handler = routes.get((self.method, self.path))
+        if handler is None:
+            if self.path in ('/config', '/alarms'):
+                self.respond(405, 'method not allowed\n')
+            else:
+                self.respond(404, 'not found\n')
+            return
+
+        if self.method == 'GET':
+            self.respond(*handler())
+            return
+
+        if self.body_left < 0:
+            self.respond(411, 'Content-Length required\n')
+        elif self.body_left > ConfigServer.MAX_BODY_BYTES:
+            self.respond(413, 'at most %d bytes\n' % ConfigServer.MAX_BODY_BYTES)
+        elif not self.body_left:
+            self.respond(*self.result())
+        else:
+            self.onBodyLine = handler
+            self.state = ConfigServer.S_BODY
+
+    def onError(self, message):
+        self.failed += 1
+        if self.first_error is None:
+            self.first_error = message
+
+    def result(self):
+        """Status and body once a POST body was processed"""
+        if self.path == '/config':
+            return self.applyConfig()
+        if (self.added or self.cancelled) and self.app.store is not None:
+            self.app.store.save()
+        text = '%d added, %d cancelled, %d failed\n' % (self.added, self.cancelled, self.failed)
+        if self.first_error is not None:
+            text += 'first error: %s\n' % self.first_error
+        return (400 if self.failed and not (self.added or self.cancelled) else 200, text)
+
+    def getConfig(self):
+        return (200, json.dumps(self.app.config), 'application/json')
+
+    def getAlarms(self):
+        return (200, self.alarmLines())
+
+    def alarmLines(self):
+        # one alarm at a time, the list of all of them is never built as one string
+        for alarm in self.alarm_manager.alarms():
+            recurrence = alarm.recurrence
+            yield '%s %02d:%02d %s%s\n' % (alarm.ident, recurrence.time_of_day_s // 3600, recurrence.time_of_day_s // 60 % 60,
+                                           format_weekdays(recurrence.weekdays), ' once' if recurrence.once else '')
+
+    def postConfig(self, line):
+        (name, _, value) = line.partition('=')
+        name = unquote(name)
+        if name not in ConfigServer.CONFIG_FIELDS:
+            raise ValueError('unknown field')
+        self.changes[name] = unquote(value)
+
+    def applyConfig(self):
+        if self.failed:
+            return (400, 'first error: %s\n' % self.first_error)
+
+        # everything is checked before anything is applied
+        alarm = dict(self.app.config['alarm1'])
+        timezone = None
+        try:
+            for (name, value) in self.changes.items():
+                if name == 'timezone':
+                    tz.zone(value)
+                    timezone = value
+                elif name == 'alarm-hour':
+                    alarm[name] = ConfigServer.inRange(int(value), 24)
+                elif name == 'alarm-minute':
+                    alarm[name] = ConfigServer.inRange(int(value), 60)
+                elif name == 'alarm-on':
+                    alarm[name] = value in ('1', 'true', 'on')
+                elif name == 'alarm-weekdays':
+                    alarm[name] = parse_weekdays(value)
+                    if not alarm[name]:
+                        raise ValueError('no weekday selected')
+        except ValueError as e:
+            return (400, '%s\n' % e)
+
+        self.app.configure(alarm, timezone)
+        return self.getConfig()
+
+    def inRange(value, limit):
+        if not 0 <= value < limit:
+            raise ValueError('%d out of range' % value)
+        return value
+
+    def postAlarm(self, line):
+        parts = line.split()
+        ident = parts[0]
+        if ident in ConfigServer.RESERVED_ALARMS:
+            raise ValueError('edit it through /config')
+        if len(ident.encode()) > ConfigServer.MAX_IDENT_BYTES:
+            raise ValueError('ident longer than %d bytes' % ConfigServer.MAX_IDENT_BYTES)
+
+        if parts[1:] == ['off']:
+            if self.alarm_manager.get(ident) is not None:
+                self.alarm_manager.cancel(ident)
+                self.cancelled += 1
+            return
+
+        (hour, minute) = parts[1].split(':')
+        (hour, minute) = (ConfigServer.inRange(int(hour), 24), ConfigServer.inRange(int(minute), 60))
+        weekdays = parse_weekdays(parts[2]) if len(parts) > 2 else base.Recurrence.EVERY_DAY
+        once = parts[3:] == ['once']
+        if len(parts) > 3 and not once:
+            raise ValueError("expected 'once'")
+        if self.alarm_manager.get(ident) is None and len(self.alarm_manager.entries) >= ConfigServer.MAX_ALARMS:
+            raise ValueError('too many alarms')
+
+        recurrence = base.Recurrence(hour * 60*60 + minute * 60, weekdays=weekdays, once=once)
+        self.alarm_manager.add(base.Alarm(ident, (hour, minute, 0), self.app.onAlarm, recurrence=recurrence))
+        self.added += 1
+
+    def respond(self, status, body, content_type='text/plain'):
+        if status >= 400:
+            self.errors += 1
+        if isinstance(body, str):
+            body = (body,)
+        self.response = iter(body)
+        self.out = ('HTTP/1.0 %d %s\r\nContent-Type: %s\r\nConnection: close\r\n\r\n' % (
+            status, 'OK' if status < 400 else 'Error', content_type)).encode()
+        self.sent = 0
+        self.state = ConfigServer.S_RESPONSE
+
+    def send(self):
+        budget = ConfigServer.SEND_BYTES
+        while budget > 0:
+            if self.sent == len(self.out):
+                try:
+                    self.out = next(self.response).encode()
+                except StopIteration:
+                    self.discard()
+                    self.close()
+                    return
+                self.sent = 0
+                continue
+            try:
+                sent = self.client.send(self.out[self.sent:self.sent + budget])
+            except OSError as e:
+                if e.args[0] != errno.EAGAIN:
+                    raise
+                return
+            self.sent += sent
+            budget -= sent
+
+    def discard(self):
+        # closing with unread input resets the connection, which can cost the client the response
+        for _ in range(ConfigServer.MAX_READS_PER_UPDATE):
+            try:
+                if not self.client.recv(ConfigServer.READ_BYTES):
+                    return
+            except OSError:
+                return
+
+    def close(self):
+        if self.client is not None:
+            self.client.close()
+            self.client = None
+        self.reset()
@@ -0,0 +1,227 @@
+"""Replays UI scenarios on the simulator and reports the rendering cost
+
+    python3 sim/bench.py [--json results.json] [--compare baseline.json] [--dump DIR]
+
+Draw calls, address windows and SPI bytes are deterministic and are what
+--compare checks against a baseline; Python time per frame is reported
+for information only.
+"""
+
+import sys
+import os
+import time
+import json
+import copy
+import argparse
+
+import hal
+
+FRAME_MS = 10
+CLICK_MS = 100
+LONG_PRESS_MS = 1200
+
+
+class Rig:
+    """The application wired up like main.main(), on simulated hardware"""
+
+    def __init__(self, wall=(2020, 9, 19, 5, 29, 50), config=None, compositing_band=None, power_save=False, button_pin=None):
+        """button_pin moves the button off GPIO16, which has no interrupts, to one that has"""
+        self.clock = hal.install(wall)
+
+        import main
+        import views
+        import periph
+        import tz
+        import power
+
+        if button_pin is not None:
+            import machine
+            import base
+            periph.primary_button = machine.Pin(button_pin, machine.Pin.IN | machine.Pin.PULL_UP)
+            periph.buttons_watcher = base.Buttons([periph.primary_button], irq=True)
+
+        self.periph = periph
+        self.tft = periph.TFT
+        self.button = periph.primary_button
+        self.config = copy.deepcopy(main.app_config if config is None else config)
+
+        periph.ic_time.setZone(tz.zone(self.config['timezone']))
+        canvas = None
+        if compositing_band is not None:
+            import display
+            canvas = display.Canvas(periph.display, 0, compositing_band[0], periph.DISPLAY_WIDTH, compositing_band[1])
+
+        self.app = views.App(main.style, self.config, canvas=canvas)
+        self.dimmer = views.InactivityDisplayDimmer(self.app, 2000, periph.display_led_pwm, inactivity_timeout_ms=6000)
+        self.dimmer.displayOn()
+
+        periph.buttons_watcher.subscribeHandler(lambda pin, action: self.dimmer.onInput(pin, action))
+        periph.alarm_manager.subscribeHandler(lambda alarm: self.dimmer.displayOn())
+
+        self.power = None
+        if power_save:
+            self.power = power.PowerManager(self.dimmer, periph.buttons_watcher, periph.alarm_manager, periph.ic_time, audio=periph.audio)
+
+        self.resetStats()
+
+    def resetStats(self):
+        self.tft.resetStats()
+        self.frames = 0
+        self.python_s = 0
+
+    def frame(self):
+        start = time.perf_counter()
+        self.periph.buttons_watcher.update()
+        self.periph.ic_time.update()
+        self.periph.alarm_manager.update()
+        self.dimmer.update()
+        self.periph.audio.update()
+        if self.power is not None:
+            self.power.update() # moves the clock on while napping
+        self.python_s += time.perf_counter() - start
+        self.frames += 1
+    
+    def run(self, ms):
+        until = self.clock.ticks + ms
+        while self.clock.ticks < until:
+            self.clock.advance(FRAME_MS)
+            self.frame()
+    
+    def press(self, hold_ms):
+        self.button.set(0)
+        self.run(hold_ms)
+        self.button.set(1)
+        self.run(5 * FRAME_MS)
+
+    def result(self):
+        result = {
+            'frames': self.frames,
+            'draw_calls': self.tft.drawCalls(),
+            'windows': self.tft.windows,
+            'spi_bytes': self.tft.spi_bytes,
+            'us_per_frame': round(1e6 * self.python_s / max(1, self.frames), 1),
+        }
+        if self.power is not None:
+            self.power.report()
+            result['awake_ms'] = self.power.awake_ms
+            result['asleep_ms'] = self.power.asleep_ms
+        return result
+
+
+def warmUp(rig):
+    # fade in and draw the first frame, which clears the whole screen
+    rig.run(300)
+    rig.resetStats()
+
+
+def scenarioIdle():
+    rig = Rig(wall=(2020, 9, 19, 5, 29, 10))
+    warmUp(rig)
+    rig.run(4000)
+    return rig
+
+
+def scenarioMinuteRollover():
+    rig = Rig(wall=(2020, 9, 19, 5, 29, 57))
+    warmUp(rig)
+    rig.run(4000)
+    return rig
+
+
+def scenarioSetAlarm(compositing_band=None):
+    rig = Rig(compositing_band=compositing_band)
+    warmUp(rig)
+    rig.press(CLICK_MS) # open SetAlarmView
+    rig.press(LONG_PRESS_MS) # select hour
+    for _ in range(3):
+        rig.press(CLICK_MS)
+    rig.press(LONG_PRESS_MS) # select minute
+    for _ in range(2):
+        rig.press(CLICK_MS)
+    rig.press(LONG_PRESS_MS) # select on/off
+    rig.press(CLICK_MS)
+    rig.press(LONG_PRESS_MS) # confirm, back to the clock
+    rig.run(500)
+    return rig
+
+
+def scenarioAlarmFires():
+    rig = Rig(wall=(2020, 9, 19, 5, 29, 50), config={
+        'timezone': 'Europe/Berlin',
+        'alarm1': { 'alarm-hour': 7, 'alarm-minute': 30, 'alarm-on': True },
+    })
+    warmUp(rig)
+    rig.run(12000)
+    return rig
+
+
+def scenarioNight(button_pin=None):
+    # dark from 06:00 until the alarm at 07:30, one look at the clock in between
+    rig = Rig(wall=(2020, 9, 19, 4, 0, 0), config={
+        'timezone': 'Europe/Berlin',
+        'alarm1': { 'alarm-hour': 7, 'alarm-minute': 30, 'alarm-on': True },
+    }, power_save=True, button_pin=button_pin)
+    warmUp(rig)
+    rig.power.reset()
+    rig.button.script([(45*60*1000, 0), (45*60*1000 + CLICK_MS, 1)]) # pressed while napping
+    rig.run(90*60*1000 + 5000)
+    return rig
+
+
+SCENARIOS = [
+    ('idle', scenarioIdle),
+    ('minute-rollover', scenarioMinuteRollover),
+    ('set-alarm', scenarioSetAlarm),
+    ('alarm-fires', scenarioAlarmFires),
+    ('set-alarm-canvas', lambda: scenarioSetAlarm(compositing_band=(0, 128))),
+    ('night', scenarioNight),
+    ('night-irq', lambda: scenarioNight(button_pin=13)),
+]
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--json', help='write results to this file')
+    parser.add_argument('--compare', help='fail if draw calls or SPI bytes exceed this baseline')
+    parser.add_argument('--tolerance', type=float, default=0.05, help='allowed relative growth over the baseline')
+    parser.add_argument('--dump', help='save the final framebuffer of every scenario as PPM into this directory')
+    parser.add_argument('scenarios', nargs='*', help='scenarios to run, default all')
+    args = parser.parse_args(argv)
+    # the simulated filesystem becomes the working directory
+    (args.json, args.compare, args.dump) = (os.path.abspath(path) if path else path for path in (args.json, args.compare, args.dump))
+
+    results = {}
+    print('%-16s %8s %10s %9s %11s %12s' % ('scenario', 'frames', 'draw calls', 'windows', 'SPI bytes', 'us/frame'))
+    for (name, scenario) in SCENARIOS:
+        if args.scenarios and name not in args.scenarios:
+            continue
+        rig = scenario()
+        result = rig.result()
+        results[name] = result
+        print('%-16s %8d %10d %9d %11d %12.1f' % (name, result['frames'], result['draw_calls'], result['windows'], result['spi_bytes'], result['us_per_frame']))
+        if args.dump:
+            os.makedirs(args.dump, exist_ok=True)
+            rig.tft.savePPM(os.path.join(args.dump, name + '.ppm'))
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = []
+        for (name, result) in results.items():
+            for metric in ('draw_calls', 'spi_bytes'):
+                limit = baseline.get(name, {}).get(metric)
+                if limit is not None and result[metric] > limit * (1 + args.tolerance):
+                    regressions.append('%s: %s %d > %d' % (name, metric, result[metric], limit))
+        for regression in regressions:
+            print('REGRESSION', regression)
+        return 1 if regressions else 0
+    
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
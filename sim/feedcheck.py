@@ -0,0 +1,147 @@
+"""Fetches a feed.Feed from the local HTTP stand-in through its whole life cycle
+
+    python3 sim/feedcheck.py [--budget-ms 10]
+
+Covers a first fetch, a conditional refetch answered with 304, a changed
+document, a response trickled a few bytes at a time, server errors with
+their backoff, values aging out, a response that isn't HTTP and a
+refused connection, and that the host name is only resolved again after
+the connection failed. The simulated
+clock follows real time while a fetch runs; the run fails if any check
+does or an update() takes longer than --budget-ms, which on the host
+only catches an update() that reads or parses far more than it should.
+"""
+
+import sys
+import time
+import json
+import socket
+import argparse
+
+import hal
+from httpserver import HTTPServer
+
+STEP_MS = 5
+FIELDS = ('current.temperature', 'current.wind')
+
+
+def document(temperature, wind):
+    return json.dumps({'current': {'temperature': temperature, 'wind': wind, 'summary': 'x' * 200}}).encode()
+
+
+def check(condition, message):
+    print('%-64s %s' % (message, 'ok' if condition else 'FAILED'))
+    return condition
+
+
+class Driver:
+    """Runs the feed like its task does and times every update()"""
+
+    def __init__(self, feed):
+        self.feed = feed
+        self.worst_ms = 0
+
+    def update(self):
+        started = time.perf_counter()
+        self.feed.update()
+        self.worst_ms = max(self.worst_ms, (time.perf_counter() - started) * 1000)
+
+    def fetch(self):
+        """Advances to the next fetch and runs it, returns the number of updates it took"""
+        hal.clock.advance(self.feed.nextUpdateMs())
+        fetches = self.feed.fetches
+        self.update()
+        updates = 1
+        while self.feed.isFetching():
+            time.sleep(STEP_MS / 1000)
+            hal.clock.advance(STEP_MS)
+            self.update()
+            updates += 1
+        if self.feed.fetches != fetches + 1:
+            raise AssertionError('update() did not fetch')
+        return updates
+
+    def retryInS(self):
+        return time.ticks_diff(self.feed.next_fetch_ticks, time.ticks_ms()) // 1000
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--budget-ms', type=float, default=10, help='longest an update() may take')
+    args = parser.parse_args(argv)
+
+    hal.install()
+    import network
+    from feed import Feed
+
+    network.WLAN.connected = True
+    resolved = []
+    getaddrinfo = socket.getaddrinfo
+    def resolve(*args):
+        resolved.append(args)
+        return getaddrinfo(*args)
+    socket.getaddrinfo = resolve
+    server = HTTPServer(document(12.5, 7))
+    feed = Feed(server.url('/weather'), FIELDS, ttl_s=60, retry_s=5, max_age_s=180)
+    driver = Driver(feed)
+    ok = True
+
+    driver.fetch()
+    (request, headers) = server.requests[-1]
+    ok &= check(feed.values == ('12.5', '7') and 'if-none-match' not in headers,
+                '200: %s from %s' % (feed.values, request))
+
+    version = feed.version
+    driver.fetch()
+    (_, headers) = server.requests[-1]
+    ok &= check(headers.get('if-none-match') == server.etag and feed.not_modified == 1 and feed.values == ('12.5', '7') and feed.version == version,
+                '304 to If-None-Match %s keeps the values' % headers.get('if-none-match'))
+
+    server.setBody(document(-3, 21))
+    driver.fetch()
+    ok &= check(feed.values == ('-3', '21') and feed.version == version + 1, 'changed document: %s' % (feed.values,))
+
+    server.setBody(document(4.25, 0))
+    server.trickle_s = 0.005
+    updates = driver.fetch()
+    server.trickle_s = 0
+    ok &= check(feed.values == ('4.25', '0') and updates > 10,
+                'trickled %d bytes over %d updates: %s' % (len(server.body), updates, feed.values))
+
+    server.status = 500
+    retries = []
+    for _ in range(5):
+        driver.fetch()
+        retries.append(driver.retryInS())
+    ok &= check(retries == [5, 10, 20, 40, 60] and feed.values == ('4.25', '0'),
+                'errors back off %s s, stale values served' % retries)
+
+    # the next retry is due after the values got too old
+    hal.clock.advance(feed.nextUpdateMs())
+    driver.update()
+    ok &= check(feed.values is None and not feed.isFetching(), 'values dropped after %d s' % (feed.max_age_ms // 1000))
+
+    server.status = None
+    driver.fetch()
+    ok &= check(feed.values == ('4.25', '0') and feed.failures == 0, 'recovers with a full fetch: %s' % (feed.values,))
+
+    for raw in (b'garbage\r\n\r\n{}', b'HTTP/1.0 OK\r\n\r\n{}'):
+        server.raw = raw
+        driver.fetch()
+        ok &= check(feed.failures == 1 and feed.values == ('4.25', '0'), 'malformed status line %r retried in %d s' % (raw.split(b'\r')[0], driver.retryInS()))
+        server.raw = None
+        driver.fetch()
+
+    ok &= check(len(resolved) == 1, 'resolved once across %d fetches and their errors' % feed.fetches)
+
+    server.close()
+    driver.fetch()
+    ok &= check(feed.failures == 1 and driver.retryInS() == 5, 'refused connection retried in %d s' % driver.retryInS())
+    ok &= check(feed.address is None, 'and resolved again then')
+
+    ok &= check(driver.worst_ms <= args.budget_ms, 'slowest update() %.2f ms' % driver.worst_ms)
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,40 @@
+"""Stand-in for the driver's 6x8 terminal font
+
+Digits, colon and space are the real 5x7 glyphs; everything else is a
+deterministic filler pattern of similar density.
+"""
+
+GLYPHS = {
+    ' ': (0x00, 0x00, 0x00, 0x00, 0x00),
+    ':': (0x00, 0x36, 0x36, 0x00, 0x00),
+    '0': (0x3E, 0x51, 0x49, 0x45, 0x3E),
+    '1': (0x00, 0x42, 0x7F, 0x40, 0x00),
+    '2': (0x42, 0x61, 0x51, 0x49, 0x46),
+    '3': (0x21, 0x41, 0x45, 0x4B, 0x31),
+    '4': (0x18, 0x14, 0x12, 0x7F, 0x10),
+    '5': (0x27, 0x45, 0x45, 0x45, 0x39),
+    '6': (0x3C, 0x4A, 0x49, 0x49, 0x30),
+    '7': (0x01, 0x71, 0x09, 0x05, 0x03),
+    '8': (0x36, 0x49, 0x49, 0x49, 0x36),
+    '9': (0x06, 0x49, 0x49, 0x29, 0x1E),
+}
+
+
+def glyphData():
+    data = bytearray()
+    for code in range(32, 128):
+        columns = GLYPHS.get(chr(code))
+        if columns is None:
+            columns = tuple(((code * 37 + i * 101) ^ (code << i)) & 0x7F for i in range(5))
+        data.extend(columns)
+        data.append(0)
+    return data
+
+
+terminalfont = {
+    'width': 6,
+    'height': 8,
+    'start': 32,
+    'end': 127,
+    'data': glyphData(),
+}
@@ -0,0 +1,166 @@
+"""Host-side stand-ins for the MicroPython hardware layer
+
+install() puts this directory in front of sys.path, so the application
+imports the fake machine, network, tft, font and uasyncio
+modules in here. It also patches the CPython time module with the
+MicroPython ticks API on top of a controllable clock whose epoch is
+2000-01-01, like on the device, and adds gc.mem_alloc()/mem_free() backed
+by tracemalloc.
+"""
+
+import sys
+import os
+import time
+import calendar
+import heapq
+import gc
+import tracemalloc
+import tempfile
+
+SIM_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(SIM_DIR)
+
+_gmtime = time.gmtime
+
+TICKS_PERIOD = 1 << 30
+HEAP_BYTES = 40 * 1024 * 1024 # CPython objects are far bigger than MicroPython ones
+EPOCH_OFFSET = calendar.timegm((2000, 1, 1, 0, 0, 0, 0, 0, 0))
+
+# everything that has to be imported afresh for an independent run
+APP_MODULES = ['main', 'views', 'periph', 'base', 'display', 'ntp', 'tz', 'tween', 'power', 'audio', 'store', 'wifi', 'jsonscan', 'feed', 'server', 'memory', 'fonts', 'kernels', 'kernels_viper', 'diag', 'machine', 'network', 'tft', 'font']
+
+
+class Clock:
+    """Simulated time: ticks only move when advanced, timers fire on the way"""
+
+    def __init__(self, wall=(2020, 9, 19, 7, 29, 50)):
+        self.ticks = 0
+        self.wall_base_ms = 0
+        self.timers = [] # heap of (due ticks, sequence, callback)
+        self.sequence = 0
+        self.setWall(wall)
+    
+    def setWall(self, wall):
+        """Sets the UTC wall clock from a (year, month, day, hour, minute, second) tuple"""
+        self.setTime(calendar.timegm(tuple(wall[:6]) + (0, 0, 0)) - EPOCH_OFFSET)
+
+    def setTime(self, seconds):
+        self.wall_base_ms = seconds * 1000 - self.ticks
+
+    def time(self):
+        return (self.wall_base_ms + self.ticks) // 1000
+
+    def at(self, delay_ms, callback):
+        heapq.heappush(self.timers, (self.ticks + delay_ms, self.sequence, callback))
+        self.sequence += 1
+    
+    def advance(self, ms):
+        target = self.ticks + ms
+        while self.timers and self.timers[0][0] <= target:
+            (due, _, callback) = heapq.heappop(self.timers)
+            self.ticks = max(self.ticks, due)
+            callback()
+        self.ticks = target
+
+
+clock = Clock()
+
+
+def ticks_ms():
+    return clock.ticks % TICKS_PERIOD
+
+def ticks_us():
+    return (clock.ticks * 1000) % TICKS_PERIOD
+
+def ticks_diff(a, b):
+    return ((a - b + TICKS_PERIOD // 2) % TICKS_PERIOD) - TICKS_PERIOD // 2
+
+def ticks_add(a, b):
+    return (a + b) % TICKS_PERIOD
+
+def sleep_ms(ms):
+    clock.advance(ms)
+
+def sleep_us(us):
+    clock.advance(us // 1000)
+
+def localtime(seconds=None):
+    """8-tuple like MicroPython's, seconds since 2000 in UTC"""
+    if seconds is None:
+        seconds = clock.time()
+    tm = _gmtime(seconds + EPOCH_OFFSET)
+    return (tm.tm_year, tm.tm_mon, tm.tm_mday, tm.tm_hour, tm.tm_min, tm.tm_sec, tm.tm_wday, tm.tm_yday)
+
+def mktime(datetime):
+    return calendar.timegm(tuple(datetime[:6]) + (0, 0, 0)) - EPOCH_OFFSET
+
+
+def mem_alloc():
+    # only meaningful while tracemalloc is tracing; CPython also allocates where MicroPython would not
+    return tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else 0
+
+def mem_free():
+    return HEAP_BYTES - mem_alloc()
+
+gc_threshold = [-1]
+
+def threshold(amount=None):
+    if amount is None:
+        return gc_threshold[0]
+    gc_threshold[0] = amount
+
+
+# what make transfer puts on the device besides the modules, built once
+font_files = {}
+
+def fonts():
+    if not font_files:
+        import mkfont
+        import font
+
+        font_files['term8.fnt'] = mkfont.encode(font.terminalfont['height'], mkfont.terminalGlyphs(font.terminalfont))
+        font_files['clock32.fnt'] = mkfont.encode(32, mkfont.sevenSegmentGlyphs(32))
+    return font_files
+
+def install(wall=None, filesystem=None):
+    """Activates the stand-ins and resets all simulated state
+
+    The working directory becomes the device filesystem, a fresh
+    temporary directory with the font files unless a previous one is
+    passed to simulate a reboot.
+    """
+    if SIM_DIR not in sys.path:
+        sys.path.insert(0, SIM_DIR)
+    if ROOT_DIR not in sys.path:
+        sys.path.insert(1, ROOT_DIR)
+
+    for name in APP_MODULES:
+        sys.modules.pop(name, None)
+
+    if filesystem is None:
+        os.chdir(tempfile.mkdtemp(prefix='alarmclock-'))
+        for (name, data) in fonts().items():
+            with open(name, 'wb') as f:
+                f.write(data)
+    else:
+        os.chdir(filesystem)
+
+    global clock
+    clock = Clock() if wall is None else Clock(wall)
+
+    time.ticks_ms = ticks_ms
+    time.ticks_us = ticks_us
+    time.ticks_diff = ticks_diff
+    time.ticks_add = ticks_add
+    time.sleep_ms = sleep_ms
+    time.sleep_us = sleep_us
+    time.time = clock.time
+    time.localtime = localtime
+    time.gmtime = localtime
+    time.mktime = mktime
+
+    gc.mem_alloc = mem_alloc
+    gc.mem_free = mem_free
+    gc.threshold = threshold
+
+    return clock
@@ -0,0 +1,90 @@
+"""Local TCP stand-in for a web server serving one JSON document"""
+
+import hashlib
+import socket
+import threading
+import time
+
+
+class HTTPServer:
+    """Serves body with an ETag and answers 304 to a matching If-None-Match
+
+    trickle_s sends the response a few bytes at a time with a pause in
+    between, to check that nothing waits for it; status overrides the
+    status of every response, raw replaces the whole response with bytes
+    that needn't be HTTP at all.
+    """
+
+    TRICKLE_BYTES = 7
+
+    def __init__(self, body=b'{}', trickle_s=0, host='127.0.0.1'):
+        self.setBody(body)
+        self.trickle_s = trickle_s
+        self.status = None
+        self.raw = None
+        self.requests = []
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind((host, 0))
+        self.sock.listen(4)
+        self.sock.settimeout(0.1)
+        (self.host, self.port) = self.sock.getsockname()
+        self.running = True
+        self.thread = threading.Thread(target=self.serve, daemon=True)
+        self.thread.start()
+
+    def url(self, path='/'):
+        return 'http://%s:%d%s' % (self.host, self.port, path)
+
+    def setBody(self, body):
+        self.body = body
+        self.etag = '"%s"' % hashlib.sha1(body).hexdigest()[:16]
+
+    def serve(self):
+        while self.running:
+            try:
+                (connection, _) = self.sock.accept()
+            except OSError:
+                continue
+            with connection:
+                connection.settimeout(2)
+                try:
+                    self.respond(connection)
+                except OSError:
+                    pass
+
+    def respond(self, connection):
+        request = b''
+        while b'\r\n\r\n' not in request:
+            data = connection.recv(1024)
+            if not data:
+                return
+            request += data
+        lines = request.split(b'\r\n\r\n')[0].decode().split('\r\n')
+        headers = dict((name.strip().lower(), value.strip()) for (name, _, value) in (line.partition(':') for line in lines[1:]))
+        self.requests.append((lines[0], headers))
+
+        if self.raw is not None:
+            connection.sendall(self.raw)
+            return
+        if self.status is not None:
+            response = 'HTTP/1.0 %d Error\r\nContent-Length: 0\r\n\r\n' % self.status
+        elif headers.get('if-none-match') == self.etag:
+            response = 'HTTP/1.0 304 Not Modified\r\nETag: %s\r\n\r\n' % self.etag
+        else:
+            response = 'HTTP/1.0 200 OK\r\nContent-Type: application/json\r\nContent-Length: %d\r\nETag: %s\r\n\r\n' % (len(self.body), self.etag)
+        response = response.encode()
+        if self.status is None and response.startswith(b'HTTP/1.0 200'):
+            response += self.body
+
+        if not self.trickle_s:
+            connection.sendall(response)
+            return
+        for i in range(0, len(response), HTTPServer.TRICKLE_BYTES):
+            connection.sendall(response[i:i + HTTPServer.TRICKLE_BYTES])
+            time.sleep(self.trickle_s)
+
+    def close(self):
+        self.running = False
+        self.thread.join()
+        self.sock.close()
@@ -0,0 +1,35 @@
+"""Checks the kernels against their pure-Python references and times both
+
+    python3 sim/kernelbench.py [--repeat 200]
+
+CPython has no viper emitter, so here both columns time the reference and
+the run mostly checks the harness and that the kernels are wired up; the
+speedup is what diag.bench_kernels() prints on the device. Unlike the
+other simulations this one measures real time.
+"""
+
+import sys
+import time
+import argparse
+
+import hal
+
+
+def real_ticks_us():
+    return int(time.perf_counter() * 1000000) % hal.TICKS_PERIOD
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=200, help='calls per kernel and case')
+    args = parser.parse_args(argv)
+
+    hal.install()
+    time.ticks_us = real_ticks_us
+
+    import diag
+    diag.bench_kernels(args.repeat)
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,167 @@
+"""Loads server.ConfigServer with well-behaved and hostile clients while the UI runs
+
+    python3 sim/loadtest.py [--seconds 5] [--clients 4]
+
+The server runs in the simulated main loop on a real localhost socket,
+client threads hammer it with reads, bulk imports, oversized and
+malformed requests and connections that trickle or stall. The button is
+clicked during the load; the run fails if the click isn't handled or a
+server update takes longer than --budget-ms.
+"""
+
+import sys
+import time
+import socket
+import random
+import argparse
+import threading
+
+import hal
+from bench import Rig, FRAME_MS, CLICK_MS
+
+
+def request(port, data, pause_s=0, chunk=None, timeout=10):
+    """Status code of the response to data, None if there was none"""
+    with socket.create_connection(('127.0.0.1', port), timeout=timeout) as sock:
+        try:
+            if chunk is None:
+                sock.sendall(data)
+            else:
+                for i in range(0, len(data), chunk):
+                    sock.sendall(data[i:i + chunk])
+                    time.sleep(pause_s)
+            response = b''
+            while True:
+                received = sock.recv(4096)
+                if not received:
+                    break
+                response += received
+        except OSError:
+            return None
+    if not response.startswith(b'HTTP/1.0 '):
+        return None
+    return int(response[9:12])
+
+
+def post(path, body):
+    return b'POST %s HTTP/1.0\r\nContent-Length: %d\r\n\r\n%s' % (path.encode(), len(body), body)
+
+
+def bulkImport(count):
+    # the same idents every time, so the alarms stay below ConfigServer.MAX_ALARMS
+    lines = ['load%d %02d:%02d %s\n' % (i, i % 24, i * 5 % 60, random.choice(('MTWTF--', '-----SS', 'MTWTFSS'))) for i in range(count)]
+    return post('/alarms', ''.join(lines).encode())
+
+
+# name, request, expected statuses; None is a reset, which may beat the response to a request answered before it was read completely
+KINDS = [
+    ('get-config', lambda: b'GET /config HTTP/1.0\r\n\r\n', (200,)),
+    ('get-alarms', lambda: b'GET /alarms HTTP/1.0\r\n\r\n', (200,)),
+    ('post-config', lambda: post('/config', b'alarm-hour=%d&alarm-minute=15&alarm-on=0' % random.randrange(24)), (200,)),
+    ('bulk-import', lambda: bulkImport(40), (200,)),
+    ('bad-config', lambda: post('/config', b'timezone=Mars%2FOlympus'), (400,)),
+    ('too-large', lambda: b'POST /alarms HTTP/1.0\r\nContent-Length: 100000\r\n\r\n', (413,)),
+    ('long-line', lambda: b'GET /' + b'a' * 4000 + b' HTTP/1.0\r\n\r\n', (414, None)),
+    ('garbage', lambda: bytes(random.randrange(256) for _ in range(300)) + b'\r\n\r\n', (400, 404, 405, 414, None)),
+    ('not-found', lambda: b'GET /nope HTTP/1.0\r\n\r\n', (404,)),
+]
+
+
+class Client(threading.Thread):
+
+    def __init__(self, port, until):
+        super().__init__(daemon=True)
+        self.port = port
+        self.until = until
+        self.results = {}
+
+    def run(self):
+        while time.monotonic() < self.until:
+            (name, make, expected) = random.choice(KINDS)
+            trickle = random.random() < 0.2
+            try:
+                status = request(self.port, make(), pause_s=0.01 if trickle else 0, chunk=16 if trickle else None)
+            except OSError:
+                status = None
+            counts = self.results.setdefault(name, [0, 0])
+            counts[0] += 1
+            if status in expected:
+                counts[1] += 1
+
+
+class Staller(threading.Thread):
+    """Connects and sends half a request, then waits to be dropped"""
+
+    def __init__(self, port, until):
+        super().__init__(daemon=True)
+        self.port = port
+        self.until = until
+        self.dropped = 0
+
+    def run(self):
+        while time.monotonic() < self.until:
+            try:
+                with socket.create_connection(('127.0.0.1', self.port), timeout=30) as sock:
+                    sock.sendall(b'POST /alarms HTTP/1.0\r\nContent-Len')
+                    if not sock.recv(1):
+                        self.dropped += 1
+            except OSError:
+                pass
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--seconds', type=float, default=5, help='wall-clock duration of the load')
+    parser.add_argument('--clients', type=int, default=4, help='concurrent client threads')
+    parser.add_argument('--budget-ms', type=float, default=20, help='longest acceptable server update')
+    args = parser.parse_args(argv)
+
+    rig = Rig()
+    import server
+    import views
+    config_server = server.ConfigServer(rig.app, rig.periph.alarm_manager, port=0, host='127.0.0.1')
+    rig.run(300)
+
+    until = time.monotonic() + args.seconds
+    threads = [Client(config_server.port, until) for _ in range(args.clients)] + [Staller(config_server.port, until)]
+    for thread in threads:
+        thread.start()
+
+    updates = 0
+    worst_s = 0
+    total_s = 0
+    clicked = False
+    click_handled = None
+    # until the last client got its answer, requests waiting in the backlog would time out otherwise
+    while any(thread.is_alive() for thread in threads):
+        start = time.perf_counter()
+        config_server.update()
+        elapsed = time.perf_counter() - start
+        (worst_s, total_s, updates) = (max(worst_s, elapsed), total_s + elapsed, updates + 1)
+
+        rig.clock.advance(FRAME_MS)
+        rig.frame()
+        time.sleep(0.001) # let the clients run, the simulated clock doesn't wait for them
+
+        if not clicked and time.monotonic() > until - args.seconds / 2:
+            # the first click lights the display; a POST /config may switch back to the clock at any time, so look right after the second
+            rig.press(CLICK_MS)
+            rig.press(CLICK_MS)
+            click_handled = isinstance(rig.app.child_view, views.SetAlarmView)
+            clicked = True
+
+    print('%d requests, %d answered with an error status, %d server updates, worst %.2f ms, mean %.3f ms' % (
+        config_server.requests, config_server.errors, updates, worst_s * 1000, total_s * 1000 / max(1, updates)))
+    failed = False
+    for name in sorted(set(name for thread in threads[:-1] for name in thread.results)):
+        (sent, ok) = [sum(thread.results.get(name, [0, 0])[i] for thread in threads[:-1]) for i in (0, 1)]
+        print('%-12s %5d sent %5d as expected' % (name, sent, ok))
+        failed = failed or ok < sent
+    print('stalled connections dropped: %d' % threads[-1].dropped)
+    print('alarms: %d' % len(rig.periph.alarm_manager.entries))
+    print('click during the load handled: %s' % click_handled)
+    return 1 if failed or not click_handled or worst_s * 1000 > args.budget_ms else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,177 @@
+"""Stand-in for the MicroPython machine module"""
+
+import time
+import hal
+
+
+class Pin:
+
+    IN = 0
+    OUT = 1
+    PULL_UP = 2
+    IRQ_FALLING = 1
+    IRQ_RISING = 2
+
+    pins = {} # id -> most recently created Pin, for scripting
+    NO_IRQ = (16,) # like GPIO16 on the ESP8266
+
+    def __init__(self, id, mode=IN, pull=None):
+        self.id = id
+        self.mode = mode
+        self.current_value = 1 if (mode & Pin.PULL_UP or pull == Pin.PULL_UP) else 0
+        self.irq_handler = None
+        self.irq_trigger = 0
+        self.writes = 0
+        Pin.pins[id] = self
+    
+    def value(self, value=None):
+        if value is None:
+            return self.current_value
+        self.writes += 1
+        self.set(value)
+
+    def on(self):
+        self.value(1)
+    
+    def off(self):
+        self.value(0)
+    
+    def irq(self, trigger=IRQ_FALLING | IRQ_RISING, handler=None, wake=None):
+        if self.id in Pin.NO_IRQ:
+            raise OSError('pin does not have IRQ capabilities')
+        self.irq_trigger = trigger
+        self.irq_handler = handler
+
+    def set(self, value):
+        """Drives the pin level from the outside, firing the IRQ like an edge would"""
+        value = 1 if value else 0
+        previous = self.current_value
+        self.current_value = value
+        if self.irq_handler is None or value == previous:
+            return
+        if (value and self.irq_trigger & Pin.IRQ_RISING) or (not value and self.irq_trigger & Pin.IRQ_FALLING):
+            self.irq_handler(self)
+    
+    def script(self, events):
+        """Schedules (delay ms, value) level changes on the simulated clock"""
+        for (delay_ms, value) in events:
+            hal.clock.at(delay_ms, lambda value=value: self.set(value))
+
+
+class SPI:
+
+    def __init__(self, id, baudrate=0, polarity=0, phase=0):
+        self.id = id
+        self.baudrate = baudrate
+
+
+class PWM:
+
+    def __init__(self, pin, freq=1000, duty=0):
+        self.pin = pin
+        self.frequency = freq
+        self.current_duty = duty
+        self.writes = 0
+    
+    def duty(self, value=None):
+        if value is None:
+            return self.current_duty
+        self.writes += 1
+        self.current_duty = value
+
+    def freq(self, value=None):
+        if value is None:
+            return self.frequency
+        self.frequency = value
+
+
+class RTC:
+
+    def datetime(self, datetime=None):
+        if datetime is None:
+            (year, month, day, hour, minute, second, weekday, _) = time.localtime()
+            return (year, month, day, weekday, hour, minute, second, 0)
+        (year, month, day, _, hour, minute, second, _) = datetime
+        hal.clock.setTime(time.mktime((year, month, day, hour, minute, second, 0, 0)))
+
+
+def reset():
+    raise SystemExit('machine.reset()')
+
+
+# every lightsleep() duration, deepsleep() ones negated
+sleeps = []
+
+
+def lightsleep(time_ms=None):
+    """Like the ESP8266: runs for the full time, IRQ handlers fire on the way"""
+    sleeps.append(time_ms)
+    hal.clock.advance(time_ms if time_ms is not None else 0)
+
+
+def deepsleep(time_ms=None):
+    sleeps.append(-1 if time_ms is None else -time_ms)
+    raise SystemExit('machine.deepsleep(%s)' % time_ms)
+
+
+class Timer:
+    """Periodic callbacks on the simulated clock, in bursts once per millisecond"""
+
+    ONE_SHOT = 0
+    PERIODIC = 1
+
+    def __init__(self, id=-1):
+        self.id = id
+        self.freq = 0
+        self.callback = None
+        self.generation = 0
+        self.carry = 0
+
+    def init(self, freq=None, period=None, mode=PERIODIC, callback=None):
+        self.freq = freq if freq is not None else 1000 // period
+        self.callback = callback
+        self.generation += 1
+        self.carry = 0
+        hal.clock.at(1, lambda generation=self.generation: self.fire(generation))
+
+    def fire(self, generation):
+        if generation != self.generation:
+            return
+        self.carry += self.freq
+        while self.carry >= 1000:
+            self.carry -= 1000
+            self.callback(self)
+        hal.clock.at(1, lambda: self.fire(generation))
+
+    def deinit(self):
+        self.generation += 1
+
+
+class I2S:
+    """Consumes written buffers at the sample rate, calling the irq handler when one is done"""
+
+    TX = 0
+    RX = 1
+    MONO = 0
+    STEREO = 1
+
+    def __init__(self, id, sck=None, ws=None, sd=None, mode=TX, bits=16, format=MONO, rate=8000, ibuf=4096):
+        self.rate = rate
+        self.frame_bytes = bits // 8 * (2 if format == I2S.STEREO else 1)
+        self.handler = None
+        self.samples = bytearray() # everything written
+        self.busy_until = 0
+
+    def irq(self, handler):
+        self.handler = handler
+
+    def write(self, buf):
+        self.samples += bytes(buf)
+        start = max(hal.clock.ticks, self.busy_until)
+        self.busy_until = start + len(buf) * 1000 // (self.rate * self.frame_bytes)
+        if self.handler is not None:
+            hal.clock.at(self.busy_until - hal.clock.ticks, lambda: self.handler(self))
+        return len(buf)
+
+    def deinit(self):
+        self.handler = None
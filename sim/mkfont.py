@@ -0,0 +1,142 @@
+"""Writes bitmap fonts in the binary format fonts.FlashFont reads
+
+    python3 sim/mkfont.py terminal [--module font.py] term8.fnt
+    python3 sim/mkfont.py digits HEIGHT clock32.fnt
+
+'terminal' converts the display driver's 6x8 terminal font, so it no
+longer has to sit in RAM as a Python dict. 'digits' draws seven-segment
+digits, colon, minus and space at their native size, for the clock.
+"""
+
+import os
+import sys
+import struct
+import argparse
+import importlib.util
+
+SIM_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(SIM_DIR))
+
+from fonts import FlashFont
+
+
+def encode(height, glyphs):
+    """Font file of glyphs, a dict of character code -> (width, rows), each row a list of booleans"""
+    first = min(glyphs)
+    count = max(glyphs) - first + 1
+    if count > 255:
+        raise ValueError('at most 255 glyphs')
+
+    index = bytearray()
+    bitmaps = bytearray()
+    data_start = FlashFont.HEADER_BYTES + count * FlashFont.INDEX_BYTES
+    for code in range(first, first + count):
+        if code not in glyphs:
+            index += struct.pack(FlashFont.INDEX_FORMAT, 0, 0)
+            continue
+        (width, rows) = glyphs[code]
+        if len(rows) != height or any(len(row) != width for row in rows):
+            raise ValueError('glyph %r is not %d rows of %d pixels' % (chr(code), height, width))
+        index += struct.pack(FlashFont.INDEX_FORMAT, data_start + len(bitmaps), width)
+        for row in rows:
+            packed = bytearray((width + 7) // 8)
+            for x in range(width):
+                if row[x]:
+                    packed[x >> 3] |= 0x80 >> (x & 7)
+            bitmaps += packed
+    if data_start + len(bitmaps) > 0xFFFF:
+        raise ValueError('font larger than 64 KB')
+
+    return struct.pack(FlashFont.HEADER_FORMAT, FlashFont.MAGIC, FlashFont.VERSION, height, first, count) + index + bitmaps
+
+
+def terminalGlyphs(font):
+    """Glyphs of a driver dict font: one byte per column, LSB is the top row"""
+    glyphs = {}
+    width = font['width']
+    for code in range(font['start'], font['end'] + 1):
+        columns = font['data'][(code - font['start']) * width:(code - font['start'] + 1) * width]
+        glyphs[code] = (width, [[bool(column >> y & 1) for column in columns] for y in range(font['height'])])
+    return glyphs
+
+
+SEGMENTS = {
+    '0': 'abcdef', '1': 'bc', '2': 'abdeg', '3': 'abcdg', '4': 'bcfg',
+    '5': 'acdfg', '6': 'acdefg', '7': 'abc', '8': 'abcdefg', '9': 'abcdfg',
+    '-': 'g', ' ': '',
+}
+
+def sevenSegmentGlyphs(height):
+    """Digits with bevelled segments drawn at height pixels, plus colon, minus and space"""
+    thickness = max(2, height // 8)
+    width = height * 9 // 16
+    gap = max(2, height // 8) # between glyphs, split over both sides
+    half = thickness / 2
+
+    # (horizontal, centre x, centre y, half length) of every segment, with a pixel of air at the joints
+    horizontal_length = width / 2 - 1
+    vertical_length = (height / 2 - half) / 2 - 1
+    upper = half + (height / 2 - half) / 2
+    lower = height - upper
+    segments = {
+        'a': (True, width / 2, half, horizontal_length),
+        'g': (True, width / 2, height / 2, horizontal_length),
+        'd': (True, width / 2, height - half, horizontal_length),
+        'f': (False, half, upper, vertical_length),
+        'b': (False, width - half, upper, vertical_length),
+        'e': (False, half, lower, vertical_length),
+        'c': (False, width - half, lower, vertical_length),
+    }
+
+    def inside(name, x, y):
+        (horizontal, cx, cy, length) = segments[name]
+        (along, across) = (abs(x - cx), abs(y - cy)) if horizontal else (abs(y - cy), abs(x - cx))
+        return across < half and along + across < length
+
+    left = gap // 2
+    glyphs = {}
+    for (char, lit) in SEGMENTS.items():
+        rows = [[False] * (width + gap) for _ in range(height)]
+        for y in range(height):
+            for x in range(width):
+                rows[y][left + x] = any(inside(name, x + 0.5, y + 0.5) for name in lit)
+        glyphs[ord(char)] = (width + gap, rows)
+
+    # square dots at a third and two thirds of the height
+    colon_width = thickness + gap
+    rows = [[False] * colon_width for _ in range(height)]
+    for centre in (height // 3, height - height // 3):
+        for y in range(centre - thickness // 2, centre - thickness // 2 + thickness):
+            for x in range(left, left + thickness):
+                rows[y][x] = True
+    glyphs[ord(':')] = (colon_width, rows)
+    return glyphs
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+    terminal = commands.add_parser('terminal', help="convert the driver's terminal font")
+    terminal.add_argument('--module', default=os.path.join(SIM_DIR, 'font.py'), help='font.py of the display driver')
+    terminal.add_argument('output')
+    digits = commands.add_parser('digits', help='draw seven-segment digits')
+    digits.add_argument('height', type=int)
+    digits.add_argument('output')
+    args = parser.parse_args(argv)
+
+    if args.command == 'terminal':
+        spec = importlib.util.spec_from_file_location('driver_font', args.module)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        font = module.terminalfont
+        data = encode(font['height'], terminalGlyphs(font))
+    else:
+        data = encode(args.height, sevenSegmentGlyphs(args.height))
+
+    with open(args.output, 'wb') as f:
+        f.write(data)
+    print('%s: %d bytes' % (args.output, len(data)))
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
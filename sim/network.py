@@ -0,0 +1,36 @@
+"""Stand-in for the MicroPython network module"""
+
+STA_IF = 0
+AP_IF = 1
+AUTH_WPA2_PSK = 3
+
+
+class WLAN:
+
+    connected = False # shared by all interfaces, flip it to simulate the WiFi going up or down
+    connections = [] # (ssid, password) of every connect()
+
+    def __init__(self, interface=STA_IF):
+        self.interface = interface
+        self.is_active = True
+        self.settings = {}
+    
+    def active(self, active=None):
+        if active is None:
+            return self.is_active
+        self.is_active = active
+    
+    def isconnected(self):
+        return WLAN.connected and self.interface == STA_IF
+
+    def connect(self, ssid=None, password=None):
+        WLAN.connections.append((ssid, password))
+
+    def config(self, **settings):
+        self.settings.update(settings)
+
+    def disconnect(self):
+        WLAN.connected = False
+
+    def ifconfig(self):
+        return ('127.0.0.1', '255.0.0.0', '127.0.0.1', '127.0.0.1')
@@ -0,0 +1,118 @@
+"""Syncs base.ICTime against a skewed local NTP server over simulated hours
+
+    python3 sim/ntpcheck.py [--offset-ms 4000] [--skew-ppm 150] [--hours 72]
+
+The server keeps its own reference clock, which starts --offset-ms ahead
+of the device and runs --skew-ppm faster than its ticks. The run fails
+unless the first sync steps the clock onto the reference, the drift
+estimate converges on the skew, the sync interval stretches once the
+clock is stable, failed syncs back off exponentially and the server name
+is only resolved again once the server stopped answering a few times.
+"""
+
+import sys
+import time
+import socket
+import argparse
+
+import hal
+from ntpserver import NTPServer
+
+POLL_MS = 10
+
+
+def check(condition, message):
+    print('%-60s %s' % (message, 'ok' if condition else 'FAILED'))
+    return condition
+
+
+def errorMs(ic_time, server):
+    """How far the device clock is behind the reference"""
+    local_ms = ic_time.utc() * 1000 + ic_time.elapsedMs() % 1000
+    return server.referenceMs() - local_ms
+
+
+def sync(ic_time, server):
+    """Advances to the next sync and runs it, returns whether it succeeded and the error before and after"""
+    # with a slow reference the corrected clock lags the ticks, the loop would just wake again
+    while not ic_time.syncDue():
+        hal.clock.advance(max(1, ic_time.nextUpdateMs()))
+    before = errorMs(ic_time, server)
+    synced = ic_time.synced_ticks
+    failures = ic_time.failures
+    ic_time.update()
+    while ic_time.ntp.isPending():
+        time.sleep(POLL_MS / 1000) # the server answers in real time
+        hal.clock.advance(POLL_MS)
+        ic_time.update()
+    if ic_time.synced_ticks == synced and ic_time.failures == failures:
+        raise AssertionError('update() neither synced nor failed')
+    return (ic_time.synced_ticks != synced, before, errorMs(ic_time, server))
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--offset-ms', type=int, default=4000, help='reference ahead of the device at the start')
+    parser.add_argument('--skew-ppm', type=int, default=150, help='reference faster than the device ticks')
+    parser.add_argument('--hours', type=int, default=72, help='simulated time to sync over')
+    args = parser.parse_args(argv)
+
+    hal.install()
+    import network
+    import base
+    from ntp import NTPClient
+
+    network.WLAN.connected = True
+    resolved = []
+    getaddrinfo = socket.getaddrinfo
+    def resolve(*args):
+        resolved.append(args)
+        return getaddrinfo(*args)
+    socket.getaddrinfo = resolve
+    server = NTPServer(offset_ms=args.offset_ms, skew_ppm=args.skew_ppm)
+    ic_time = base.ICTime(ntp=NTPClient(host=server.host, port=server.port))
+    ok = True
+
+    # the reply is stamped up to a poll after the request, half of which the round trip correction misses
+    (synced, before, after) = sync(ic_time, server)
+    ok &= check(synced and abs(before - args.offset_ms) <= 1 and abs(after) <= POLL_MS,
+                'first sync steps %d ms onto the reference (%d ms left)' % (before, after))
+
+    worst_ms = 0
+    longest_s = 0
+    while hal.clock.ticks < args.hours * 3600 * 1000:
+        (synced, before, after) = sync(ic_time, server)
+        ok &= synced
+        worst_ms = max(worst_ms, abs(after))
+        longest_s = max(longest_s, ic_time.sync_interval_s)
+    drift = base.ICTime.drift_ppm
+    ok &= check(abs(drift - args.skew_ppm) <= max(5, args.skew_ppm // 20),
+                'drift estimate %d ppm for a skew of %d ppm' % (drift, args.skew_ppm))
+    ok &= check(longest_s > ic_time.update_interval_s,
+                'sync interval stretched to %d s' % longest_s)
+    ok &= check(abs(before) <= base.ICTime.STABLE_OFFSET_MS and worst_ms <= POLL_MS,
+                'off by %d ms before the last sync, at most %d ms after any' % (abs(before), worst_ms))
+
+    ok &= check(len(resolved) == 1, 'resolved once across %d h of syncs' % args.hours)
+
+    server.drop = True
+    retries = []
+    for _ in range(5):
+        ok &= not sync(ic_time, server)[0]
+        retries.append(ic_time.next_sync_time - ic_time.utc())
+    expected = [min(ic_time.retry_interval_s << i, ic_time.update_interval_s) for i in range(len(retries))]
+    # the retry is scheduled at the timeout, a second may have passed since
+    ok &= check(all(0 <= expected[i] - retries[i] <= 1 for i in range(len(retries))),
+                'failed syncs back off: %s s' % ', '.join(str(retry) for retry in retries))
+
+    ok &= check(len(resolved) == 2, 'resolved again after %d timeouts' % NTPClient.MAX_TIMEOUTS)
+
+    server.drop = False
+    ok &= check(sync(ic_time, server)[0] and ic_time.failures == 0, 'recovers once the server answers again')
+
+    server.close()
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
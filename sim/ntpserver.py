@@ -0,0 +1,65 @@
+"""Local UDP stand-in for an NTP server"""
+
+import socket
+import struct
+import threading
+import time
+
+import hal
+
+NTP_DELTA_2000 = 3155673600
+
+
+class NTPServer:
+    """Answers SNTP requests from its own reference clock
+
+    The reference starts offset_ms ahead of the simulated wall clock and
+    from then on runs skew_ppm faster than the simulated ticks, so it
+    stays put when the client sets the RTC and a client that doesn't
+    correct for drift falls behind it.
+    """
+
+    def __init__(self, offset_ms=0, skew_ppm=0, delay_s=0, host='127.0.0.1'):
+        self.skew_ppm = skew_ppm
+        self.start_ticks = hal.clock.ticks
+        self.start_ms = hal.clock.wall_base_ms + hal.clock.ticks + offset_ms
+        self.delay_s = delay_s
+        self.drop = False
+        self.requests = 0
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind((host, 0))
+        self.sock.settimeout(0.1)
+        (self.host, self.port) = self.sock.getsockname()
+        self.running = True
+        self.thread = threading.Thread(target=self.serve, daemon=True)
+        self.thread.start()
+    
+    def serve(self):
+        while self.running:
+            try:
+                (request, address) = self.sock.recvfrom(48)
+            except OSError:
+                continue
+            self.requests += 1
+            if self.drop or len(request) < 48:
+                continue
+            
+            now_ms = self.referenceMs()
+            response = bytearray(48)
+            response[0] = (3 << 3) | 4 # version 3, server
+            response[1] = 2 # stratum
+            response[24:32] = request[40:48]
+            struct.pack_into('!II', response, 40, now_ms // 1000 + NTP_DELTA_2000, ((now_ms % 1000) << 32) // 1000)
+            if self.delay_s:
+                time.sleep(self.delay_s)
+            self.sock.sendto(response, address)
+    
+    def referenceMs(self, ticks=None):
+        """Reference milliseconds since 2000 at the simulated ticks"""
+        elapsed_ms = (hal.clock.ticks if ticks is None else ticks) - self.start_ticks
+        return self.start_ms + elapsed_ms + elapsed_ms * self.skew_ppm // 1000000
+
+    def close(self):
+        self.running = False
+        self.thread.join()
+        self.sock.close()
@@ -0,0 +1,187 @@
+"""Runs main.main() with its cooperative tasks on the simulated clock
+
+    python3 sim/taskcheck.py [scenario ...]
+
+Unlike the bench, which steps its own frame loop, this runs the tasks
+main.run_tasks() starts, under the scheduler uasyncio gives them, with
+power save on as shipped. The scenarios check that rendering, alarms and
+input all make progress while the display is lit and dark, that the WiFi
+setup portal keeps being served while the display is dark, that an
+alarm after a nap across the switch to summer time rings on time, and
+that main(profile=True) and main(debug=True) measure these same tasks.
+The run fails if any check does.
+"""
+
+import sys
+import time
+import argparse
+
+import hal
+
+
+def check(condition, message):
+    print('%-64s %s' % (message, 'ok' if condition else 'FAILED'))
+    return condition
+
+
+class Run:
+    """main.main() on a fresh simulated device, with probes on the way"""
+
+    def __init__(self, wall, alarm=None, networks=True, connected=True, sync_in_s=20*60*60):
+        """alarm is (hour, minute) in Europe/Berlin; networks saves one WiFi network, connected says whether it's there"""
+        self.clock = hal.install(wall)
+
+        import main
+        import periph
+        import network
+        import uasyncio
+        from wifi import WiFiConnector
+
+        self.main = main
+        self.periph = periph
+        self.uasyncio = uasyncio
+        main.app_config['timezone'] = 'Europe/Berlin'
+        if alarm is not None:
+            main.app_config['alarm1'] = { 'alarm-hour': alarm[0], 'alarm-minute': alarm[1], 'alarm-on': True }
+        if networks:
+            with open(WiFiConnector.PROFILES, 'w') as f:
+                f.write('home;secret\n')
+        network.WLAN.connected = connected
+        # the portal can't have port 80 on the host
+        periph.wifi = WiFiConnector(portal_port=0)
+        # no NTP traffic, the clock is right
+        periph.ic_time.next_sync_time = self.clock.time() + sync_in_s
+
+        self.dimmer = None
+        boot = main.boot
+        def captureDimmer():
+            self.dimmer = boot()
+            return self.dimmer
+        main.boot = captureDimmer
+
+        self.alarms = [] # local time of every alarm
+        periph.alarm_manager.subscribeHandler(lambda alarm: self.alarms.append(periph.ic_time.localtime()))
+        self.actions = []
+        periph.buttons_watcher.subscribeHandler(lambda pin, action: self.actions.append(action))
+        self.probes = {}
+
+    def at(self, ms, name, probe):
+        """Calls probe after ms of simulated time and keeps what it returns under name"""
+        def record():
+            self.probes[name] = probe()
+        self.clock.at(ms, record)
+
+    def click(self, ms):
+        self.periph.primary_button.script([(ms, 0), (ms + 100, 1)])
+
+    def app(self):
+        return self.dimmer.child_view
+
+    def run(self, ms, **options):
+        self.uasyncio.RUN_MS = ms
+        self.main.main(**options)
+        self.uasyncio.RUN_MS = None
+
+    def localMinute(self):
+        local = self.periph.ic_time.localtime()
+        return local[3] * 60 + local[4]
+
+
+def scenarioDay():
+    """07:29 with a 07:30 alarm: a click opens the alarm settings, the alarm brings the clock back, a click silences it"""
+    run = Run((2020, 9, 19, 5, 29, 0), alarm=(7, 30))
+    run.click(3000) # before the display goes dark, a click then only lights it
+    run.at(3700, 'settings', lambda: run.app().child_view is run.app().set_alarm_view)
+    run.at(60600, 'alarm', lambda: (run.dimmer.isDisplayOn(), run.app().clock_view.minute_of_day, run.localMinute(), run.periph.audio.isPlaying()))
+    run.click(63000)
+    run.at(63700, 'silenced', lambda: run.periph.audio.isPlaying())
+    run.run(90000)
+
+    ok = check(run.probes.get('settings') and 'click' in run.actions, 'a click opens the alarm settings')
+    ok &= check([alarm[3:6] for alarm in run.alarms] == [(7, 30, 0)], 'the alarm rings at %s' % [alarm[3:6] for alarm in run.alarms])
+    (lit, shown, minute, playing) = run.probes.get('alarm', (False, None, None, False))
+    ok &= check(lit and shown == minute and playing, 'the display lights up showing %02d:%02d' % divmod(shown or 0, 60))
+    ok &= check(run.probes.get('silenced') is False and run.actions.count('click') == 2, 'a click silences it')
+    return ok
+
+
+def scenarioPortal():
+    """No saved network: the setup portal opens and keeps being served after the display went dark"""
+    run = Run((2020, 9, 19, 20, 0, 0), networks=False, connected=False)
+    from wifi import SetupPortal
+    updates = []
+    update = run.periph.wifi.update
+    def recordUpdate():
+        if run.periph.wifi.isPortalOpen():
+            updates.append(run.clock.ticks)
+        update()
+    run.periph.wifi.update = recordUpdate
+    run.run(60000)
+
+    gaps = [updates[i] - updates[i - 1] for i in range(1, len(updates))]
+    dark = run.dimmer is not None and not run.dimmer.isDisplayOn()
+    ok = check(updates and dark, 'the portal is open, the display dark at the end')
+    ok &= check(gaps and max(gaps) <= 2 * SetupPortal.POLL_INTERVAL_MS, 'served every %d ms at worst' % max(gaps or [0]))
+    return ok
+
+
+def scenarioSpringForward():
+    """Napping from 23:00 through the switch to summer time until a 07:30 alarm"""
+    # off the second, so naps that miss the alarm don't end on it by chance
+    run = Run((2020, 3, 28, 22, 0, 7), alarm=(7, 30))
+    run.run((7*60 + 31) * 60 * 1000)
+
+    ok = check([alarm[:6] for alarm in run.alarms] == [(2020, 3, 29, 7, 30, 0)],
+               'the alarm rings at %s' % ['%04d-%02d-%02d %02d:%02d:%02d' % alarm[:6] for alarm in run.alarms])
+    import machine
+    ok &= check(len(machine.sleeps) > 1000, 'napped %d times' % len(machine.sleeps))
+    return ok
+
+
+def scenarioMonitored():
+    """The day again under main(profile=True), then main(debug=True): both measure the cooperative tasks"""
+    ok = True
+    for option in ('profile', 'debug'):
+        run = Run((2020, 9, 19, 5, 29, 0), alarm=(7, 30))
+        run.click(3000)
+        run.run(90000, **{option: True})
+        main = run.main
+        monitor = main.monitor
+        ok &= check(run.alarms and run.actions.count('click') == 1, '%s: the alarm rings, the click gets through' % option)
+        if option == 'profile':
+            busy = [main.SUBSYSTEMS[i] for i in range(len(main.SUBSYSTEMS)) if monitor.calls[i] > 0]
+            ok &= check(monitor is main.profiler and all(name in busy for name in ('buttons', 'alarms', 'render', 'audio', 'power')),
+                        '%s: %d frames, %d subsystems measured' % (option, monitor.frames, len(busy)))
+            # the render task sleeps while the display is dark, the busy loop would run thousands of frames
+            ok &= check(0 < monitor.frames < 1000, '%s: frames are render passes' % option)
+        else:
+            ok &= check(monitor.frames > 0 and not any(monitor.streaks), '%s: %d frames, no allocating task' % (option, monitor.frames))
+    return ok
+
+
+SCENARIOS = [
+    ('day', scenarioDay),
+    ('portal', scenarioPortal),
+    ('spring-forward', scenarioSpringForward),
+    ('monitored', scenarioMonitored),
+]
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('scenarios', nargs='*', help='scenarios to run, default all')
+    args = parser.parse_args(argv)
+
+    ok = True
+    for (name, scenario) in SCENARIOS:
+        if args.scenarios and name not in args.scenarios:
+            continue
+        print('%s: %s' % (name, scenario.__doc__))
+        started = time.perf_counter()
+        ok &= scenario()
+        print('  %.1f s' % (time.perf_counter() - started))
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,131 @@
+"""Stand-in for the ST7735 driver
+
+Draws into an in-memory RGB565 framebuffer and keeps statistics: calls
+made by the application, address windows opened and bytes that would
+have been pushed over SPI by the real driver.
+"""
+
+# CASET and RASET with four argument bytes each, then RAMWR
+WINDOW_BYTES = 11
+
+
+class TFT_GREEN:
+
+    def __init__(self, width, height, spi, dc, cs, rst, rotate=0):
+        if rotate in (90, 270):
+            (width, height) = (height, width)
+        self.width = width
+        self.height = height
+        self.framebuffer = bytearray(2 * width * height)
+        self.window = (0, 0, 0, 0)
+        self.cursor = 0
+        self.resetStats()
+    
+    def resetStats(self):
+        self.calls = {}
+        self.windows = 0
+        self.spi_bytes = 0
+    
+    def drawCalls(self):
+        return sum(self.calls.values())
+
+    def count(self, name):
+        self.calls[name] = self.calls.get(name, 0) + 1
+
+    def init(self):
+        self.count('init')
+
+    def rgbcolor(self, r, g, b):
+        return ((r & 0xF8) << 8) | ((g & 0xFC) << 3) | (b >> 3)
+
+    def _set_window(self, x0, y0, x1, y1):
+        self.count('_set_window')
+        self.setWindow(x0, y0, x1, y1)
+    
+    def _write(self, command=None, data=None):
+        self.count('_write')
+        if command is not None:
+            self.spi_bytes += 1
+        if data is not None:
+            self.writePixels(data)
+    
+    def pixel(self, x, y, color):
+        self.count('pixel')
+        self.fill(x, y, 1, 1, color)
+    
+    def fill_rect(self, x, y, w, h, color):
+        self.count('fill_rect')
+        self.fill(x, y, w, h, color)
+
+    def hline(self, x, y, w, color):
+        self.count('hline')
+        self.fill(x, y, w, 1, color)
+
+    def vline(self, x, y, h, color):
+        self.count('vline')
+        self.fill(x, y, 1, h, color)
+
+    def clear(self, color=0):
+        self.count('clear')
+        self.fill(0, 0, self.width, self.height, color)
+    
+    def char(self, x, y, ch, font, color, sizex=1, sizey=1):
+        self.count('char')
+        self.drawChar(x, y, ch, font, color, sizex, sizey)
+
+    def text(self, x, y, string, font, color, size=1):
+        self.count('text')
+        for ch in string:
+            self.drawChar(x, y, ch, font, color, size, size)
+            x += font['width'] * size
+
+    def drawChar(self, x, y, ch, font, color, sizex, sizey):
+        # like the driver: one small rectangle per set pixel of the glyph
+        code = ord(ch)
+        if code < font['start'] or code > font['end']:
+            return
+        offset = (code - font['start']) * font['width']
+        for (i, column) in enumerate(font['data'][offset:offset + font['width']]):
+            for row in range(font['height']):
+                if column >> row & 1:
+                    self.fill(x + i * sizex, y + row * sizey, sizex, sizey, color)
+    
+    def setWindow(self, x0, y0, x1, y1):
+        self.windows += 1
+        self.spi_bytes += WINDOW_BYTES
+        self.window = (x0, y0, x1, y1)
+        self.cursor = 0
+
+    def writePixels(self, data):
+        self.spi_bytes += len(data)
+        (x0, y0, x1, y1) = self.window
+        window_width = x1 - x0 + 1
+        data = bytes(data)
+        i = 0
+        while i + 1 < len(data) and y0 + self.cursor // window_width <= y1:
+            x = x0 + self.cursor % window_width
+            y = y0 + self.cursor // window_width
+            run = min(window_width - self.cursor % window_width, (len(data) - i) // 2)
+            if 0 <= y < self.height:
+                start = max(x, 0)
+                end = min(x + run, self.width)
+                if start < end:
+                    offset = 2 * (y * self.width + start)
+                    self.framebuffer[offset:offset + 2 * (end - start)] = data[i + 2 * (start - x):i + 2 * (end - x)]
+            self.cursor += run
+            i += 2 * run
+    
+    def fill(self, x, y, w, h, color):
+        self.setWindow(x, y, x + w - 1, y + h - 1)
+        self.writePixels(bytes((color >> 8, color & 0xFF)) * (w * h))
+
+    def getPixel(self, x, y):
+        offset = 2 * (y * self.width + x)
+        return (self.framebuffer[offset] << 8) | self.framebuffer[offset + 1]
+
+    def savePPM(self, path):
+        with open(path, 'wb') as f:
+            f.write(b'P6 %d %d 255\n' % (self.width, self.height))
+            for i in range(0, len(self.framebuffer), 2):
+                color = (self.framebuffer[i] << 8) | self.framebuffer[i + 1]
+                f.write(bytes(((color >> 8) & 0xF8, (color >> 3) & 0xFC, (color << 3) & 0xF8)))
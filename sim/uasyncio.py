@@ -0,0 +1,89 @@
+"""Stand-in for uasyncio on top of asyncio, running on the simulated clock
+
+run() uses an event loop whose time is hal.clock: when every task
+waits, the clock jumps to the next sleep to end or the next scripted
+pin change, whichever comes first, so hours of the main loop take
+seconds. Sockets are only polled, a peer on a real socket sees
+simulated time race by. Set RUN_MS to have run() return after that
+much simulated time instead of running until the coroutine finishes.
+"""
+
+from asyncio import *
+import asyncio
+import selectors
+import math
+
+import hal
+
+RUN_MS = None
+
+
+async def sleep_ms(ms):
+    await asyncio.sleep(ms / 1000)
+
+
+def wait_for_ms(awaitable, timeout_ms):
+    return asyncio.wait_for(awaitable, timeout_ms / 1000)
+
+
+class ThreadSafeFlag:
+    """Like uasyncio's: set() from an IRQ handler wakes a single waiter, wait() clears it"""
+
+    def __init__(self):
+        self.event = asyncio.Event()
+
+    def set(self):
+        self.event.set()
+
+    async def wait(self):
+        await self.event.wait()
+        self.event.clear()
+
+
+class ClockSelector(selectors.DefaultSelector):
+    """Advances the simulated clock instead of waiting"""
+
+    def select(self, timeout=None):
+        events = super().select(0)
+        if events or timeout == 0:
+            return events
+        clock = hal.clock
+        if timeout is None:
+            if not clock.timers:
+                raise RuntimeError('every task waits and nothing is scheduled on the clock')
+            step_ms = clock.timers[0][0] - clock.ticks
+        else:
+            step_ms = max(1, math.ceil(timeout * 1000 - 1e-6))
+            if clock.timers:
+                # a pin change may wake a task before the sleep ends
+                step_ms = min(step_ms, clock.timers[0][0] - clock.ticks)
+        clock.advance(max(0, step_ms))
+        return []
+
+
+class ClockLoop(asyncio.SelectorEventLoop):
+
+    def __init__(self):
+        super().__init__(ClockSelector())
+        self._clock_resolution = 0.0005 # ticks are whole milliseconds
+
+    def time(self):
+        return hal.clock.ticks / 1000
+
+
+def run(coro):
+    loop = ClockLoop()
+    asyncio.set_event_loop(loop)
+    try:
+        if RUN_MS is None:
+            return loop.run_until_complete(coro)
+        try:
+            return loop.run_until_complete(asyncio.wait_for(coro, RUN_MS / 1000))
+        except asyncio.TimeoutError:
+            return None
+    finally:
+        for task in asyncio.all_tasks(loop):
+            task.cancel()
+        loop.run_until_complete(asyncio.gather(*asyncio.all_tasks(loop), return_exceptions=True))
+        asyncio.set_event_loop(None)
+        loop.close()
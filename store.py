@@ -0,0 +1,250 @@
+import time
+import struct
+import binascii
+
+
+class FileFlash:
+    """NOR flash emulated in a file: erasing fills a sector with 0xFF, writes go in place"""
+
+    SECTOR_BYTES = 4096
+
+    def __init__(self, path, sectors=2):
+        self.path = path
+        self.sectors = sectors
+        try:
+            with open(path, 'rb') as f:
+                size = f.seek(0, 2)
+        except OSError:
+            size = 0
+        if size != sectors * FileFlash.SECTOR_BYTES:
+            with open(path, 'wb') as f:
+                for _ in range(sectors):
+                    f.write(b'\xff' * FileFlash.SECTOR_BYTES)
+
+    def read(self, offset, buf):
+        with open(self.path, 'rb') as f:
+            f.seek(offset)
+            f.readinto(buf)
+
+    def write(self, offset, data):
+        with open(self.path, 'r+b') as f:
+            f.seek(offset)
+            f.write(data)
+
+    def erase(self, sector):
+        self.write(sector * FileFlash.SECTOR_BYTES, b'\xff' * FileFlash.SECTOR_BYTES)
+
+
+class EspFlash:
+    """Raw flash sectors through the esp module, which must lie outside the filesystem"""
+
+    SECTOR_BYTES = 4096
+
+    def __init__(self, first_sector, sectors=2):
+        import esp
+
+        self.esp = esp
+        self.first_sector = first_sector
+        self.sectors = sectors
+
+    def read(self, offset, buf):
+        self.esp.flash_read(self.first_sector * EspFlash.SECTOR_BYTES + offset, buf)
+
+    def write(self, offset, data):
+        self.esp.flash_write(self.first_sector * EspFlash.SECTOR_BYTES + offset, data)
+
+    def erase(self, sector):
+        self.esp.flash_erase(self.first_sector + sector)
+
+
+class ConfigStore:
+    """Keeps the app config and the alarms added besides it in fixed-size records appended round a ring of flash slots
+
+    Every save goes to the next erased slot, so a sector is erased only
+    once per pass of the ring and the newest record always survives the
+    erase of the sector after it. Records carry a sequence number and a
+    CRC; loading finds the newest sector from its first slot, the last
+    written slot in it by bisection and falls back past a torn write.
+    Saves are coalesced: the record is written WRITE_DELAY_MS after the
+    last change, and only if it differs from what is stored.
+
+    The alarms in the config are stored with it; the other alarms of the
+    alarm manager, up to MAX_ALARMS of them, are stored by ident and
+    recurrence in the slots after, and load() leaves them in alarms for
+    the app to schedule again.
+    """
+
+    MAGIC = b'AC'
+    VERSION = 3
+    WRITE_DELAY_MS = 5000
+    ALARMS = ('alarm1',)
+    MAX_ALARMS = 50
+    IDENT_BYTES = 12
+    # magic, version, sequence, last synced UTC time, time zone, per alarm: hour, minute, on, weekdays,
+    # the number of other alarms, per other alarm: ident, hour, minute, weekdays, once, then the CRC32 of all that
+    FORMAT = '<2sBxII24s' + 'BBBB' * len(ALARMS) + 'B' + ('%dsBBBB' % IDENT_BYTES) * MAX_ALARMS
+    HEADER_FORMAT = '<2sBxI'
+    RECORD_BYTES = struct.calcsize(FORMAT) + 4
+
+    def __init__(self, flash, alarm_manager=None):
+        self.flash = flash
+        self.alarm_manager = alarm_manager
+        self.slots_per_sector = flash.SECTOR_BYTES // ConfigStore.RECORD_BYTES
+        self.slots = self.slots_per_sector * flash.sectors
+        self.record = bytearray(ConfigStore.RECORD_BYTES)
+        self.header = bytearray(struct.calcsize(ConfigStore.HEADER_FORMAT))
+        self.sequence = None # of the newest stored record
+        self.slot = -1 # last written slot
+        self.stored = None # its bytes
+        self.pending = None # config waiting to be written
+        self.config = None
+        self.alarms = [] # (ident, hour, minute, weekdays, once) of the other alarms loaded
+        self.utc_time = 0 # last known time, a better guess than the epoch after a power loss
+        self.write_after = 0
+        self.writes = 0
+
+    def encode(self, config, sequence):
+        fields = [ConfigStore.MAGIC, ConfigStore.VERSION, sequence, self.utc_time, config['timezone'].encode()]
+        for name in ConfigStore.ALARMS:
+            alarm = config[name]
+            fields += [alarm['alarm-hour'], alarm['alarm-minute'], 1 if alarm['alarm-on'] else 0, alarm.get('alarm-weekdays', 0x7F)]
+        alarms = self.otherAlarms()
+        fields.append(len(alarms))
+        for alarm in alarms:
+            recurrence = alarm.recurrence
+            fields += [alarm.ident.encode(), recurrence.time_of_day_s // 3600, recurrence.time_of_day_s // 60 % 60, recurrence.weekdays, 1 if recurrence.once else 0]
+        fields += [b'', 0, 0, 0, 0] * (ConfigStore.MAX_ALARMS - len(alarms))
+        body = struct.pack(ConfigStore.FORMAT, *fields)
+        return body + struct.pack('<I', binascii.crc32(body))
+
+    def decode(self, record, config):
+        """Updates config from a record"""
+        fields = struct.unpack(ConfigStore.FORMAT, record[:-4])
+        self.utc_time = fields[3]
+        config['timezone'] = fields[4].rstrip(b'\0').decode()
+        for i in range(len(ConfigStore.ALARMS)):
+            (hour, minute, on, weekdays) = fields[5 + 4*i:9 + 4*i]
+            config[ConfigStore.ALARMS[i]].update({'alarm-hour': hour, 'alarm-minute': minute, 'alarm-on': bool(on), 'alarm-weekdays': weekdays})
+        first = 6 + 4*len(ConfigStore.ALARMS)
+        self.alarms = []
+        for i in range(min(fields[first - 1], ConfigStore.MAX_ALARMS)):
+            (ident, hour, minute, weekdays, once) = fields[first + 5*i:first + 5*i + 5]
+            self.alarms.append((ident.rstrip(b'\0').decode(), hour, minute, weekdays, bool(once)))
+        return config
+
+    def otherAlarms(self):
+        """The alarms of the alarm manager that aren't part of the config, by ident"""
+        if self.alarm_manager is None:
+            return []
+        # server.ConfigServer keeps them to MAX_ALARMS and to idents that fit
+        alarms = [alarm for alarm in self.alarm_manager.alarms() if alarm.ident not in ConfigStore.ALARMS]
+        alarms.sort(key=lambda alarm: alarm.ident)
+        return alarms
+
+    def canStore(self, ident):
+        """Whether an alarm by that ident fits in a record"""
+        return 0 < len(ident.encode()) <= ConfigStore.IDENT_BYTES
+
+    def readHeader(self, slot):
+        """Sequence number of the record in slot, None if the slot is erased or foreign"""
+        self.flash.read(self.offset(slot), self.header)
+        (magic, version, sequence) = struct.unpack(ConfigStore.HEADER_FORMAT, self.header)
+        if magic != ConfigStore.MAGIC or version != ConfigStore.VERSION:
+            return None
+        return sequence
+
+    def offset(self, slot):
+        # records don't straddle sectors, the tail of each sector is left unused
+        (sector, index) = divmod(slot, self.slots_per_sector)
+        return sector * self.flash.SECTOR_BYTES + index * ConfigStore.RECORD_BYTES
+
+    def readRecord(self, slot):
+        self.flash.read(self.offset(slot), self.record)
+        crc = struct.unpack('<I', self.record[-4:])[0]
+        return crc == binascii.crc32(self.record[:-4])
+
+    def lastSlot(self, sector):
+        """Last written slot of a sector, -1 if it is empty"""
+        first = sector * self.slots_per_sector
+        (low, high) = (first, first + self.slots_per_sector) # slots before low are written, from high on erased
+        while low < high:
+            middle = (low + high) // 2
+            if self.readHeader(middle) is None:
+                high = middle
+            else:
+                low = middle + 1
+        return low - 1 if low > first else -1
+
+    def load(self, config):
+        """Updates config with the newest valid record, returns it"""
+        self.config = config
+        newest_sector = None
+        newest_sequence = -1
+        for sector in range(self.flash.sectors):
+            sequence = self.readHeader(sector * self.slots_per_sector)
+            if sequence is not None and sequence > newest_sequence:
+                (newest_sector, newest_sequence) = (sector, sequence)
+        if newest_sector is None:
+            return config
+
+        # the next write goes after the last written slot, even if that one was cut short
+        self.slot = self.lastSlot(newest_sector)
+
+        # walk back past a torn write, across into the sector before if need be
+        slot = self.slot
+        for _ in range(self.slots):
+            sequence = self.readHeader(slot)
+            if sequence is None:
+                break
+            if self.readRecord(slot):
+                self.sequence = sequence
+                self.stored = bytes(self.record)
+                try:
+                    return self.decode(self.record, config)
+                except (ValueError, KeyError, UnicodeError) as e:
+                    print('Ignoring stored config:', e)
+                    return config
+            slot = (slot - 1) % self.slots
+        return config
+
+    def save(self, config=None):
+        """Schedules config, or the loaded one, to be written once it has stopped changing"""
+        self.pending = config if config is not None else self.config
+        self.write_after = time.ticks_add(time.ticks_ms(), ConfigStore.WRITE_DELAY_MS)
+
+    def saveTime(self, utc_time):
+        self.utc_time = utc_time
+        self.save()
+
+    def isPending(self):
+        return self.pending is not None
+
+    def nextUpdateMs(self):
+        """Milliseconds until a pending write is due, None if there is none"""
+        if self.pending is None:
+            return None
+        return max(0, time.ticks_diff(self.write_after, time.ticks_ms()))
+
+    def update(self):
+        if self.pending is not None and time.ticks_diff(time.ticks_ms(), self.write_after) >= 0:
+            self.flush()
+
+    def flush(self):
+        if self.pending is None:
+            return
+        config = self.pending
+        self.pending = None
+
+        sequence = 0 if self.sequence is None else self.sequence + 1
+        record = self.encode(config, sequence)
+        if self.stored is not None and record[8:-4] == self.stored[8:-4]:
+            return # nothing changed but the sequence number
+
+        slot = (self.slot + 1) % self.slots
+        if slot % self.slots_per_sector == 0:
+            self.flash.erase(slot // self.slots_per_sector)
+        self.flash.write(self.offset(slot), record)
+        self.sequence = sequence
+        self.slot = slot
+        self.stored = record
+        self.writes += 1
@@ -0,0 +1,81 @@
+"""base.ICTime.msUntil() across DST changes, on the sim HAL
+
+    python3 -m pytest tests
+"""
+
+import os
+import sys
+import random
+import datetime
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'sim'))
+import hal
+
+STEP = 15*60 # transitions fall on whole hours, so the local time runs without jumps between steps
+
+
+@pytest.fixture(scope='module')
+def base():
+    hal.install()
+    import base
+    yield base
+    base.ICTime().setZone(base.tz.zone('UTC'))
+
+
+def reference_reached(reference_zone, local):
+    """First UTC instant at which the local time is at least local according to the tz database"""
+    epoch = datetime.datetime(2000, 1, 1, tzinfo=datetime.timezone.utc)
+
+    def local_time(utc_time):
+        return utc_time + int((epoch + datetime.timedelta(seconds=utc_time)).astimezone(reference_zone).utcoffset().total_seconds())
+
+    utc_time = (local - 14*60*60) // STEP * STEP
+    while True:
+        # the local time runs one second per second up to the next step, where it may jump
+        reached = utc_time + max(0, local - local_time(utc_time))
+        if reached < utc_time + STEP:
+            return reached
+        utc_time += STEP
+
+
+def test_nap_across_spring_forward(base):
+    # the last night of winter time, a 07:30 alarm is 7.5 hours away, not 8.5
+    hal.install(wall=(2020, 3, 28, 22, 0, 0))
+    base.ICTime.anchor(hal.clock.time())
+    ic_time = base.ICTime()
+    ic_time.setZone(base.tz.zone('Europe/Berlin'))
+    rung = []
+    manager = base.AlarmManager()
+    manager.add(base.Alarm('alarm1', (2020, 3, 29, 7, 30, 0, 0, 0), rung.append, repeating=True))
+
+    sleep_ms = ic_time.msUntil(manager.nextDeadline())
+    assert sleep_ms == 7*60*60*1000 + 30*60*1000
+    hal.clock.advance(sleep_ms)
+    manager.update(ic_time.timestamp())
+    assert [alarm.ident for alarm in rung] == ['alarm1']
+    assert ic_time.localtime()[3:6] == (7, 30, 0)
+
+
+@pytest.mark.parametrize('name', ['Europe/Berlin', 'America/New_York'])
+def test_ms_until_matches_tz_database(base, name):
+    zoneinfo = pytest.importorskip('zoneinfo')
+    try:
+        reference_zone = zoneinfo.ZoneInfo(name)
+    except zoneinfo.ZoneInfoNotFoundError:
+        pytest.skip('no tz database')
+    zone = base.tz.zone(name)
+    ic_time = base.ICTime()
+    ic_time.setZone(zone)
+
+    rng = random.Random(16)
+    for i in range(2, len(zone.transitions), 2):
+        transition = zone.transitions[i]
+        for _ in range(40):
+            # skipped and repeated hours included
+            local = transition + zone.offset(transition - 1) + rng.randrange(-3*60*60, 3*60*60)
+            reached = reference_reached(reference_zone, local)
+            now = reached - rng.randrange(1, 2*24*60*60)
+            base.ICTime.anchor(now)
+            assert ic_time.msUntil(local) == (reached - now) * 1000, (name, local, now)
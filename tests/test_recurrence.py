@@ -0,0 +1,168 @@
+"""base.Recurrence against a day-by-day brute-force scan, on the sim HAL
+
+    python3 -m pytest tests
+"""
+
+import os
+import sys
+import random
+import datetime
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'sim'))
+import hal
+
+DAY = 24*60*60
+YEARS = (2020, 2037) # what the time zone tables cover
+
+
+@pytest.fixture(scope='module')
+def base():
+    hal.install()
+    import base
+    return base
+
+
+def brute_next(rule, after):
+    """First occurrence strictly after 'after', trying one local day after the other"""
+    day = after // DAY
+    while True:
+        candidate = day * DAY + rule.time_of_day_s
+        if candidate > after:
+            if rule.every_days > 1:
+                if (day - rule.start_day) % rule.every_days == 0:
+                    return candidate
+            elif rule.weekdays & (1 << hal.localtime(candidate)[6]):
+                return candidate
+        day += 1
+
+
+def timestamp(*datetime):
+    return hal.mktime(datetime + (0,) * (6 - len(datetime)))
+
+
+def random_instant(rng):
+    return rng.randrange(timestamp(YEARS[0], 1, 1), timestamp(YEARS[1], 12, 1))
+
+
+def boundary_instants():
+    """Around the turn of every month, leap days included, and the instants next to them"""
+    for year in range(YEARS[0], YEARS[1]):
+        for month in range(1, 13):
+            start = timestamp(year, month, 1)
+            for delta in (-DAY, -1, 0, 1, DAY - 1):
+                yield start + delta
+
+
+def random_rules(base, rng, count):
+    for _ in range(count):
+        time_of_day_s = rng.choice((0, DAY - 1, rng.randrange(DAY)))
+        kind = rng.randrange(3)
+        if kind == 0:
+            yield base.Recurrence(time_of_day_s, weekdays=rng.randrange(1, 0x80))
+        elif kind == 1:
+            yield base.Recurrence(time_of_day_s, every_days=rng.randrange(2, 40), start_day=rng.randrange(-1000, 20000))
+        else:
+            yield base.Recurrence(time_of_day_s, start_day=rng.randrange(20000), once=True)
+
+
+def test_random_rules_match_brute_force(base):
+    rng = random.Random(6)
+    for rule in random_rules(base, rng, 3000):
+        after = random_instant(rng)
+        assert rule.next(after) == brute_next(rule, after), (rule, after)
+
+
+def test_month_and_year_boundaries(base):
+    rng = random.Random(7)
+    rules = list(random_rules(base, rng, 40)) + [
+        base.Recurrence(0),
+        base.Recurrence(DAY - 1, weekdays=base.Recurrence.WEEKEND),
+        base.Recurrence(7*60*60, weekdays=0x01), # Mondays only
+        base.Recurrence(12*60*60, every_days=7, start_day=3),
+        base.Recurrence(30, every_days=366, start_day=7000),
+    ]
+    for after in boundary_instants():
+        for rule in rules:
+            assert rule.next(after) == brute_next(rule, after), (rule, after)
+
+
+def test_occurrences_are_strictly_after(base):
+    rng = random.Random(8)
+    for rule in random_rules(base, rng, 500):
+        occurrence = rule.next(random_instant(rng))
+        assert rule.next(occurrence - 1) == occurrence
+        following = rule.next(occurrence)
+        assert following > occurrence and following == brute_next(rule, occurrence)
+
+
+def test_once_rings_only_once(base):
+    hal.install(wall=(2021, 2, 28, 23, 0, 0))
+    base.ICTime.anchor(hal.clock.time())
+    base.ICTime().setZone(base.tz.zone('UTC'))
+    rung = []
+    manager = base.AlarmManager()
+    manager.add(base.Alarm('once', (2021, 3, 1, 6, 0, 0, 0, 0), rung.append, repeating=False))
+    manager.add(base.Alarm('daily', (2021, 3, 1, 6, 0, 0, 0, 0), rung.append, repeating=True))
+    now = hal.clock.time()
+    for _ in range(4 * 24):
+        now += 60*60
+        manager.update(now)
+    assert [alarm.ident for alarm in rung].count('once') == 1
+    assert [alarm.ident for alarm in rung].count('daily') == 4
+    assert manager.get('once') is None
+
+
+def fire_instant(zone, local):
+    """First UTC instant the local time reaches a local timestamp, when AlarmManager.update() rings it
+
+    That's where the local time equals it under one of the offsets, or a transition that jumps past it.
+    """
+    offsets = set(zone.transitions[i] for i in range(1, len(zone.transitions), 2))
+    candidates = [local - offset for offset in offsets]
+    candidates += [zone.transitions[i] for i in range(2, len(zone.transitions), 2) if abs(zone.transitions[i] - local) < DAY]
+    return min(utc_time for utc_time in candidates if utc_time + zone.offset(utc_time) >= local)
+
+
+@pytest.mark.parametrize('name', ['Europe/Berlin', 'America/New_York'])
+def test_daylight_saving_boundaries(base, name):
+    zoneinfo = pytest.importorskip('zoneinfo')
+    try:
+        reference_zone = zoneinfo.ZoneInfo(name)
+    except zoneinfo.ZoneInfoNotFoundError:
+        pytest.skip('no tz database')
+    zone = base.tz.zone(name)
+    epoch = datetime.datetime(2000, 1, 1, tzinfo=datetime.timezone.utc)
+
+    def reference_next(rule, utc_time):
+        """Next wall clock occurrence after utc_time according to the tz database, the earlier of a repeated hour"""
+        local = (epoch + datetime.timedelta(seconds=utc_time)).astimezone(reference_zone)
+        day = local.date()
+        while True:
+            wall = datetime.datetime.combine(day, datetime.time(rule.time_of_day_s // 3600, rule.time_of_day_s // 60 % 60, rule.time_of_day_s % 60), reference_zone)
+            occurrence = int((wall - epoch).total_seconds())
+            if occurrence > utc_time and rule.weekdays & (1 << day.weekday()):
+                return occurrence
+            day += datetime.timedelta(days=1)
+
+    rng = random.Random(9)
+    transitions = [zone.transitions[i] for i in range(2, len(zone.transitions), 2)]
+    for transition in transitions:
+        for _ in range(60):
+            # times of day in the hour skipped in spring ring at its end, that's checked below
+            time_of_day_s = rng.randrange(DAY)
+            if 60*60 <= time_of_day_s < 4*60*60 and zone.offset(transition) > zone.offset(transition - 1):
+                continue
+            rule = base.Recurrence(time_of_day_s, weekdays=rng.choice((base.Recurrence.EVERY_DAY, rng.randrange(1, 0x80))))
+            utc_time = transition + rng.randrange(-2 * DAY, 2 * DAY)
+            local = rule.next(utc_time + zone.offset(utc_time))
+            assert fire_instant(zone, local) == reference_next(rule, utc_time), (name, rule, utc_time)
+
+    # an alarm in the skipped hour rings when the clock jumps over it
+    spring = next(transition for transition in transitions if zone.offset(transition) > zone.offset(transition - 1))
+    skipped_local = spring + zone.offset(spring - 1) + 30*60
+    rule = base.Recurrence(skipped_local % DAY)
+    local = rule.next(spring - 60*60 + zone.offset(spring - 1))
+    assert local == skipped_local
+    assert fire_instant(zone, local) == spring
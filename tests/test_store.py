@@ -0,0 +1,72 @@
+"""store.ConfigStore keeping the alarms besides the config across a restart, on the sim HAL
+
+    python3 -m pytest tests
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'sim'))
+import hal
+
+
+@pytest.fixture
+def modules():
+    hal.install(wall=(2020, 9, 19, 20, 0, 0))
+    import base
+    import store
+    return (base, store)
+
+
+def config():
+    return { 'timezone': 'Europe/Berlin', 'alarm1': { 'alarm-hour': 7, 'alarm-minute': 30, 'alarm-on': True } }
+
+
+def restart(store, alarm_manager=None):
+    """A store on the same flash, as after a power cycle"""
+    config_store = store.ConfigStore(store.FileFlash('config.bin'), alarm_manager=alarm_manager)
+    loaded = config_store.load(config())
+    return (config_store, loaded)
+
+
+def test_alarms_survive_a_restart(modules):
+    (base, store) = modules
+    manager = base.AlarmManager()
+    manager.add(base.Alarm('alarm1', (7, 30, 0), print, recurrence=base.Recurrence(7*60*60 + 30*60)))
+    manager.add(base.Alarm('gym', (18, 30, 0), print, recurrence=base.Recurrence(18*60*60 + 30*60, weekdays=0b0001010)))
+    manager.add(base.Alarm('dentist', (9, 15, 0), print, recurrence=base.Recurrence(9*60*60 + 15*60, once=True)))
+    (config_store, loaded) = restart(store, manager)
+    loaded['alarm1']['alarm-hour'] = 6
+    config_store.save(loaded)
+    config_store.flush()
+
+    (config_store, loaded) = restart(store)
+    assert loaded['alarm1']['alarm-hour'] == 6
+    # alarm1 is stored as part of the config only
+    assert config_store.alarms == [('dentist', 9, 15, 0x7F, True), ('gym', 18, 30, 0b0001010, False)]
+
+    manager.cancel('gym')
+    (config_store, _) = restart(store, manager)
+    config_store.save()
+    config_store.flush()
+    assert restart(store)[0].alarms == [('dentist', 9, 15, 0x7F, True)]
+
+
+def test_full_alarm_list_fits(modules):
+    (base, store) = modules
+    manager = base.AlarmManager()
+    for i in range(store.ConfigStore.MAX_ALARMS):
+        ident = 'x' * (store.ConfigStore.IDENT_BYTES - 2) + '%02d' % i
+        manager.add(base.Alarm(ident, (i % 24, i, 0), print, recurrence=base.Recurrence((i % 24) * 60*60 + i * 60)))
+    (config_store, loaded) = restart(store, manager)
+    # writes go round the ring more than once
+    for hour in range(3 * config_store.slots):
+        loaded['alarm1']['alarm-hour'] = hour % 24
+        config_store.save(loaded)
+        config_store.flush()
+
+    (config_store, loaded) = restart(store)
+    assert loaded['alarm1']['alarm-hour'] == (3 * config_store.slots - 1) % 24
+    assert [alarm[0] for alarm in config_store.alarms] == sorted(alarm.ident for alarm in manager.alarms())
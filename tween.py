@@ -0,0 +1,103 @@
+import time
+import array
+
+
+# easing curves map progress 0..SCALE to 0..SCALE in integer arithmetic,
+# so running animations don't allocate floats on every frame
+SCALE = 256
+
+def linear(p):
+    return p
+
+def ease_in(p):
+    return p * p // SCALE
+
+def ease_out(p):
+    return p * (2 * SCALE - p) // SCALE
+
+def ease_in_out(p):
+    # smoothstep, 3p^2 - 2p^3
+    return p * p * (3 * SCALE - 2 * p) // (SCALE * SCALE)
+
+
+def gamma_table(levels=256, max_duty=1023, gamma=2.2):
+    """Duty cycle for every perceived brightness level, so fades look linear to the eye"""
+    table = array.array('H', [0] * levels)
+    for level in range(levels):
+        table[level] = int(max_duty * (level / (levels - 1)) ** gamma + 0.5)
+
+    # keep every non-zero level visibly on
+    for level in range(1, levels):
+        if table[level] == 0:
+            table[level] = 1
+    return table
+
+
+class Tween:
+    """Moves an integer value from start to end over duration_ms, calling onUpdate with every new value"""
+
+    def __init__(self, start, end, duration_ms, onUpdate, easing=ease_in_out):
+        self.start = start
+        self.end = end
+        self.duration_ms = max(1, duration_ms)
+        self.onUpdate = onUpdate
+        self.easing = easing
+        self.started_ticks = 0
+        self.value = start
+        self.done = False
+
+    def __repr__(self):
+        return "Tween(%d -> %d, %dms)" % (self.start, self.end, self.duration_ms)
+
+    def step(self, ticks):
+        elapsed = time.ticks_diff(ticks, self.started_ticks)
+        if elapsed >= self.duration_ms:
+            value = self.end
+            self.done = True
+        else:
+            progress = max(0, elapsed) * SCALE // self.duration_ms
+            value = self.start + (self.end - self.start) * self.easing(progress) // SCALE
+
+        if value != self.value:
+            self.value = value
+            self.onUpdate(value)
+
+
+class Animator:
+    """Advances all running tweens by the time that passed, independent of the loop rate"""
+
+    FRAME_INTERVAL_MS = 10
+
+    def __init__(self):
+        self.tweens = []
+
+    def start(self, tween):
+        tween.started_ticks = time.ticks_ms()
+        tween.done = False
+        if tween not in self.tweens:
+            self.tweens.append(tween)
+        return tween
+
+    def cancel(self, tween):
+        if tween in self.tweens:
+            self.tweens.remove(tween)
+        tween.done = True
+
+    def isIdle(self):
+        return not self.tweens
+
+    def nextUpdateMs(self):
+        """Milliseconds until the next frame, None while no tween is running"""
+        return None if not self.tweens else Animator.FRAME_INTERVAL_MS
+
+    def update(self):
+        if not self.tweens:
+            return
+
+        ticks = time.ticks_ms()
+        # backwards so finished tweens can be dropped in place
+        for i in range(len(self.tweens) - 1, -1, -1):
+            tween = self.tweens[i]
+            tween.step(ticks)
+            if tween.done:
+                self.tweens.pop(i)
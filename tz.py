@@ -0,0 +1,141 @@
+import array
+import time
+
+EPOCH_YEAR = time.localtime(0)[0] # 2000 on MicroPython, 1970 elsewhere
+
+FIRST_YEAR = 2020
+LAST_YEAR = 2037 # the table holds int32 instants
+
+MIN_INSTANT = -(1 << 31)
+MAX_INSTANT = (1 << 31) - 1
+
+
+def civil_days(year, month, day):
+    """Days since 0000-03-01 in the proleptic Gregorian calendar"""
+    year -= month <= 2
+    era = year // 400
+    yoe = year - era * 400
+    doy = (153 * (month + (-3 if month > 2 else 9)) + 2) // 5 + day - 1
+    return era * 146097 + yoe * 365 + yoe // 4 - yoe // 100 + doy
+
+EPOCH_DAYS = civil_days(EPOCH_YEAR, 1, 1)
+MONDAY_DAYS = civil_days(2001, 1, 1)
+
+
+def days_from_civil(year, month, day):
+    """Days since the epoch"""
+    return civil_days(year, month, day) - EPOCH_DAYS
+
+
+def weekday(days):
+    """Weekday of days since the epoch, 0 = Monday like time.localtime"""
+    return (days + EPOCH_DAYS - MONDAY_DAYS) % 7
+
+
+def nth_sunday(year, month, n):
+    first = days_from_civil(year, month, 1)
+    return first + (6 - weekday(first)) % 7 + 7 * (n - 1)
+
+
+def last_sunday(year, month):
+    last = days_from_civil(year + month // 12, month % 12 + 1, 1) - 1
+    return last - (weekday(last) + 1) % 7
+
+
+class TimeZone:
+    """UTC offsets looked up in a precomputed table of transitions
+
+    The table is a flat int32 array of (UTC instant, offset) pairs. The
+    interval around the last lookup is cached, so steady state is one
+    range compare.
+    """
+
+    def __init__(self, name, transitions):
+        self.name = name
+        self.transitions = transitions
+        self.start = 0
+        self.end = -1
+        self.current_offset = 0
+    
+    def offset(self, utc_time):
+        if self.start <= utc_time < self.end:
+            return self.current_offset
+        
+        lo = self.interval(utc_time)
+        hi = lo + 1
+        self.start = self.transitions[2 * lo]
+        self.end = self.transitions[2 * hi] if hi < len(self.transitions) // 2 else MAX_INSTANT
+        self.current_offset = self.transitions[2 * lo + 1]
+        return self.current_offset
+
+    def interval(self, utc_time):
+        """Index of the last transition at or before utc_time"""
+        lo = 0
+        hi = len(self.transitions) // 2
+        while hi - lo > 1:
+            mid = (lo + hi) // 2
+            if self.transitions[2 * mid] <= utc_time:
+                lo = mid
+            else:
+                hi = mid
+        return lo
+
+    def utc(self, local):
+        """First UTC instant at which the local time reaches local
+
+        Local times in the hour skipped in spring are reached at the
+        transition, those in the hour repeated in autumn the first time
+        round. Offsets are less than a day, so only the intervals from a
+        day before on can hold it.
+        """
+        count = len(self.transitions) // 2
+        i = self.interval(local - 86400)
+        while True:
+            utc_time = max(self.transitions[2 * i], local - self.transitions[2 * i + 1])
+            if i + 1 == count or utc_time < self.transitions[2 * i + 2]:
+                return utc_time
+            i += 1
+    
+    def __repr__(self):
+        return "TimeZone({})".format(self.name)
+    
+    def fixed(name, offset):
+        return TimeZone(name, array.array('i', [MIN_INSTANT, offset]))
+    
+    def eu(name, standard_offset):
+        # summer time from 01:00 UTC on the last Sunday of March to the last Sunday of October
+        transitions = array.array('i', [MIN_INSTANT, standard_offset])
+        for year in range(FIRST_YEAR, LAST_YEAR + 1):
+            transitions.extend([last_sunday(year, 3) * 86400 + 3600, standard_offset + 3600])
+            transitions.extend([last_sunday(year, 10) * 86400 + 3600, standard_offset])
+        return TimeZone(name, transitions)
+    
+    def us(name, standard_offset):
+        # daylight time from 02:00 local on the second Sunday of March to the first Sunday of November
+        transitions = array.array('i', [MIN_INSTANT, standard_offset])
+        for year in range(FIRST_YEAR, LAST_YEAR + 1):
+            transitions.extend([nth_sunday(year, 3, 2) * 86400 + 7200 - standard_offset, standard_offset + 3600])
+            transitions.extend([nth_sunday(year, 11, 1) * 86400 + 7200 - standard_offset - 3600, standard_offset])
+        return TimeZone(name, transitions)
+
+
+# name -> (rule, standard offset); tables are only built for zones in use
+ZONES = {
+    'UTC': (TimeZone.fixed, 0),
+    'Europe/London': (TimeZone.eu, 0),
+    'Europe/Berlin': (TimeZone.eu, 1*60*60),
+    'Europe/Helsinki': (TimeZone.eu, 2*60*60),
+    'America/New_York': (TimeZone.us, -5*60*60),
+    'America/Chicago': (TimeZone.us, -6*60*60),
+    'America/Denver': (TimeZone.us, -7*60*60),
+    'America/Los_Angeles': (TimeZone.us, -8*60*60),
+    'Asia/Kolkata': (TimeZone.fixed, 5*60*60 + 30*60),
+    'Asia/Tokyo': (TimeZone.fixed, 9*60*60),
+}
+
+
+def zone(name):
+    if name not in ZONES:
+        raise ValueError("unknown time zone '%s'" % name)
+    (rule, standard_offset) = ZONES[name]
+    return rule(name, standard_offset)
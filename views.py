@@ -1,7 +1,9 @@
 import periph
-import font
+import fonts
 import base
 import time
+import tween
+import tz
 
 def merge_styles(s1, s2):
     s = s1.copy()
@@ -9,36 +11,86 @@ def merge_styles(s1, s2):
     return s
 
 
+class Style:
+    """Style dict compiled once into attributes, colours already converted to RGB565, the font loaded"""
+
+    __slots__ = ('left', 'top', 'width', 'font', 'font_size', 'line_height', 'color', 'background_color')
+
+    FONT = 'term8.fnt'
+
+    def __init__(self, style):
+        self.left = style.get('left', 0)
+        self.top = style.get('top', 0)
+        self.width = style.get('width', 0)
+        self.font = fonts.load(style.get('font', Style.FONT))
+        self.font_size = style.get('font-size', 1)
+        self.line_height = self.font.height * self.font_size
+        self.color = periph.display.rgbcolor(*style['color'])
+        self.background_color = periph.display.rgbcolor(*style['background-color'])
+
+
 class DisplayDimmer:
+    """Fades the backlight on a perceived brightness scale, fade_ms for the full range"""
+
+    REFRESH_INTERVAL_MS = 500
+    MAX_LEVEL = 255
+    GAMMA = tween.gamma_table(MAX_LEVEL + 1, max_duty=1023)
 
-    def __init__(self, child_view, adapt_speed, pwm_pin):
+    def __init__(self, child_view, fade_ms, pwm_pin, animator=None):
         self.child_view = child_view
-        self.current_brightness = 0
-        self.target_brightness = 0
-        self.adapt_speed = adapt_speed
+        self.fade_ms = fade_ms
+        self.animator = animator if animator is not None else tween.Animator()
+        self.fade = tween.Tween(0, 0, fade_ms, self.setLevel)
+        self.fade.done = True
+        self.level = 0
+        self.target_level = 0
+        self.duty = 0
         self.pwm_pin = pwm_pin
     
     def update(self):
-        #self.current_brightness += self.adapt_speed * (self.target_brightness - self.current_brightness)
-        if self.current_brightness < self.target_brightness:
-            self.current_brightness += self.adapt_speed
-        elif self.current_brightness > self.target_brightness:
-            self.current_brightness -= self.adapt_speed
-        
-        self.current_brightness = min(1, max(0, self.current_brightness))
-        self.pwm_pin.duty(int(self.current_brightness * 1023))
+        self.animator.update()
 
         if self.isDisplayOn():
             self.child_view.update()
 
+    def setLevel(self, level):
+        self.level = level
+        duty = DisplayDimmer.GAMMA[level]
+        if duty != self.duty: # neighbouring levels share a duty at the dark end
+            self.duty = duty
+            self.pwm_pin.duty(duty)
+
+    def fadeTo(self, level):
+        if level == self.target_level:
+            return
+        
+        self.target_level = level
+        # a reversed fade only takes as long as the distance it has to cover
+        self.fade.start = self.level
+        self.fade.end = level
+        self.fade.duration_ms = max(1, self.fade_ms * abs(level - self.level) // DisplayDimmer.MAX_LEVEL)
+        self.animator.start(self.fade)
+
     def displayOn(self):
-        self.target_brightness = 1
+        self.fadeTo(DisplayDimmer.MAX_LEVEL)
     
     def displayOff(self):
-        self.target_brightness = 0
+        self.fadeTo(0)
     
     def isDisplayOn(self):
-        return self.current_brightness > 0
+        return self.level > 0
+
+    def isFading(self):
+        return not self.fade.done
+
+    def nextUpdateMs(self):
+        """Milliseconds until update() has work to do, None if only input can change that"""
+        next_update = self.animator.nextUpdateMs()
+        if next_update is not None:
+            return next_update
+        if self.isDisplayOn():
+            return DisplayDimmer.REFRESH_INTERVAL_MS
+        return None
     
     def onInput(self, pin, action):
         if self.isDisplayOn():
@@ -49,8 +101,8 @@ class DisplayDimmer:
 
 class InactivityDisplayDimmer(DisplayDimmer):
 
-    def __init__(self, child_view, adapt_speed, pwm_pin, inactivity_timeout_ms=5000):
-        super().__init__(child_view, adapt_speed, pwm_pin)
+    def __init__(self, child_view, fade_ms, pwm_pin, inactivity_timeout_ms=5000, animator=None):
+        super().__init__(child_view, fade_ms, pwm_pin, animator=animator)
         self.inactivity_timeout = inactivity_timeout_ms
         self.last_activity = time.ticks_ms()
     
@@ -63,6 +115,13 @@ class InactivityDisplayDimmer(DisplayDimmer):
         super().displayOn()
         self.last_activity = time.ticks_ms()
 
+    def nextUpdateMs(self):
+        next_update = super().nextUpdateMs()
+        if self.target_level > 0:
+            remaining = max(0, self.inactivity_timeout - time.ticks_diff(time.ticks_ms(), self.last_activity))
+            next_update = remaining if next_update is None else min(next_update, remaining)
+        return next_update
+
     def onInput(self, pin, action):
         super().onInput(pin, action)
         self.last_activity = time.ticks_ms()
@@ -70,187 +129,330 @@ class InactivityDisplayDimmer(DisplayDimmer):
 
 class App:
     
-    def __init__(self, style, config):
+    def __init__(self, style, config, canvas=None, store=None, panels=()):
         self.style = style
         self.config = config
+        self.store = store
         self.registerAlarm()
-        self.child_view = ClockView(self.style) 
+        self.restoreAlarms()
+        self.root = Reconciler(self.style, canvas=canvas)
+        self.clock_view = ClockView(self.style, panels=panels)
+        self.set_alarm_view = SetAlarmView(self.style, config=self.config['alarm1'], onAlarmConfigured=self.onAlarmConfigured, onAbort=self.onAlarmConfigured)
+        self.child_view = self.clock_view
 
     def update(self):
-        self.child_view.update()
+        if self.child_view.changed():
+            self.root.render(self.child_view.render())
+        self.root.update()
+
+    def show(self, view):
+        if view is not self.child_view:
+            view.reset()
+            self.child_view = view
     
     def onInput(self, pin, action):
+        if action not in ('click', 'longpress'): # the views only know clicks and long presses
+            return
+
         if periph.audio.isPlaying():
             periph.audio.stop()
             return
 
-        if isinstance(self.child_view, ClockView):
-            self.child_view = SetAlarmView(self.style, config=self.config['alarm1'], onAlarmConfigured=self.onAlarmConfigured, onAbort=self.onAlarmConfigured)
-        elif isinstance(self.child_view, SetAlarmView):
+        if self.child_view is self.clock_view:
+            self.show(self.set_alarm_view)
+        else:
             self.child_view.onInput(pin, action)
     
     def onAlarm(self, alarm):
         print(alarm, "just went off")
         periph.audio.play()
-        self.child_view = ClockView(self.style)
+        self.show(self.clock_view)
+        # a one-off alarm is gone now, also from the store
+        if alarm.recurrence.once and self.store is not None:
+            self.store.save()
     
     def onAlarmConfigured(self, set_alarm_view):
         self.config['alarm1'].update(set_alarm_view.config)
         self.registerAlarm()
-        self.child_view = ClockView(self.style)
-    
+        if self.store is not None:
+            self.store.save(self.config)
+        self.show(self.clock_view)
+    
+    def configure(self, alarm_config, timezone=None):
+        """Applies settings changed other than through the views, e.g. by server.ConfigServer"""
+        self.config['alarm1'].update(alarm_config)
+        if timezone is not None:
+            self.config['timezone'] = timezone
+            periph.ic_time.setZone(tz.zone(timezone))
+        self.registerAlarm()
+        if self.store is not None:
+            self.store.save(self.config)
+        # an open SetAlarmView would show stale values
+        self.show(self.clock_view)
+
     def registerAlarm(self):
         if self.config['alarm1']['alarm-on']:
-            periph.alarm_manager.add(base.Alarm('alarm1', (self.config['alarm1']['alarm-hour'], self.config['alarm1']['alarm-minute'], 0), self.onAlarm, repeating=True))
+            alarm_config = self.config['alarm1']
+            recurrence = base.Recurrence(
+                alarm_config['alarm-hour'] * 60*60 + alarm_config['alarm-minute'] * 60,
+                weekdays=alarm_config.get('alarm-weekdays', base.Recurrence.EVERY_DAY)
+            )
+            periph.alarm_manager.add(base.Alarm('alarm1', (alarm_config['alarm-hour'], alarm_config['alarm-minute'], 0), self.onAlarm, recurrence=recurrence))
         else:
             periph.alarm_manager.cancel('alarm1')
 
+    def restoreAlarms(self):
+        """Schedules the alarms the store loaded besides the ones in the config, e.g. those added through server.ConfigServer"""
+        if self.store is None:
+            return
+        for (ident, hour, minute, weekdays, once) in self.store.alarms:
+            recurrence = base.Recurrence(hour * 60*60 + minute * 60, weekdays=weekdays, once=once)
+            periph.alarm_manager.add(base.Alarm(ident, (hour, minute, 0), self.onAlarm, recurrence=recurrence))
 
-class ClockView:
-    
-    def __init__(self, style):
-        self.style = style
-        self.text_view = TextView(merge_styles(self.style, { 'left': 10, 'top': 50, 'font-size': 4 }))
-        self.container = Container(self.style, [self.text_view])
 
-    def update(self):
-        (_, _, _, hours, mins, _, _, _) = periph.ic_time.localtime()
-        self.text_view.setText("%02d:%02d" % (hours, mins))
-        self.container.update()
+class ClockView:
+    """The time, with the elements of panels below it"""
+
+    TIME_FONT = 'clock32.fnt'
+    
+    def __init__(self, style, panels=()):
+        self.time_style = merge_styles(style, { 'left': 10, 'top': 50, 'font': ClockView.TIME_FONT })
+        self.panels = panels
+        self.minute_of_day = None
+
+    def reset(self):
+        self.minute_of_day = None
+        for panel in self.panels:
+            panel.reset()
+
+    def changed(self):
+        # integer arithmetic on the timestamp, nothing is rendered until the minute changes
+        if periph.ic_time.timestamp() // 60 % (24*60) != self.minute_of_day:
+            return True
+        for panel in self.panels:
+            if panel.changed():
+                return True
+        return False
+
+    def render(self):
+        self.minute_of_day = periph.ic_time.timestamp() // 60 % (24*60)
+        elements = [
+            Element(TextView, 'time', self.time_style, text="%02d:%02d" % (self.minute_of_day // 60, self.minute_of_day % 60)),
+        ]
+        for panel in self.panels:
+            elements += panel.render()
+        return elements
+
+
+class FeedPanel:
+    """One line of text made from the values of a feed.Feed, blank while it has none"""
+
+    MAX_CHARS = 24 # what fits next to the left margin in the smallest font
+
+    def __init__(self, style, feed, fmt, key='feed', top=100):
+        self.style = merge_styles(style, { 'left': 10, 'top': top, 'font-size': 1 })
+        self.feed = feed
+        self.fmt = fmt
+        self.key = key
+        self.version = None
+
+    def reset(self):
+        self.version = None
+
+    def changed(self):
+        return self.feed.version != self.version
+
+    def render(self):
+        self.version = self.feed.version
+        values = self.feed.values
+        text = ''
+        if values is not None and None not in values:
+            text = (self.fmt % values)[:FeedPanel.MAX_CHARS]
+        return [
+            Element(TextView, self.key, self.style, text=text),
+        ]
 
 
 class SetAlarmView:
+    """Long press moves through hour, minute and on/off, click changes the selected field"""
+
+    FIELDS = (
+        ('alarm-hour', range(0, 24)),
+        ('alarm-minute', range(0, 60, 5)),
+        ('alarm-on', (True, False)),
+    )
     
     def __init__(self, style, config, onAlarmConfigured=None, onAbort=None):
-        self.style = style
         self.config = config
 
         self.onAlarmConfigured = onAlarmConfigured
         self.onAbort = onAbort
 
-        self.title = TextView(merge_styles(self.style, { 'left': 10, 'top': 10, 'font-size': 1 }), text='Set Alarm 1')
-        #self.alarm_time = TextView(merge_styles(self.style, { 'left': 10, 'top': 50, 'font-size': 4 }), text='08:40')
-
-        self.alarm_hour_spinner = Spinner(
-            merge_styles(self.style, { 'left': 10, 'top': 50, 'font-size': 4 }),
-            [("%02d" % v, v) for v in range(0, 24)],
-            initial_value=self.config['alarm-hour'],
-            onChange=lambda e: self.config.update({ 'alarm-hour': e.selectedValue() })
+        self.title_style = merge_styles(style, { 'left': 10, 'top': 10, 'font-size': 1 })
+        # the time shares its key and style with ClockView, so switching views only repaints the digits that differ
+        self.time_style = merge_styles(style, { 'left': 10, 'top': 50, 'font': ClockView.TIME_FONT })
+        self.switch_style = merge_styles(style, { 'left': 10, 'top': 100, 'font-size': 1 })
+        time_font = fonts.load(ClockView.TIME_FONT)
+        switch_font = fonts.load(Style.FONT)
+        self.underline_styles = (
+            merge_styles(style, { 'left': 10, 'top': 50 + time_font.height, 'width': time_font.textWidth('00') }),
+            merge_styles(style, { 'left': 10 + time_font.textWidth('00:'), 'top': 50 + time_font.height, 'width': time_font.textWidth('00') }),
+            merge_styles(style, { 'left': 10, 'top': 100 + switch_font.height, 'width': switch_font.textWidth('Off') }),
         )
-        self.alarm_hour_underline = Underline(self.style, self.alarm_hour_spinner, underline=False)
 
-        self.alarm_colon = TextView(merge_styles(self.style, { 'left': 10 + self.alarm_hour_spinner.width(), 'top': 50, 'font-size': 4 }), text=':')
+        self.reset()
 
-        self.alarm_minute_spinner = Spinner(
-            merge_styles(self.style, { 'left': 10 + self.alarm_hour_spinner.width() + self.alarm_colon.width(), 'top': 50, 'font-size': 4 }),
-            [("%02d" % v, v) for v in range(0, 60, 5)],
-            initial_value=self.config['alarm-minute'],
-            onChange=lambda e: self.config.update({ 'alarm-minute': e.selectedValue() })
-        )
-        self.alarm_minute_underline = Underline(self.style, self.alarm_minute_spinner, underline=False)
+    def reset(self):
+        self.selected_field = None
+        self.dirty = True
 
-        self.on_off_switch = Spinner(
-            merge_styles(self.style, { 'left': 10, 'top': 100, 'font-size': 1 }),
-            [("On ", True), ("Off", False)],
-            initial_value=self.config['alarm-on'],
-            onChange=lambda e: self.config.update({ 'alarm-on': e.selectedValue() })
-        )
-        self.on_off_underline = Underline(self.style, self.on_off_switch, underline=False)
+    def changed(self):
+        return self.dirty
+
+    def render(self):
+        self.dirty = False
+        return [
+            Element(TextView, 'title', self.title_style, text='Set Alarm 1'),
+            Element(TextView, 'time', self.time_style, text="%02d:%02d" % (self.config['alarm-hour'], self.config['alarm-minute'])),
+            Element(Line, 'alarm-hour-underline', self.underline_styles[0], visible=self.selected_field == 0),
+            Element(Line, 'alarm-minute-underline', self.underline_styles[1], visible=self.selected_field == 1),
+            Element(TextView, 'on-off', self.switch_style, text="On " if self.config['alarm-on'] else "Off"),
+            Element(Line, 'on-off-underline', self.underline_styles[2], visible=self.selected_field == 2),
+        ]
 
-        self.container = Container(self.style, [self.title, self.alarm_hour_underline, self.alarm_colon, self.alarm_minute_underline, self.on_off_underline])
+    def spin(self, field):
+        (key, values) = SetAlarmView.FIELDS[field]
+        index = next((i for i in range(len(values)) if values[i] == self.config[key]), -1)
+        self.config[key] = values[(index + 1) % len(values)]
 
     def onInput(self, pin, action):
+        self.dirty = True
+
         if action == 'longpress':
-            if self.alarm_hour_underline.is_underlined:
-                self.alarm_hour_underline.setUnderline(False)
-                self.alarm_minute_underline.setUnderline(True)
-            elif self.alarm_minute_underline.is_underlined:
-                self.alarm_minute_underline.setUnderline(False)
-                self.on_off_underline.setUnderline(True)
-            elif self.on_off_underline.is_underlined:
-                self.on_off_underline.setUnderline(False)
+            if self.selected_field is None:
+                self.selected_field = 0
+            elif self.selected_field < len(SetAlarmView.FIELDS) - 1:
+                self.selected_field += 1
+            else:
+                self.selected_field = None
                 if self.onAlarmConfigured is not None:
                     self.onAlarmConfigured(self)
-            else:
-                self.alarm_hour_underline.setUnderline(True)
         elif action == 'click':
-            if self.alarm_hour_underline.is_underlined:
-                self.alarm_hour_spinner.onInput(pin, action)
-            elif self.alarm_minute_underline.is_underlined:
-                self.alarm_minute_spinner.onInput(pin, action)
-            elif self.on_off_underline.is_underlined:
-                self.on_off_switch.onInput(pin, action)
-            else:
-                if self.onAbort is not None:
-                    self.onAbort(self)
+            if self.selected_field is not None:
+                self.spin(self.selected_field)
+            elif self.onAbort is not None:
+                self.onAbort(self)
 
-    def update(self):
-        self.container.update()
 
+class Element:
+    """Declarative description of a widget, what the views render"""
 
-class Underline:
+    __slots__ = ('kind', 'key', 'style', 'props')
 
-    def __init__(self, style, child, underline=True):
+    def __init__(self, kind, key, style, **props):
+        self.kind = kind
+        self.key = key
         self.style = style
-        self.child = child
-        self.is_underlined = False
-        self.underline = underline
-    
-    def setUnderline(self, underline):
-        self.underline = underline
+        self.props = props
 
-    def onInput(self, pin, action):
-        self.child.onInput(pin, action)
 
-    def update(self):
-        self.child.update()
+def overlaps(a, b):
+    return a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]
 
-        if self.is_underlined == self.underline:
-            return
+
+class Reconciler:
+    """Keeps the widgets of the last render mounted and patches them to match the next one
+
+    Elements are matched by key. A widget whose kind and style are
+    unchanged is kept along with what it has drawn and only gets new
+    props, so it repaints just what differs. Widgets that disappear are
+    erased, and kept widgets they overlapped are redrawn. Only the very
+    first frame clears the screen.
+    """
+
+    def __init__(self, style, canvas=None):
+        self.background_color = Style(style).background_color
+        self.surface = canvas if canvas is not None else periph.display
+        self.mounted = {} # key -> (element, widget)
+        self.widgets = ()
+        self.should_update = True
+
+    def render(self, elements):
+        mounted = {}
+        erased = []
+
+        for element in elements:
+            entry = self.mounted.pop(element.key, None)
+            if entry is not None and entry[0].kind is element.kind and entry[0].style == element.style:
+                widget = entry[1]
+            else:
+                if entry is not None:
+                    erased.append(entry[1].bounds())
+                    entry[1].erase()
+                widget = element.kind(element.style)
+                widget.setSurface(self.surface)
+            
+            widget.setProps(element.props)
+            mounted[element.key] = (element, widget)
         
-        line_color = periph.TFT.rgbcolor(*self.style['color']) if self.underline else periph.TFT.rgbcolor(*self.style['background-color'])
-        periph.TFT.hline(self.child.left(), self.child.top() + self.child.height(), self.child.width(), line_color)
-        self.is_underlined = self.underline
+        for (element, widget) in self.mounted.values():
+            erased.append(widget.bounds())
+            widget.erase()
         
+        self.mounted = mounted
+        self.widgets = tuple(mounted[element.key][1] for element in elements)
 
-class Spinner:
-
-    def __init__(self, style, key_value_pairs, initial_value=None, onChange=None):
-        self.style = style
-        self.text = TextView(self.style)
-        self.key_value_pairs = key_value_pairs
-        self.setSelectedIndex(next(i for i, (key, value) in enumerate(self.key_value_pairs) if value == initial_value) if initial_value is not None else 0)
-        self.onChange = onChange
+        for bounds in erased:
+            for widget in self.widgets:
+                if overlaps(widget.bounds(), bounds):
+                    widget.invalidate()
     
-    def spin(self):
-        self.setSelectedIndex((self.selected_index + 1) % len(self.key_value_pairs))
-    
-    def setSelectedIndex(self, index):
-        self.selected_index = index
-        self.text.setText(self.key_value_pairs[self.selected_index][0])
+    def update(self):
+        if self.should_update:
+            self.surface.clear(self.background_color)
+            self.should_update = False
+        
+        for widget in self.widgets:
+            widget.update()
+        
+        self.surface.flush()
+
+
+class Line:
+    """Horizontal line that is drawn or erased as its visible prop changes"""
+
+    __slots__ = ('style', 'visible', 'drawn', 'surface', 'box')
+
+    def __init__(self, style, visible=True):
+        self.style = Style(style)
+        self.visible = visible
+        self.drawn = False
+        self.surface = periph.display
+        self.box = (self.style.left, self.style.top, self.style.left + self.style.width, self.style.top + 1)
+
+    def setSurface(self, surface):
+        self.surface = surface
+
+    def setProps(self, props):
+        self.visible = props.get('visible', True)
 
-    def onInput(self, pin, action):
-        self.spin()
-        if self.onChange is not None:
-            self.onChange(self)
-    
     def update(self):
-        self.text.update()
-    
-    def selectedValue(self):
-        return self.key_value_pairs[self.selected_index][1]
-    
-    def left(self):
-        return self.text.left()
-    
-    def top(self):
-        return self.text.top()
-    
-    def width(self):
-        return self.text.width()
-    
-    def height(self):
-        return self.text.height()
+        if self.drawn == self.visible:
+            return
+        
+        self.surface.hline(self.style.left, self.style.top, self.style.width, self.style.color if self.visible else self.style.background_color)
+        self.drawn = self.visible
+
+    def erase(self):
+        if self.drawn:
+            self.surface.hline(self.style.left, self.style.top, self.style.width, self.style.background_color)
+            self.drawn = False
+
+    def invalidate(self):
+        self.drawn = False
+
+    def bounds(self):
+        return self.box
 
 
 # class NumericSpinner:
@@ -302,53 +504,84 @@ class Spinner:
 #         return max(minv, min(maxv, val))
 
 
-class Container:
-
-    def __init__(self, style, children):
-        self.style = style
-        self.should_update = True
-        self.children = children
-    
-    def onInput(self, pin, action):
-        for child in self.children:
-            child.onInput(pin, action)
-    
-    def update(self):
-        if self.should_update:
-            periph.TFT.clear(periph.TFT.rgbcolor(*self.style['background-color']))
-            self.should_update = False
-        
-        for child in self.children:
-            child.update()
-
-
 class TextView:
+    """Text that repaints only what changed; its widths and bounding box are measured when the text changes"""
+
+    __slots__ = ('style', 'current_text', 'text', 'text_width', 'drawn_width', 'box', 'surface')
 
     def __init__(self, style, text=''):
-        self.style = style
-        self.current_text = ''
-        self.text = text
+        self.style = Style(style)
+        self.text = None
+        self.setText(text)
+        self.setDrawn('', 0)
+        self.surface = periph.display
     
     def setText(self, text):
-        self.text = text
+        if text != self.text:
+            self.text = text
+            self.text_width = self.textWidth(text)
+
+    def setDrawn(self, text, width):
+        self.current_text = text
+        self.drawn_width = width
+        self.box = (self.style.left, self.style.top, self.style.left + width, self.style.top + self.style.line_height)
+
+    def setSurface(self, surface):
+        self.surface = surface
+
+    def setProps(self, props):
+        self.setText(props.get('text', ''))
+
+    def textWidth(self, text):
+        return self.style.font.textWidth(text) * self.style.font_size
+
+    def erase(self):
+        if self.current_text:
+            self.surface.fillrect(self.style.left, self.style.top, self.drawn_width, self.style.line_height, self.style.background_color)
+            self.setDrawn('', 0)
+
+    def invalidate(self):
+        self.setDrawn('', 0)
+
+    def bounds(self):
+        return self.box
     
     def update(self):
         if self.current_text == self.text:
             return
         
-        periph.TFT.text(self.style['left'], self.style['top'], self.current_text, font.terminalfont, periph.TFT.rgbcolor(*self.style['background-color']), self.style['font-size'])
-        periph.TFT.text(self.style['left'], self.style['top'], self.text, font.terminalfont, periph.TFT.rgbcolor(*self.style['color']), self.style['font-size'])
+        style = self.style
+        font = style.font
+        common_length = min(len(self.current_text), len(self.text))
+
+        # glyphs stay in place up to the first one whose width changed, of those repaint only the ones that differ
+        x = style.left
+        i = 0
+        while i < common_length:
+            advance = font.advance(self.text[i])
+            if font.advance(self.current_text[i]) != advance:
+                break
+            if self.current_text[i] != self.text[i]:
+                self.surface.text(x, style.top, self.text[i], font, style.color, style.background_color, style.font_size)
+            x += advance * style.font_size
+            i += 1
+        
+        # everything after that moves: draw it and clear what the old text covered beyond the new
+        if i < len(self.text):
+            self.surface.text(x, style.top, self.text[i:], font, style.color, style.background_color, style.font_size)
+        if self.drawn_width > self.text_width:
+            self.surface.fillrect(style.left + self.text_width, style.top, self.drawn_width - self.text_width, style.line_height, style.background_color)
 
-        self.current_text = self.text
+        self.setDrawn(self.text, self.text_width)
     
     def left(self):
-        return self.style['left']
+        return self.style.left
     
     def top(self):
-        return self.style['top']
+        return self.style.top
 
     def width(self):
-        return font.terminalfont['width'] * self.style['font-size'] * len(self.text) # TODO: add font to style, get dimensions dynamically
+        return self.text_width
     
     def height(self):
-        return font.terminalfont['height'] * self.style['font-size'] # TODO: add font to style, get dimensions dynamically
+        return self.style.line_height
@@ -0,0 +1,292 @@
+import network
+import socket
+import errno
+import time
+
+
+class SetupPortal:
+    """Access point with a page for entering a network, served from within the main loop
+
+    GET shows a form for the network's name and password, POSTing it
+    stores them in network, for the WiFiConnector to pick up. Like
+    server.ConfigServer, update() never blocks: one client at a time,
+    at most MAX_READS_PER_UPDATE small reads and SEND_BYTES sent, and a
+    client that takes longer than CLIENT_TIMEOUT_MS is dropped. The
+    whole request has to fit into REQUEST_BYTES.
+    """
+
+    ESSID = 'AlarmClock'
+    PASSWORD = 'alarmclock' # WPA2 needs at least 8 characters
+    PORT = 80
+    REQUEST_BYTES = 512
+    READ_BYTES = 128
+    MAX_READS_PER_UPDATE = 2
+    SEND_BYTES = 256
+    CLIENT_TIMEOUT_MS = 5000
+    POLL_INTERVAL_MS = 100 # while listening
+    BUSY_INTERVAL_MS = 10 # while a client is served
+
+    PAGE = ('<html><body><h3>Alarm clock WiFi</h3><form method="post">'
+            '<p>Network <input name="ssid"></p><p>Password <input name="password" type="password"></p>'
+            '<p><input type="submit" value="Connect"></p></form></body></html>')
+
+    def __init__(self, essid=ESSID, password=PASSWORD, port=PORT):
+        self.ap = network.WLAN(network.AP_IF)
+        self.ap.active(True)
+        self.ap.config(essid=essid, password=password, authmode=network.AUTH_WPA2_PSK)
+
+        self.listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.listener.bind(socket.getaddrinfo('0.0.0.0', port)[0][-1])
+        self.listener.listen(1)
+        self.listener.setblocking(False)
+        # MicroPython sockets have no getsockname(), port 0 is only of use on the host
+        self.port = self.listener.getsockname()[1] if hasattr(self.listener, 'getsockname') else port
+
+        self.request = bytearray(SetupPortal.REQUEST_BYTES)
+        self.length = 0
+        self.client = None
+        self.accepted_ticks = 0
+        self.out = None
+        self.sent = 0
+        self.network = None # (ssid, password) once entered
+        print('WiFi setup: join %s (password %s) and open http://%s/' % (essid, password, self.ap.ifconfig()[0]))
+
+    def isServing(self):
+        return self.client is not None
+
+    def nextUpdateMs(self):
+        return SetupPortal.BUSY_INTERVAL_MS if self.client is not None else SetupPortal.POLL_INTERVAL_MS
+
+    def update(self):
+        try:
+            if self.client is None:
+                self.accept()
+            elif self.out is not None:
+                self.send()
+            else:
+                self.receive()
+
+            if self.client is not None and time.ticks_diff(time.ticks_ms(), self.accepted_ticks) >= SetupPortal.CLIENT_TIMEOUT_MS:
+                self.closeClient()
+        except (OSError, ValueError) as e:
+            # ValueError: a request that isn't UTF-8
+            print('WiFi setup:', e)
+            self.closeClient()
+
+    def accept(self):
+        try:
+            (self.client, _) = self.listener.accept()
+        except OSError as e:
+            if e.args[0] != errno.EAGAIN:
+                raise
+            return
+        self.client.setblocking(False)
+        self.accepted_ticks = time.ticks_ms()
+        self.length = 0
+
+    def receive(self):
+        for _ in range(SetupPortal.MAX_READS_PER_UPDATE):
+            try:
+                data = self.client.recv(SetupPortal.READ_BYTES)
+            except OSError as e:
+                if e.args[0] != errno.EAGAIN:
+                    raise
+                return
+            if not data:
+                self.closeClient() # gone before the request was complete
+                return
+            if self.length + len(data) > len(self.request):
+                self.respond(413, 'request too large')
+                return
+            self.request[self.length:self.length + len(data)] = data
+            self.length += len(data)
+            if self.handleRequest():
+                return
+
+    def handleRequest(self):
+        """Responds once the request is complete, returns whether it was"""
+        request = bytes(self.request[:self.length])
+        header_end = request.find(b'\r\n\r\n')
+        if header_end < 0:
+            return False
+        lines = request[:header_end].decode().split('\r\n')
+        method = lines[0].split(' ')[0]
+        if method != 'POST':
+            self.respond(200, SetupPortal.PAGE, 'text/html')
+            return True
+
+        body_length = -1
+        for line in lines[1:]:
+            (name, _, value) = line.partition(':')
+            if name.strip().lower() == 'content-length':
+                body_length = int(value)
+        if body_length < 0:
+            self.respond(411, 'Content-Length required')
+            return True
+        body = request[header_end + 4:]
+        if len(body) < body_length:
+            return False
+
+        from server import unquote
+        fields = {}
+        for pair in body[:body_length].decode().split('&'):
+            (name, _, value) = pair.partition('=')
+            fields[unquote(name)] = unquote(value)
+        ssid = fields.get('ssid', '')
+        if not ssid or ';' in ssid:
+            self.respond(400, 'a network name without semicolons, please')
+            return True
+        self.network = (ssid, fields.get('password', ''))
+        self.respond(200, 'Saved, connecting to %s. This access point closes now.' % ssid)
+        return True
+
+    def respond(self, status, body, content_type='text/plain'):
+        self.out = ('HTTP/1.0 %d %s\r\nContent-Type: %s\r\nConnection: close\r\n\r\n%s' % (
+            status, 'OK' if status < 400 else 'Error', content_type, body)).encode()
+        self.sent = 0
+
+    def send(self):
+        try:
+            self.sent += self.client.send(self.out[self.sent:self.sent + SetupPortal.SEND_BYTES])
+        except OSError as e:
+            if e.args[0] != errno.EAGAIN:
+                raise
+            return
+        if self.sent == len(self.out):
+            self.closeClient()
+
+    def closeClient(self):
+        if self.client is not None:
+            self.client.close()
+            self.client = None
+        self.out = None
+        self.length = 0
+
+    def close(self):
+        self.closeClient()
+        self.listener.close()
+        self.ap.active(False)
+
+
+class WiFiConnector:
+    """Brings the station interface up in the background
+
+    Tries the saved networks, one at a time, while the loop keeps running.
+    While none is saved, or every saved one failed, a SetupPortal runs
+    alongside for entering one; it closes once a network is entered or
+    the connection is up.
+    """
+
+    PROFILES = 'wifi.dat' # 'ssid;password' lines, like WiFiManager keeps them
+    ATTEMPT_MS = 15000
+    RETRY_MS = 60000 # after every saved network failed
+    POLL_INTERVAL_MS = 250
+    CHECK_INTERVAL_MS = 15000 # while connected
+
+    def __init__(self, profiles=PROFILES, portal_port=SetupPortal.PORT):
+        self.profiles_path = profiles
+        self.portal_port = portal_port
+        self.portal = None
+        self.wlan = network.WLAN(network.STA_IF)
+        self.profiles = None
+        self.attempt = -1 # index of the profile being tried
+        self.attempt_started = 0
+        self.connected = False
+        self.handlers = []
+
+    def readProfiles(self):
+        profiles = []
+        try:
+            with open(self.profiles_path) as f:
+                for line in f:
+                    if ';' in line:
+                        (ssid, password) = line.rstrip('\r\n').split(';', 1)
+                        profiles.append((ssid, password))
+        except OSError:
+            pass
+        return profiles
+
+    def saveProfile(self, ssid, password):
+        """Puts the network first, the one most recently entered is tried first"""
+        profiles = [(ssid, password)] + [profile for profile in self.readProfiles() if profile[0] != ssid]
+        with open(self.profiles_path, 'w') as f:
+            for profile in profiles:
+                f.write('%s;%s\n' % profile)
+
+    def update(self):
+        if self.wlan.isconnected():
+            if not self.connected:
+                self.connected = True
+                print('WiFi connected:', self.wlan.ifconfig()[0])
+                self.closePortal()
+                for handler in self.handlers:
+                    handler(self.wlan)
+            return
+        self.connected = False
+
+        if self.portal is not None:
+            self.portal.update()
+            if self.portal.network is not None and not self.portal.isServing():
+                (ssid, password) = self.portal.network
+                self.closePortal()
+                self.saveProfile(ssid, password)
+                self.profiles = self.readProfiles()
+                self.attempt = 0
+                self.attempt_started = time.ticks_ms()
+                print('WiFi connecting to', ssid)
+                self.wlan.connect(ssid, password)
+                return
+
+        if self.profiles is None:
+            # the ESP8266 reconnects to the last network by itself, give it one attempt first
+            self.wlan.active(True)
+            self.profiles = self.readProfiles()
+            self.attempt_started = time.ticks_ms()
+            if not self.profiles:
+                self.openPortal()
+            return
+
+        elapsed = time.ticks_diff(time.ticks_ms(), self.attempt_started)
+        if elapsed < (WiFiConnector.RETRY_MS if self.attempt == len(self.profiles) else WiFiConnector.ATTEMPT_MS):
+            return
+
+        self.attempt = self.attempt + 1 if self.attempt < len(self.profiles) else 0
+        self.attempt_started = time.ticks_ms()
+        if self.attempt < len(self.profiles):
+            (ssid, password) = self.profiles[self.attempt]
+            print('WiFi connecting to', ssid)
+            self.wlan.connect(ssid, password)
+        else:
+            self.openPortal()
+
+    def openPortal(self):
+        if self.portal is not None:
+            return
+        try:
+            self.portal = SetupPortal(port=self.portal_port)
+        except OSError as e:
+            # e.g. the config server has the port, try again after the next round of attempts
+            print('WiFi setup unavailable:', e)
+
+    def closePortal(self):
+        if self.portal is not None:
+            self.portal.close()
+            self.portal = None
+
+    def isConnected(self):
+        return self.connected
+
+    def isPortalOpen(self):
+        return self.portal is not None
+
+    def nextUpdateMs(self):
+        """Milliseconds until update() should look at the connection again"""
+        if self.connected:
+            return WiFiConnector.CHECK_INTERVAL_MS
+        if self.portal is not None:
+            return self.portal.nextUpdateMs()
+        return WiFiConnector.POLL_INTERVAL_MS
+
+    def subscribeHandler(self, handler):
+        self.handlers.append(handler)